@@ -4,6 +4,9 @@ Integração com TopGrupos backend
 """
 
 import os
+import io
+import re
+import hmac
 import redis
 from flask import Flask, request, jsonify, send_file
 from flask_cors import CORS
@@ -12,8 +15,11 @@ import logging
 from typing import Dict, Any
 
 from image_optimizer import ImageOptimizer, create_image_optimizer_app
+from jobs import JobManager, InMemoryJobStore, RedisJobStore, JobQueueFull
 from config import get_config, ImageOptimizerConfig
-from utils import analyze_optimization_potential, get_image_info
+from utils import (analyze_optimization_potential, get_image_info, get_format_mime_type, sniff_image_content_type,
+                   EFFORT_LEVELS, SIGNATURE_SNIFF_BYTES)
+from profiling import profile_call, parse_profile_header, PROFILE_MODES
 
 # Configuração de logging
 logging.basicConfig(
@@ -22,12 +28,32 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-def create_app(config_name: str = None) -> Flask:
+# Extensões servidas em /optimized/<hash>.<ext> e o formato correspondente
+OPTIMIZED_EXTENSIONS = {
+    'webp': 'WEBP',
+    'jpeg': 'JPEG',
+    'jpg': 'JPEG',
+    'avif': 'AVIF',
+    'png': 'PNG'
+}
+
+CONTENT_HASH_PATTERN = re.compile(r'^[0-9a-f]{16}$')
+
+# Conteúdo endereçado por hash nunca muda: cache de 1 ano no navegador/CDN
+IMMUTABLE_MAX_AGE = 365 * 86400
+
+# Opções aceitas em cada variante de /warm
+WARM_VARIANT_FIELDS = ('format', 'quality', 'is_thumbnail', 'max_width', 'max_height', 'effort',
+                       'widths', 'formats')
+
+def create_app(config_name: str = None, redis_client=None) -> Flask:
     """
     Factory function para criar aplicação Flask
     
     Args:
         config_name: Nome do ambiente (development/production)
+        redis_client: Cliente Redis já criado (ex.: InMemoryRedis em testes de carga);
+            se None, conecta ao Redis/Upstash configurado
         
     Returns:
         Flask: Aplicação configurada
@@ -39,8 +65,9 @@ def create_app(config_name: str = None) -> Flask:
     config = get_config(config_name)
     
     # Configurar Redis/Upstash
-    redis_client = None
-    if config.REDIS_HOST:
+    if redis_client is not None:
+        logger.info(f"✅ Usando cliente Redis fornecido: {type(redis_client).__name__}")
+    elif config.REDIS_HOST:
         try:
             redis_client = redis.Redis(
                 host=config.REDIS_HOST,
@@ -66,6 +93,75 @@ def create_app(config_name: str = None) -> Flask:
     # Criar otimizador
     optimizer = ImageOptimizer(redis_client, config.to_dict())
     
+    # Jobs assíncronos: estado no Redis quando disponível (ou se exigido)
+    use_redis_jobs = config.JOB_BACKEND == 'redis' or (config.JOB_BACKEND == 'auto' and redis_client)
+    if use_redis_jobs and redis_client:
+        job_store = RedisJobStore(redis_client, ttl=config.JOB_TTL)
+    else:
+        if config.JOB_BACKEND == 'redis':
+            logger.warning("⚠️ IMG_JOB_BACKEND=redis sem Redis disponível, usando memória")
+        job_store = InMemoryJobStore(ttl=config.JOB_TTL)
+    job_manager = JobManager(optimizer, job_store, workers=config.JOB_WORKERS,
+                             max_pending=config.JOB_MAX_PENDING)
+    
+    def get_profile_mode():
+        """
+        Modo de perfilamento pedido no cabeçalho X-Profile
+        
+        Exige X-Profile-Token igual a IMG_PROFILING_TOKEN.
+        
+        Returns:
+            Tuple: (modo ou None, resposta de erro ou None)
+        """
+        mode = parse_profile_header(request.headers.get('X-Profile'), config.PROFILING_MODE)
+        if mode is None:
+            return None, None
+        
+        token = request.headers.get('X-Profile-Token', '')
+        # Comparado em bytes: compare_digest rejeita str com caracteres não ASCII
+        if not config.PROFILING_TOKEN or not hmac.compare_digest(token.encode(), config.PROFILING_TOKEN.encode()):
+            return None, (jsonify({
+                'success': False,
+                'error': 'Perfilamento não autorizado'
+            }), 403)
+        
+        if mode not in PROFILE_MODES:
+            return None, (jsonify({
+                'success': False,
+                'error': f"Modo de perfilamento inválido. Use: {', '.join(PROFILE_MODES)}"
+            }), 400)
+        
+        return mode, None
+
+    def run_profiled(mode, func):
+        """Executa func sob o perfilador quando pedido; sem modo, chamada direta"""
+        if mode is None:
+            return func(), None
+        
+        result, profile = profile_call(func, mode, interval=config.PROFILING_INTERVAL_MS / 1000,
+                                       top=config.PROFILING_TOP)
+        logger.info(f"🔬 Requisição perfilada ({mode}): {profile['duration_ms']:.0f}ms")
+        return result, profile
+
+    def batch_options_error(data: Dict[str, Any]):
+        """Mensagem de erro para format/quality inválidos em lotes e jobs (None se válidos)"""
+        output_format = data.get('format', 'WEBP')
+        if not isinstance(output_format, str) or output_format.upper() not in ['WEBP', 'JPEG', 'AVIF', 'PNG']:
+            return 'Formato inválido. Use: WEBP, JPEG, AVIF, PNG'
+        
+        quality = data.get('quality')
+        if quality is not None and (isinstance(quality, bool) or not isinstance(quality, int)
+                                    or not 1 <= quality <= 100):
+            return 'Qualidade deve ser um número entre 1 e 100'
+        
+        return None
+
+    def retry_after_header(result: Dict[str, Any]) -> Dict[str, str]:
+        """Retry-After para falhas classificadas (cache negativo)"""
+        if result.get('success') or not result.get('retry_after'):
+            return {}
+        return {'Retry-After': str(result['retry_after'])}
+
     @app.route('/', methods=['GET'])
     def index():
         """Página inicial da API"""
@@ -76,9 +172,14 @@ def create_app(config_name: str = None) -> Flask:
             'endpoints': {
                 'optimize_image': '/optimize-image [POST]',
                 'batch_optimize': '/batch-optimize [POST]',
+                'variants': '/variants [POST]',
+                'jobs': '/jobs [POST], /jobs/<id> [GET]',
+                'warm': '/warm [POST]',
                 'analyze_image': '/analyze-image [POST]',
                 'cache_stats': '/cache-stats [GET]',
                 'clear_cache': '/clear-cache [POST]',
+                'optimized': '/optimized/<hash>.<ext> [GET]',
+                'metrics': '/metrics [GET]',
                 'health': '/health [GET]'
             },
             'timestamp': datetime.utcnow().isoformat()
@@ -97,8 +198,14 @@ def create_app(config_name: str = None) -> Flask:
             "is_thumbnail": false,      // opcional: true para thumbnails
             "return_base64": true,      // opcional: retornar base64 ou URL
             "max_width": 1920,          // opcional: largura máxima
-            "max_height": 1080          // opcional: altura máxima
+            "max_height": 1080,         // opcional: altura máxima
+            "effort": "balanced",       // opcional: fast, balanced, max (padrão IMG_INTERACTIVE_EFFORT)
+            "target_ssim": 0.95,        // opcional: busca a menor qualidade com esse SSIM
+            "max_bytes": 150000         // opcional: busca a maior qualidade que caiba nesse tamanho
         }
+        
+        Cabeçalhos X-Profile (sample, cprofile ou 1) e X-Profile-Token incluem
+        o perfil da requisição na resposta (campo profile).
         """
         try:
             data = request.get_json()
@@ -158,11 +265,47 @@ def create_app(config_name: str = None) -> Flask:
             if 'max_height' in data:
                 options['max_height'] = int(data['max_height'])
             
+            # Esforço do codificador
+            if 'effort' in data:
+                if data['effort'] not in EFFORT_LEVELS:
+                    return jsonify({
+                        'success': False,
+                        'error': f"Esforço inválido. Use: {', '.join(EFFORT_LEVELS)}"
+                    }), 400
+                options['effort'] = data['effort']
+            
+            # Busca de qualidade por alvo
+            if 'target_ssim' in data:
+                target_ssim = data['target_ssim']
+                if not isinstance(target_ssim, (int, float)) or not 0 < target_ssim < 1:
+                    return jsonify({
+                        'success': False,
+                        'error': 'target_ssim deve ser um número entre 0 e 1'
+                    }), 400
+                options['target_ssim'] = float(target_ssim)
+            
+            if 'max_bytes' in data:
+                max_bytes = data['max_bytes']
+                if not isinstance(max_bytes, int) or max_bytes <= 0:
+                    return jsonify({
+                        'success': False,
+                        'error': 'max_bytes deve ser um inteiro positivo'
+                    }), 400
+                options['max_bytes'] = max_bytes
+            
+            profile_mode, profile_error = get_profile_mode()
+            if profile_error:
+                return profile_error
+            
             logger.info(f"🔄 Processando otimização: {image_url}")
             logger.info(f"🔧 Opções: {options}")
             
             # Executar otimização
-            result = optimizer.optimize_image_from_url(image_url, options)
+            result, profile = run_profiled(
+                profile_mode, lambda: optimizer.optimize_image_from_url(image_url, options)
+            )
+            if profile:
+                result['profile'] = profile
             
             # Log do resultado
             if result['success']:
@@ -173,7 +316,7 @@ def create_app(config_name: str = None) -> Flask:
             else:
                 logger.error(f"❌ Falha na otimização: {result.get('error', 'Erro desconhecido')}")
             
-            return jsonify(result), 200 if result['success'] else 400
+            return jsonify(result), 200 if result['success'] else 400, retry_after_header(result)
             
         except Exception as e:
             logger.error(f"❌ Erro no endpoint optimize-image: {e}")
@@ -193,7 +336,8 @@ def create_app(config_name: str = None) -> Flask:
             "image_urls": ["url1", "url2", ...],
             "format": "WEBP",
             "quality": 85,
-            "max_batch_size": 20
+            "max_batch_size": 20,
+            "effort": "max"             // opcional: fast, balanced, max (padrão IMG_BATCH_EFFORT)
         }
         """
         try:
@@ -226,18 +370,39 @@ def create_app(config_name: str = None) -> Flask:
                     'error': f'Máximo {max_batch} imagens por lote'
                 }), 400
             
+            if data.get('effort') is not None and data['effort'] not in EFFORT_LEVELS:
+                return jsonify({
+                    'success': False,
+                    'error': f"Esforço inválido. Use: {', '.join(EFFORT_LEVELS)}"
+                }), 400
+            
+            options_error = batch_options_error(data)
+            if options_error:
+                return jsonify({'success': False, 'error': options_error}), 400
+            
             # Opções de otimização
             options = {
                 'format': data.get('format', 'WEBP').upper(),
                 'quality': data.get('quality', 85),
                 'is_thumbnail': data.get('is_thumbnail', False),
-                'return_base64': data.get('return_base64', True)
+                'return_base64': data.get('return_base64', True),
+                'effort': data.get('effort')
             }
             
+            profile_mode, profile_error = get_profile_mode()
+            if profile_error:
+                return profile_error
+            
             logger.info(f"🔄 Iniciando lote: {len(image_urls)} imagens")
             
-            # Processar lote
-            result = optimizer.batch_optimize_images(image_urls, options)
+            # Processar lote (perfilado: sequencial na thread da requisição)
+            if profile_mode:
+                result, profile = run_profiled(profile_mode, lambda: optimizer.batch_optimize_images(
+                    image_urls, options, max_workers=1, use_processes=False
+                ))
+                result['profile'] = profile
+            else:
+                result = optimizer.batch_optimize_images(image_urls, options)
             
             logger.info(f"✅ Lote concluído: {result['success_rate']}% sucesso")
             return jsonify(result), 200
@@ -249,6 +414,85 @@ def create_app(config_name: str = None) -> Flask:
                 'error': f'Erro interno: {str(e)}'
             }), 500
 
+    @app.route('/variants', methods=['POST'])
+    def variants():
+        """
+        Matriz de variantes (tamanhos x formatos) a partir de um único download
+        
+        POST /variants
+        {
+            "image_url": "https://example.com/image.jpg",
+            "widths": [320, 800, 1920],     // opcional: padrão IMG_RESPONSIVE_BREAKPOINTS
+            "formats": ["WEBP", "JPEG"],    // opcional: padrão IMG_VARIANT_FORMATS
+            "quality": 85,                  // opcional: 1-100
+            "effort": "balanced"            // opcional: fast, balanced, max
+        }
+        """
+        try:
+            data = request.get_json()
+            
+            if not data or not str(data.get('image_url', '')).strip():
+                return jsonify({
+                    'success': False,
+                    'error': 'Campo image_url é obrigatório'
+                }), 400
+            
+            options = {}
+            
+            if 'widths' in data:
+                widths = data['widths']
+                if (not isinstance(widths, list) or not widths or len(widths) > 20
+                        or not all(isinstance(w, int) and w > 0 for w in widths)):
+                    return jsonify({
+                        'success': False,
+                        'error': 'widths deve ser uma lista de 1 a 20 larguras positivas'
+                    }), 400
+                options['widths'] = widths
+            
+            if 'formats' in data:
+                formats = data['formats']
+                if (not isinstance(formats, list) or not formats
+                        or not all(str(f).upper() in ['WEBP', 'JPEG', 'AVIF', 'PNG'] for f in formats)):
+                    return jsonify({
+                        'success': False,
+                        'error': 'Formato inválido. Use: WEBP, JPEG, AVIF, PNG'
+                    }), 400
+                options['formats'] = [str(f).upper() for f in formats]
+            
+            if 'quality' in data:
+                quality = data['quality']
+                if not isinstance(quality, int) or not 1 <= quality <= 100:
+                    return jsonify({
+                        'success': False,
+                        'error': 'Qualidade deve ser um número entre 1 e 100'
+                    }), 400
+                options['quality'] = quality
+            
+            if 'effort' in data:
+                if data['effort'] not in EFFORT_LEVELS:
+                    return jsonify({
+                        'success': False,
+                        'error': f"Esforço inválido. Use: {', '.join(EFFORT_LEVELS)}"
+                    }), 400
+                options['effort'] = data['effort']
+            
+            result = optimizer.optimize_variants_from_url(data['image_url'].strip(), options)
+            
+            if result['success']:
+                logger.info(f"✅ Matriz de variantes: {len(result['variants'])} variantes")
+            else:
+                logger.error(f"❌ Falha na matriz de variantes: {result.get('error', 'Erro desconhecido')}")
+            
+            return jsonify(result), 200 if result['success'] else 400, retry_after_header(result)
+            
+        except Exception as e:
+            logger.error(f"❌ Erro no endpoint variants: {e}")
+            return jsonify({
+                'success': False,
+                'error': f'Erro interno do servidor: {str(e)}',
+                'timestamp': datetime.utcnow().isoformat()
+            }), 500
+
     @app.route('/analyze-image', methods=['POST'])
     def analyze_image():
         """
@@ -296,11 +540,223 @@ def create_app(config_name: str = None) -> Flask:
                 'error': str(e)
             }), 500
 
+    @app.route('/jobs', methods=['POST'])
+    def create_job():
+        """
+        Enfileira um lote de otimização e retorna imediatamente (202)
+        
+        POST /jobs
+        {
+            "image_urls": ["url1", "url2", ...],   // ou "image_url": "url"
+            "format": "WEBP",
+            "quality": 85,
+            "is_thumbnail": false,
+            "return_base64": false,
+            "effort": "max"
+        }
+        """
+        try:
+            data = request.get_json()
+            
+            if not data or not (data.get('image_urls') or data.get('image_url')):
+                return jsonify({
+                    'success': False,
+                    'error': 'Campo image_urls (ou image_url) é obrigatório'
+                }), 400
+            
+            image_urls = data.get('image_urls') or [data['image_url']]
+            
+            if not isinstance(image_urls, list) or not all(isinstance(url, str) and url.strip() for url in image_urls):
+                return jsonify({
+                    'success': False,
+                    'error': 'image_urls deve ser uma lista de URLs'
+                }), 400
+            
+            if len(image_urls) > config.JOB_MAX_URLS:
+                return jsonify({
+                    'success': False,
+                    'error': f'Máximo {config.JOB_MAX_URLS} imagens por job'
+                }), 400
+            
+            if data.get('effort') is not None and data['effort'] not in EFFORT_LEVELS:
+                return jsonify({
+                    'success': False,
+                    'error': f"Esforço inválido. Use: {', '.join(EFFORT_LEVELS)}"
+                }), 400
+            
+            options_error = batch_options_error(data)
+            if options_error:
+                return jsonify({'success': False, 'error': options_error}), 400
+            
+            options = {
+                'format': data.get('format', 'WEBP').upper(),
+                'quality': data.get('quality'),
+                'is_thumbnail': data.get('is_thumbnail', False),
+                'return_base64': data.get('return_base64', False),
+                'effort': data.get('effort')
+            }
+            
+            job = job_manager.submit([url.strip() for url in image_urls], options)
+            return jsonify({
+                'success': True,
+                'job_id': job['id'],
+                'status': job['status'],
+                'status_url': f"/jobs/{job['id']}"
+            }), 202
+            
+        except JobQueueFull as e:
+            logger.warning(f"⚠️ Fila de jobs cheia: {e}")
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 503
+        except Exception as e:
+            logger.error(f"❌ Erro no endpoint jobs: {e}")
+            return jsonify({
+                'success': False,
+                'error': f'Erro interno do servidor: {str(e)}',
+                'timestamp': datetime.utcnow().isoformat()
+            }), 500
+
+    @app.route('/jobs/<job_id>', methods=['GET'])
+    def get_job(job_id: str):
+        """Status, progresso e (ao concluir) resultado de um job"""
+        job = job_manager.get(job_id)
+        if job is None:
+            return jsonify({
+                'success': False,
+                'error': 'Job não encontrado ou expirado'
+            }), 404
+        
+        return jsonify({'success': True, **job})
+
+    def parse_warm_variant(spec: Any):
+        """
+        Valida uma variante de /warm
+        
+        Returns:
+            Tuple: (opções para warm_cache ou None, mensagem de erro ou None)
+        """
+        if not isinstance(spec, dict):
+            return None, 'Cada variante deve ser um objeto'
+        
+        options = {key: spec[key] for key in WARM_VARIANT_FIELDS if spec.get(key) is not None}
+        formats = options.get('formats', [options.get('format', 'WEBP')])
+        if (not isinstance(formats, list) or not formats
+                or not all(str(f).upper() in ['WEBP', 'JPEG', 'AVIF', 'PNG'] for f in formats)):
+            return None, 'Formato inválido. Use: WEBP, JPEG, AVIF, PNG'
+        
+        widths = options.get('widths', [])
+        if (not isinstance(widths, list) or len(widths) > 20
+                or not all(isinstance(w, int) and w > 0 for w in widths)):
+            return None, 'widths deve ser uma lista de até 20 larguras positivas'
+        
+        for key in ('max_width', 'max_height'):
+            if key in options and not (isinstance(options[key], int) and options[key] > 0):
+                return None, f'{key} deve ser um inteiro positivo'
+        
+        if 'quality' in options and not (isinstance(options['quality'], int) and 1 <= options['quality'] <= 100):
+            return None, 'Qualidade deve ser um número entre 1 e 100'
+        
+        if 'effort' in options and options['effort'] not in EFFORT_LEVELS:
+            return None, f"Esforço inválido. Use: {', '.join(EFFORT_LEVELS)}"
+        
+        return options, None
+
+    @app.route('/warm', methods=['POST'])
+    def warm_cache():
+        """
+        Aquece o cache em segundo plano (job) e retorna imediatamente (202)
+        
+        Variantes já frescas no cache são puladas; o progresso fica em /jobs/<id>.
+        
+        POST /warm
+        {
+            "image_urls": ["url1", "url2", ...],
+            "variants": [                                   // opcional: padrão [{}] (WEBP)
+                {"format": "WEBP", "max_width": 640},
+                {"format": "WEBP", "is_thumbnail": true},
+                {"widths": [320, 640, 1280], "formats": ["WEBP", "JPEG"]}   // matriz srcset
+            ],
+            "max_concurrency": 8,                           // opcional: padrão IMG_WARM_MAX_CONCURRENCY
+            "host_rate": 5                                  // opcional: downloads/s por host
+        }
+        """
+        try:
+            data = request.get_json()
+            
+            image_urls = (data or {}).get('image_urls')
+            if not isinstance(image_urls, list) or not image_urls \
+                    or not all(isinstance(url, str) and url.strip() for url in image_urls):
+                return jsonify({
+                    'success': False,
+                    'error': 'Campo image_urls (lista de URLs) é obrigatório'
+                }), 400
+            
+            if len(image_urls) > config.WARM_MAX_URLS:
+                return jsonify({
+                    'success': False,
+                    'error': f'Máximo {config.WARM_MAX_URLS} imagens por aquecimento'
+                }), 400
+            
+            variant_specs = data.get('variants') or [{}]
+            if not isinstance(variant_specs, list) or len(variant_specs) > config.WARM_MAX_VARIANTS:
+                return jsonify({
+                    'success': False,
+                    'error': f'variants deve ser uma lista de até {config.WARM_MAX_VARIANTS} variantes'
+                }), 400
+            
+            variant_options = []
+            for spec in variant_specs:
+                options, error = parse_warm_variant(spec)
+                if error:
+                    return jsonify({'success': False, 'error': error}), 400
+                variant_options.append(options)
+            
+            max_concurrency = data.get('max_concurrency')
+            if max_concurrency is not None and not (isinstance(max_concurrency, int) and 1 <= max_concurrency <= 64):
+                return jsonify({
+                    'success': False,
+                    'error': 'max_concurrency deve estar entre 1 e 64'
+                }), 400
+            
+            host_rate = data.get('host_rate')
+            if host_rate is not None and not (isinstance(host_rate, (int, float)) and host_rate > 0):
+                return jsonify({
+                    'success': False,
+                    'error': 'host_rate deve ser positivo'
+                }), 400
+            
+            urls = [url.strip() for url in image_urls]
+            job = job_manager.submit(urls, kind='warm', task=lambda on_progress: optimizer.warm_cache(
+                urls, variant_options, max_concurrency, host_rate, progress_callback=on_progress
+            ))
+            return jsonify({
+                'success': True,
+                'job_id': job['id'],
+                'status': job['status'],
+                'status_url': f"/jobs/{job['id']}"
+            }), 202
+            
+        except JobQueueFull as e:
+            logger.warning(f"⚠️ Fila de jobs cheia: {e}")
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 503
+        except Exception as e:
+            logger.error(f"❌ Erro no endpoint warm: {e}")
+            return jsonify({
+                'success': False,
+                'error': f'Erro interno do servidor: {str(e)}',
+                'timestamp': datetime.utcnow().isoformat()
+            }), 500
+
     @app.route('/cache-stats', methods=['GET'])
     def cache_stats():
-        """Estatísticas do cache"""
+        """Estatísticas do cache (?sample=N mede a memória de N chaves)"""
         try:
-            stats = optimizer.get_cache_stats()
+            stats = optimizer.get_cache_stats(request.args.get('sample', 0, type=int))
             return jsonify(stats), 200
         except Exception as e:
             return jsonify({
@@ -323,6 +779,64 @@ def create_app(config_name: str = None) -> Flask:
                 'error': str(e)
             }), 500
 
+    @app.route('/optimized/<content_hash>.<ext>', methods=['GET'])
+    def serve_optimized(content_hash: str, ext: str):
+        """
+        Serve os bytes de uma imagem otimizada (retornada com return_base64=false)
+        
+        ETag forte = hash do conteúdo; suporta If-None-Match (304) e Range (206).
+        Com o cache em disco ativo, o arquivo é enviado diretamente (sendfile).
+        A extensão precisa corresponder ao formato dos bytes armazenados.
+        """
+        output_format = OPTIMIZED_EXTENSIONS.get(ext.lower())
+        if not output_format or not CONTENT_HASH_PATTERN.match(content_hash):
+            return jsonify({
+                'success': False,
+                'error': 'Imagem otimizada não encontrada'
+            }), 404
+        
+        source = optimizer.get_optimized_path(content_hash)
+        header = None
+        if source is not None:
+            try:
+                with open(source, 'rb') as f:
+                    header = f.read(SIGNATURE_SNIFF_BYTES)
+            except OSError:
+                source = None
+        if source is None:
+            data = optimizer.get_optimized_bytes(content_hash)
+            if data is None:
+                return jsonify({
+                    'success': False,
+                    'error': 'Imagem otimizada não encontrada ou expirada'
+                }), 404
+            header = data[:SIGNATURE_SNIFF_BYTES]
+            source = io.BytesIO(data)
+        
+        if sniff_image_content_type(header) != get_format_mime_type(output_format):
+            return jsonify({
+                'success': False,
+                'error': 'Imagem otimizada não encontrada neste formato'
+            }), 404
+        
+        response = send_file(
+            source,
+            mimetype=get_format_mime_type(output_format),
+            etag=content_hash,
+            conditional=True,
+            max_age=IMMUTABLE_MAX_AGE
+        )
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        if response.status_code in (200, 206) and response.content_length:
+            optimizer.metrics.bytes_out.inc(response.content_length)
+        return response
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        """Métricas no formato de texto do Prometheus"""
+        return optimizer.metrics.render(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
     @app.route('/health', methods=['GET'])
     def health():
         """Health check completo"""
@@ -351,7 +865,9 @@ def create_app(config_name: str = None) -> Flask:
                     'default_format': config.DEFAULT_FORMAT,
                     'webp_quality': config.WEBP_QUALITY,
                     'cache_ttl_hours': config.CACHE_TTL // 3600
-                }
+                },
+                'http_pool': optimizer.get_http_stats(),
+                'jobs': job_manager.stats()
             }
             
             return jsonify(health_data), 200
@@ -371,9 +887,15 @@ def create_app(config_name: str = None) -> Flask:
             'available_endpoints': [
                 '/optimize-image [POST]',
                 '/batch-optimize [POST]',
+                '/variants [POST]',
+                '/jobs [POST]',
+                '/jobs/<id> [GET]',
+                '/warm [POST]',
                 '/analyze-image [POST]',
                 '/cache-stats [GET]',
                 '/clear-cache [POST]',
+                '/optimized/<hash>.<ext> [GET]',
+                '/metrics [GET]',
                 '/health [GET]'
             ]
         }), 404
@@ -0,0 +1,308 @@
+"""
+Microbenchmarks por etapa do otimizador sobre um corpus sintético determinístico
+Roda offline: gera as imagens em memória, mede cada etapa e compara com um baseline
+
+Uso:
+    python benchmark.py --output bench.json
+    python benchmark.py --quick --baseline bench.json --fail-on-regression
+"""
+
+import io
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import platform
+import statistics
+from datetime import datetime
+from typing import Dict, Any, List, Callable, Tuple
+
+import PIL
+from PIL import Image, ImageDraw, ImageFilter
+
+from image_optimizer import ImageOptimizer
+from utils import RESIZE_MODES, EFFORT_LEVELS, resize_image, analyze_optimization_potential
+
+# Semente padrão do corpus (mesma semente = mesmos bytes)
+DEFAULT_SEED = 1234
+
+# Formatos de saída medidos por padrão (AVIF entra se o Pillow suportar)
+DEFAULT_FORMATS = ('WEBP', 'JPEG', 'AVIF', 'PNG')
+
+# Variação da mediana acima da qual uma medida conta como regressão
+DEFAULT_REGRESSION_THRESHOLD = 0.10
+
+# Itens do corpus: (largura, altura) na escala 1.0
+CORPUS_SIZES = {
+    'photo_noise': (1920, 1280),
+    'flat_graphic': (1600, 900),
+    'rgba_png': (1200, 1200),
+    'palette_gif': (800, 600),
+    'jpeg_12mp': (4000, 3000)
+}
+
+
+def _scaled(size: Tuple[int, int], scale: float) -> Tuple[int, int]:
+    return (max(16, int(size[0] * scale)), max(16, int(size[1] * scale)))
+
+
+def _photo_like(size: Tuple[int, int], rng: random.Random) -> Image.Image:
+    """Gradientes suaves com ruído de sensor e leve desfoque"""
+    width, height = size
+    channels = []
+    for _ in range(3):
+        gradient = Image.linear_gradient('L').rotate(rng.randrange(360)).resize(size)
+        noise = Image.frombytes('L', size, rng.randbytes(width * height))
+        channels.append(Image.blend(gradient, noise, 0.25))
+    return Image.merge('RGB', channels).filter(ImageFilter.GaussianBlur(1.2))
+
+
+def _flat_graphic(size: Tuple[int, int], rng: random.Random) -> Image.Image:
+    """Poucas cores chapadas e bordas nítidas (logos, banners, capturas de tela)"""
+    palette = [tuple(rng.randrange(256) for _ in range(3)) for _ in range(6)]
+    img = Image.new('RGB', size, palette[0])
+    draw = ImageDraw.Draw(img)
+    for _ in range(40):
+        x0, y0 = rng.randrange(size[0]), rng.randrange(size[1])
+        x1 = x0 + rng.randrange(min(20, size[0] // 4) + 1, size[0] // 3 + 2)
+        y1 = y0 + rng.randrange(min(10, size[1] // 5) + 1, size[1] // 4 + 2)
+        shape = draw.rectangle if rng.random() < 0.6 else draw.ellipse
+        shape((x0, y0, x1, y1), fill=rng.choice(palette[1:]))
+    return img
+
+
+def _encode(img: Image.Image, fmt: str, **kwargs) -> bytes:
+    buffer = io.BytesIO()
+    img.save(buffer, format=fmt, **kwargs)
+    return buffer.getvalue()
+
+
+def build_corpus(seed: int = DEFAULT_SEED, scale: float = 1.0) -> Dict[str, bytes]:
+    """
+    Gera o corpus sintético (bytes no formato de origem de cada item)
+
+    Args:
+        seed: Semente do gerador (o corpus é idêntico para a mesma semente e escala)
+        scale: Fator aplicado às dimensões (ex.: 0.25 para rodadas rápidas)
+    """
+    rng = random.Random(seed)
+    sizes = {name: _scaled(size, scale) for name, size in CORPUS_SIZES.items()}
+
+    photo = _photo_like(sizes['photo_noise'], rng)
+    graphic = _flat_graphic(sizes['flat_graphic'], rng)
+
+    rgba = _photo_like(sizes['rgba_png'], rng).convert('RGBA')
+    rgba.putalpha(Image.radial_gradient('L').resize(sizes['rgba_png']))
+
+    palette = _flat_graphic(sizes['palette_gif'], rng).quantize(colors=64)
+
+    return {
+        'photo_noise': _encode(photo, 'JPEG', quality=92),
+        'flat_graphic': _encode(graphic, 'PNG'),
+        'rgba_png': _encode(rgba, 'PNG'),
+        'palette_gif': _encode(palette, 'GIF'),
+        'jpeg_12mp': _encode(_photo_like(sizes['jpeg_12mp'], rng), 'JPEG', quality=90)
+    }
+
+
+def time_call(func: Callable[[], Any], repeats: int = 5, warmup: int = 1) -> Dict[str, float]:
+    """Estatísticas (ms) de repeats execuções de func após warmup execuções descartadas"""
+    for _ in range(warmup):
+        func()
+    samples = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) * 1000)
+    return {
+        'min_ms': round(min(samples), 3),
+        'median_ms': round(statistics.median(samples), 3),
+        'mean_ms': round(statistics.fmean(samples), 3),
+        'stdev_ms': round(statistics.stdev(samples), 3) if len(samples) > 1 else 0.0,
+        'repeats': repeats
+    }
+
+
+def _decoded(data: bytes) -> Image.Image:
+    with Image.open(io.BytesIO(data)) as img:
+        img.load()
+        return img.copy()
+
+
+def benchmark_item(optimizer: ImageOptimizer, data: bytes, formats: List[str], efforts: List[str],
+                   repeats: int) -> Dict[str, Dict[str, float]]:
+    """Mede as etapas de um item do corpus"""
+    results = {}
+    source = _decoded(data)
+    target_size = optimizer._calculate_new_size(source.size)
+
+    results['decode'] = time_call(lambda: _decoded(data), repeats)
+
+    if data[:3] == b'\xff\xd8\xff':
+        def decode_draft():
+            with Image.open(io.BytesIO(data)) as img:
+                optimizer._apply_jpeg_draft(img, img.size, target_size)
+                img.load()
+        results['decode_draft'] = time_call(decode_draft, repeats)
+
+    results['calculate_new_size'] = time_call(
+        lambda: [optimizer._calculate_new_size(source.size, thumb) for thumb in (False, True) * 500], repeats
+    )
+
+    # Imagens que já cabem nos limites: medir a redução pela metade
+    rgb = source.convert('RGB')
+    resize_target = target_size if target_size != rgb.size else (rgb.width // 2, rgb.height // 2)
+    for mode in RESIZE_MODES:
+        results[f'resize:{mode}'] = time_call(lambda: resize_image(rgb, resize_target, mode), repeats)
+    resized = resize_image(rgb, target_size, optimizer.resize_mode) if target_size != rgb.size else rgb
+
+    for fmt in formats:
+        for effort in efforts:
+            save_kwargs = optimizer._get_save_kwargs(fmt, None, effort)
+            image = ImageOptimizer._convert_mode(resized, fmt)
+            results[f'encode:{fmt}:{effort}'] = time_call(lambda: _encode(image, fmt, **save_kwargs), repeats)
+            results[f'optimize:{fmt}:{effort}'] = time_call(
+                lambda: optimizer._optimize_image(data, fmt, effort=effort), repeats
+            )
+
+    results['analyze'] = time_call(lambda: analyze_optimization_potential(data), repeats)
+    return results
+
+
+def run_benchmarks(seed: int = DEFAULT_SEED, scale: float = 1.0, repeats: int = 5,
+                   formats: List[str] = None, efforts: List[str] = None,
+                   items: List[str] = None) -> Dict[str, Any]:
+    """
+    Gera o corpus e mede todas as etapas
+
+    Returns:
+        Dict com meta (ambiente e parâmetros), corpus (bytes por item) e results
+        (item -> medida -> estatísticas)
+    """
+    Image.init()
+    formats = [fmt for fmt in (formats or DEFAULT_FORMATS) if fmt in Image.SAVE]
+    efforts = list(efforts or EFFORT_LEVELS)
+    corpus = build_corpus(seed, scale)
+    optimizer = ImageOptimizer(config={'batch_process_workers': 0, 'memory_cache_bytes': 0})
+
+    results = {}
+    for name, data in corpus.items():
+        if items and name not in items:
+            continue
+        print(f"⏱️ {name}: {len(data)} bytes", file=sys.stderr)
+        results[name] = benchmark_item(optimizer, data, formats, efforts, repeats)
+    optimizer.close()
+
+    return {
+        'meta': {
+            'timestamp': datetime.utcnow().isoformat(),
+            'python': platform.python_version(),
+            'pillow': PIL.__version__,
+            'platform': platform.platform(),
+            'seed': seed,
+            'scale': scale,
+            'repeats': repeats,
+            'formats': formats,
+            'efforts': efforts
+        },
+        'corpus': {name: len(data) for name, data in corpus.items()},
+        'results': results
+    }
+
+
+def compare_to_baseline(current: Dict[str, Any], baseline: Dict[str, Any],
+                        threshold: float = DEFAULT_REGRESSION_THRESHOLD) -> Dict[str, Any]:
+    """
+    Compara as medianas com um resultado anterior
+
+    Só entram medidas presentes nos dois resultados; o corpus só é
+    comparável com a mesma semente e escala (caso contrário, comparable=False).
+    """
+    comparable = all(current['meta'].get(key) == baseline['meta'].get(key) for key in ('seed', 'scale'))
+    changes = []
+    for item, benches in current['results'].items():
+        for bench, stats in benches.items():
+            previous = baseline['results'].get(item, {}).get(bench)
+            if not previous or not previous['median_ms']:
+                continue
+            ratio = stats['median_ms'] / previous['median_ms']
+            changes.append({
+                'item': item,
+                'bench': bench,
+                'baseline_ms': previous['median_ms'],
+                'current_ms': stats['median_ms'],
+                'change_percent': round((ratio - 1) * 100, 1),
+                'status': 'regression' if ratio > 1 + threshold else
+                          'improvement' if ratio < 1 - threshold else 'unchanged'
+            })
+
+    return {
+        'comparable': comparable,
+        'threshold_percent': threshold * 100,
+        'regressions': [c for c in changes if c['status'] == 'regression'],
+        'improvements': [c for c in changes if c['status'] == 'improvement'],
+        'changes': changes
+    }
+
+
+def _print_table(report: Dict[str, Any], comparison: Dict[str, Any] = None) -> None:
+    changes = {(c['item'], c['bench']): c for c in (comparison or {}).get('changes', [])}
+    for item, benches in report['results'].items():
+        print(f"\n{item} ({report['corpus'][item]} bytes)")
+        for bench, stats in benches.items():
+            line = f"  {bench:<28} {stats['median_ms']:>10.2f} ms"
+            change = changes.get((item, bench))
+            if change:
+                line += f"  {change['change_percent']:+6.1f}%  {change['status']}"
+            print(line)
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description='Microbenchmarks do otimizador de imagens')
+    parser.add_argument('--output', help='Arquivo JSON para os resultados')
+    parser.add_argument('--baseline', help='Resultado anterior (JSON) para comparação')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--scale', type=float, default=1.0, help='Escala das dimensões do corpus')
+    parser.add_argument('--quick', action='store_true', help='Atalho para --scale 0.25 --repeats 3')
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--formats', nargs='+', default=list(DEFAULT_FORMATS))
+    parser.add_argument('--efforts', nargs='+', default=list(EFFORT_LEVELS), choices=EFFORT_LEVELS)
+    parser.add_argument('--items', nargs='+', choices=list(CORPUS_SIZES))
+    parser.add_argument('--threshold', type=float, default=DEFAULT_REGRESSION_THRESHOLD,
+                        help='Variação da mediana considerada regressão (0.10 = 10%%)')
+    parser.add_argument('--fail-on-regression', action='store_true')
+    args = parser.parse_args(argv)
+
+    # O otimizador registra cada etapa em INFO; aqui só interessa o progresso
+    logging.getLogger().setLevel(logging.WARNING)
+    if args.quick:
+        args.scale, args.repeats = 0.25, 3
+
+    report = run_benchmarks(args.seed, args.scale, args.repeats,
+                            [fmt.upper() for fmt in args.formats], args.efforts, args.items)
+
+    comparison = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            comparison = compare_to_baseline(report, json.load(f), args.threshold)
+        report['comparison'] = comparison
+        if not comparison['comparable']:
+            print("⚠️ Baseline gerado com outra semente ou escala: comparação não confiável")
+
+    _print_table(report, comparison)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\n💾 Resultados salvos em {args.output}")
+
+    if comparison and comparison['regressions']:
+        print(f"\n❌ {len(comparison['regressions'])} regressões acima de {comparison['threshold_percent']:.0f}%")
+        return 1 if args.fail_on_regression else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
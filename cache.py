@@ -0,0 +1,266 @@
+"""
+Camadas de cache em processo para o otimizador de imagens
+"""
+
+import time
+import fnmatch
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Dict, Any, Optional, Tuple, Callable
+
+
+class MemoryLRUCache:
+    """
+    Cache LRU em memória limitado por bytes, com TTL por entrada
+
+    Guarda os valores já serializados (bytes), de modo que o tamanho
+    contabilizado é exato e cada leitura devolve uma cópia independente.
+
+    Args:
+        max_bytes: Orçamento total em bytes (0 desativa o cache)
+        ttl: Tempo de vida padrão das entradas em segundos
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, ttl: int = 300):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: 'OrderedDict[str, Tuple[bytes, float]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    @staticmethod
+    def _entry_size(key: str, value: bytes) -> int:
+        return len(key) + len(value)
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Retorna o valor e o marca como usado recentemente"""
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                self._remove(key)
+                return None
+
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: bytes, ttl: int = None) -> bool:
+        """Armazena o valor, removendo os menos usados se passar do orçamento"""
+        size = self._entry_size(key, value)
+        if not self.enabled or size > self.max_bytes:
+            return False
+
+        expires_at = time.monotonic() + (ttl if ttl is not None else self.ttl)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+            self._entries[key] = (value, expires_at)
+            self.current_bytes += size
+
+            while self.current_bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+        return True
+
+    def delete(self, key: str) -> bool:
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+                return True
+            return False
+
+    def clear(self, pattern: str = '*') -> int:
+        """Remove as entradas cujas chaves casam com o padrão glob"""
+        with self._lock:
+            keys = [key for key in self._entries if fnmatch.fnmatchcase(key, pattern)]
+            for key in keys:
+                self._remove(key)
+            return len(keys)
+
+    def _remove(self, key: str) -> None:
+        value, _ = self._entries.pop(key)
+        self.current_bytes -= self._entry_size(key, value)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'entries': len(self._entries),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+                'ttl_seconds': self.ttl,
+                'evictions': self.evictions
+            }
+
+
+class CacheCounters:
+    """Contadores de hit/miss por camada de cache (thread-safe)"""
+
+    def __init__(self, *tiers: str):
+        self._lock = threading.Lock()
+        self._counts = {tier: {'hits': 0, 'misses': 0} for tier in tiers}
+
+    def hit(self, tier: str) -> None:
+        with self._lock:
+            self._counts.setdefault(tier, {'hits': 0, 'misses': 0})['hits'] += 1
+
+    def miss(self, tier: str) -> None:
+        with self._lock:
+            self._counts.setdefault(tier, {'hits': 0, 'misses': 0})['misses'] += 1
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            snapshot = {}
+            for tier, counts in self._counts.items():
+                total = counts['hits'] + counts['misses']
+                snapshot[tier] = {
+                    **counts,
+                    'hit_rate': round(counts['hits'] / total * 100, 2) if total else 0
+                }
+            return snapshot
+
+
+class SingleFlight:
+    """
+    Coalescência de chamadas idênticas em andamento (single-flight)
+
+    A primeira chamada para uma chave executa a função; as chamadas
+    concorrentes com a mesma chave aguardam e recebem o mesmo resultado
+    (ou a mesma exceção).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, Future] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Executa fn uma única vez por chave em andamento
+
+        Returns:
+            Tuple[Any, bool]: (resultado, se foi compartilhado com outra chamada)
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+                self.leaders += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            return future.result(), True
+
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'in_flight': len(self._calls),
+                'leaders': self.leaders,
+                'coalesced_requests': self.coalesced
+            }
+
+
+class RedisStatsBuffer:
+    """
+    Contadores agregados do cache mantidos em um hash Redis
+
+    Os incrementos ficam acumulados em processo e são enviados em um único
+    pipeline (HINCRBY) a cada flush_interval segundos, evitando uma ida ao
+    Redis extra por leitura ou escrita.
+
+    Args:
+        redis_client: Cliente Redis
+        key: Chave do hash de contadores
+        flush_interval: Intervalo mínimo entre envios, em segundos
+    """
+
+    FIELDS = ('entries', 'bytes', 'hits', 'misses')
+
+    def __init__(self, redis_client, key: str = 'img_stats', flush_interval: float = 5.0):
+        self.redis_client = redis_client
+        self.key = key
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._deltas = {field: 0 for field in self.FIELDS}
+        self._last_flush = time.monotonic()
+
+    def incr(self, field: str, amount: int = 1) -> None:
+        with self._lock:
+            self._deltas[field] += amount
+            due = time.monotonic() - self._last_flush >= self.flush_interval
+        if due:
+            self.flush()
+
+    def flush(self) -> None:
+        """Envia os incrementos acumulados ao Redis"""
+        with self._lock:
+            deltas = {field: value for field, value in self._deltas.items() if value}
+            self._deltas = {field: 0 for field in self.FIELDS}
+            self._last_flush = time.monotonic()
+
+        if not deltas or not self.redis_client:
+            return
+
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            for field, value in deltas.items():
+                pipe.hincrby(self.key, field, value)
+            pipe.execute()
+        except Exception:
+            # Devolve os incrementos para a próxima tentativa
+            with self._lock:
+                for field, value in deltas.items():
+                    self._deltas[field] += value
+            raise
+
+    def read(self) -> Dict[str, int]:
+        """Lê os contadores agregados (O(1)), após enviar os pendentes"""
+        self.flush()
+        raw = self.redis_client.hgetall(self.key) or {}
+        counters = {field: 0 for field in self.FIELDS}
+        for field, value in raw.items():
+            field = field.decode() if isinstance(field, bytes) else field
+            counters[field] = int(value)
+        return counters
+
+    def reset(self) -> None:
+        with self._lock:
+            self._deltas = {field: 0 for field in self.FIELDS}
+        self.redis_client.delete(self.key)
+
+    def set_totals(self, **totals: int) -> None:
+        """Substitui os valores de alguns contadores (ex.: recalculados com SCAN)"""
+        with self._lock:
+            for field in totals:
+                self._deltas[field] = 0
+        self.redis_client.hset(self.key, mapping={field: int(value) for field, value in totals.items()})
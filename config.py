@@ -5,6 +5,11 @@ Configurações para o módulo de otimização de imagens
 import os
 from typing import Dict, Any
 
+from http_pool import parse_host_pool_sizes
+from utils import RESIZE_MODES, EFFORT_LEVELS, NEGATIVE_CACHE_TTLS
+from quality_search import is_ssim_available
+from profiling import PROFILE_MODES
+
 class ImageOptimizerConfig:
     """Configurações centralizadas do otimizador"""
     
@@ -14,20 +19,50 @@ class ImageOptimizerConfig:
     THUMBNAIL_WIDTH = int(os.getenv('IMG_THUMB_WIDTH', 800))
     THUMBNAIL_HEIGHT = int(os.getenv('IMG_THUMB_HEIGHT', 800))
     
+    # Matriz de variantes (srcset); a largura do thumbnail é sempre incluída
+    RESPONSIVE_BREAKPOINTS = [int(w) for w in os.getenv('IMG_RESPONSIVE_BREAKPOINTS', '320,640,768,1024,1280,1920').split(',') if w.strip()]
+    VARIANT_FORMATS = [f.strip().upper() for f in os.getenv('IMG_VARIANT_FORMATS', 'WEBP,JPEG').split(',') if f.strip()]
+    
     # Configurações de qualidade
     WEBP_QUALITY = int(os.getenv('IMG_WEBP_QUALITY', 85))
     JPEG_QUALITY = int(os.getenv('IMG_JPEG_QUALITY', 90))
     AVIF_QUALITY = int(os.getenv('IMG_AVIF_QUALITY', 80))
+    RESIZE_MODE = os.getenv('IMG_RESIZE_MODE', 'balanced')  # quality, balanced ou fast
+    TARGET_SSIM = float(os.getenv('IMG_TARGET_SSIM')) if os.getenv('IMG_TARGET_SSIM') else None  # busca de qualidade
+    
+    # Esforço do codificador (fast, balanced, max) por tipo de chamada
+    INTERACTIVE_EFFORT = os.getenv('IMG_INTERACTIVE_EFFORT', 'balanced')
+    BATCH_EFFORT = os.getenv('IMG_BATCH_EFFORT', 'max')
     PNG_OPTIMIZE = os.getenv('IMG_PNG_OPTIMIZE', 'true').lower() == 'true'
     
     # Configurações de cache
     CACHE_TTL = int(os.getenv('IMG_CACHE_TTL', 86400 * 7))  # 7 dias
     CACHE_PREFIX = os.getenv('IMG_CACHE_PREFIX', 'topgrupos_img')
+    # Entradas vencidas ficam guardadas por mais este tempo para revalidação na origem (0 desativa)
+    REVALIDATION_WINDOW = int(os.getenv('IMG_REVALIDATION_WINDOW', 86400 * 7))
+    MIN_FRESH_TTL = int(os.getenv('IMG_MIN_FRESH_TTL', 300))  # Piso para o max-age da origem
+    # Após vencer, serve a entrada (stale) por até este tempo e renova em segundo plano (0 desativa)
+    STALE_WHILE_REVALIDATE = int(os.getenv('IMG_STALE_WHILE_REVALIDATE', 86400 * 7))
+    REFRESH_WORKERS = int(os.getenv('IMG_REFRESH_WORKERS', 2))
+    MEMORY_CACHE_BYTES = int(os.getenv('IMG_MEMORY_CACHE_MB', 64)) * 1024 * 1024  # 0 desativa
+    MEMORY_CACHE_TTL = int(os.getenv('IMG_MEMORY_CACHE_TTL', 300))
+    DISK_CACHE_DIR = os.getenv('IMG_DISK_CACHE_DIR') or None  # vazio desativa
+    DISK_CACHE_BYTES = int(os.getenv('IMG_DISK_CACHE_MB', 1024)) * 1024 * 1024
+    STATS_FLUSH_INTERVAL = int(os.getenv('IMG_STATS_FLUSH_INTERVAL', 5))
+    SCAN_BATCH_SIZE = int(os.getenv('IMG_SCAN_BATCH_SIZE', 500))
+    # TTLs do cache negativo por classe de erro ('not_found=3600,timeout=120'); omitidas usam o padrão
+    NEGATIVE_CACHE_TTLS = {name.strip(): int(ttl) for name, ttl in (
+        item.split('=', 1) for item in os.getenv('IMG_NEGATIVE_CACHE_TTLS', '').split(',') if '=' in item
+    )}
     
     # Configurações de rede
     DOWNLOAD_TIMEOUT = int(os.getenv('IMG_DOWNLOAD_TIMEOUT', 30))
     MAX_FILE_SIZE = int(os.getenv('IMG_MAX_FILE_SIZE', 15 * 1024 * 1024))  # 15MB
+    DOWNLOAD_CHUNK_SIZE = int(os.getenv('IMG_DOWNLOAD_CHUNK_SIZE', 64 * 1024))  # 64KB
     USER_AGENT = os.getenv('IMG_USER_AGENT', 'TopGrupos-ImageOptimizer/1.0')
+    HTTP_POOL_MAXSIZE = int(os.getenv('IMG_HTTP_POOL_MAXSIZE', 10))
+    HTTP_HOST_POOL_SIZES = parse_host_pool_sizes(os.getenv('IMG_HTTP_HOST_POOL_SIZES'))
+    DNS_CACHE_TTL = int(os.getenv('IMG_DNS_CACHE_TTL', 300))
     
     # Redis/Upstash
     REDIS_HOST = os.getenv('UPSTASH_REDIS_HOST')
@@ -43,6 +78,34 @@ class ImageOptimizerConfig:
     ENABLE_PROGRESSIVE_JPEG = os.getenv('IMG_PROGRESSIVE_JPEG', 'true').lower() == 'true'
     ENABLE_OPTIMIZATION = os.getenv('IMG_ENABLE_OPTIMIZATION', 'true').lower() == 'true'
     
+    # Configurações de lote (threads de download e processos de otimização)
+    BATCH_DOWNLOAD_WORKERS = int(os.getenv('IMG_BATCH_DOWNLOAD_WORKERS', 8))
+    BATCH_PROCESS_WORKERS = int(os.getenv('IMG_BATCH_PROCESS_WORKERS', os.cpu_count() or 1))
+    
+    # API assíncrona (requer aiohttp): downloads simultâneos e threads de apoio
+    ASYNC_MAX_CONCURRENCY = int(os.getenv('IMG_ASYNC_MAX_CONCURRENCY', 200))
+    ASYNC_EXECUTOR_WORKERS = int(os.getenv('IMG_ASYNC_EXECUTOR_WORKERS', max(4, (os.cpu_count() or 1) * 2)))
+    
+    # Jobs assíncronos (POST /jobs): backend auto usa o Redis quando disponível
+    JOB_BACKEND = os.getenv('IMG_JOB_BACKEND', 'auto')  # auto, memory ou redis
+    JOB_WORKERS = int(os.getenv('IMG_JOB_WORKERS', 2))
+    JOB_TTL = int(os.getenv('IMG_JOB_TTL', 3600))
+    JOB_MAX_PENDING = int(os.getenv('IMG_JOB_MAX_PENDING', 100))
+    JOB_MAX_URLS = int(os.getenv('IMG_JOB_MAX_URLS', 500))
+    
+    # Aquecimento do cache (POST /warm)
+    WARM_MAX_CONCURRENCY = int(os.getenv('IMG_WARM_MAX_CONCURRENCY', 8))
+    WARM_HOST_RATE = float(os.getenv('IMG_WARM_HOST_RATE', 5))  # Downloads/s por host (0 sem limite)
+    WARM_HOST_BURST = int(os.getenv('IMG_WARM_HOST_BURST', 0)) or None  # 0 = igual à taxa
+    WARM_MAX_URLS = int(os.getenv('IMG_WARM_MAX_URLS', 1000))
+    WARM_MAX_VARIANTS = int(os.getenv('IMG_WARM_MAX_VARIANTS', 20))
+    
+    # Perfilamento sob demanda (cabeçalho X-Profile + X-Profile-Token); sem token, desativado
+    PROFILING_TOKEN = os.getenv('IMG_PROFILING_TOKEN', '')
+    PROFILING_MODE = os.getenv('IMG_PROFILING_MODE', 'sample')  # sample ou cprofile
+    PROFILING_INTERVAL_MS = float(os.getenv('IMG_PROFILING_INTERVAL_MS', 5))
+    PROFILING_TOP = int(os.getenv('IMG_PROFILING_TOP', 25))
+    
     @classmethod
     def to_dict(cls) -> Dict[str, Any]:
         """Converte configurações para dicionário"""
@@ -50,17 +113,45 @@ class ImageOptimizerConfig:
             'max_width': cls.MAX_WIDTH,
             'max_height': cls.MAX_HEIGHT,
             'thumbnail_size': (cls.THUMBNAIL_WIDTH, cls.THUMBNAIL_HEIGHT),
+            'responsive_breakpoints': sorted(set(cls.RESPONSIVE_BREAKPOINTS) | {cls.THUMBNAIL_WIDTH}),
+            'variant_formats': cls.VARIANT_FORMATS,
             'webp_quality': cls.WEBP_QUALITY,
             'jpeg_quality': cls.JPEG_QUALITY,
             'avif_quality': cls.AVIF_QUALITY,
+            'resize_mode': cls.RESIZE_MODE,
+            'target_ssim': cls.TARGET_SSIM,
+            'interactive_effort': cls.INTERACTIVE_EFFORT,
+            'batch_effort': cls.BATCH_EFFORT,
             'png_optimize': cls.PNG_OPTIMIZE,
             'cache_ttl': cls.CACHE_TTL,
+            'revalidation_window': cls.REVALIDATION_WINDOW,
+            'min_fresh_ttl': cls.MIN_FRESH_TTL,
+            'stale_while_revalidate': cls.STALE_WHILE_REVALIDATE,
+            'refresh_workers': cls.REFRESH_WORKERS,
+            'memory_cache_bytes': cls.MEMORY_CACHE_BYTES,
+            'memory_cache_ttl': cls.MEMORY_CACHE_TTL,
+            'disk_cache_dir': cls.DISK_CACHE_DIR,
+            'disk_cache_bytes': cls.DISK_CACHE_BYTES,
+            'stats_flush_interval': cls.STATS_FLUSH_INTERVAL,
+            'scan_batch_size': cls.SCAN_BATCH_SIZE,
+            'negative_cache_ttls': cls.NEGATIVE_CACHE_TTLS,
             'max_file_size': cls.MAX_FILE_SIZE,
             'timeout': cls.DOWNLOAD_TIMEOUT,
+            'download_chunk_size': cls.DOWNLOAD_CHUNK_SIZE,
             'user_agent': cls.USER_AGENT,
+            'http_pool_maxsize': cls.HTTP_POOL_MAXSIZE,
+            'http_host_pool_sizes': cls.HTTP_HOST_POOL_SIZES,
+            'dns_cache_ttl': cls.DNS_CACHE_TTL,
             'default_format': cls.DEFAULT_FORMAT,
             'enable_progressive_jpeg': cls.ENABLE_PROGRESSIVE_JPEG,
-            'enable_optimization': cls.ENABLE_OPTIMIZATION
+            'enable_optimization': cls.ENABLE_OPTIMIZATION,
+            'batch_download_workers': cls.BATCH_DOWNLOAD_WORKERS,
+            'batch_process_workers': cls.BATCH_PROCESS_WORKERS,
+            'async_max_concurrency': cls.ASYNC_MAX_CONCURRENCY,
+            'async_executor_workers': cls.ASYNC_EXECUTOR_WORKERS,
+            'warm_max_concurrency': cls.WARM_MAX_CONCURRENCY,
+            'warm_host_rate': cls.WARM_HOST_RATE,
+            'warm_host_burst': cls.WARM_HOST_BURST
         }
 
     @classmethod
@@ -80,6 +171,63 @@ class ImageOptimizerConfig:
         if not 1 <= cls.JPEG_QUALITY <= 100:
             issues.append("JPEG_QUALITY deve estar entre 1 e 100")
         
+        if cls.RESIZE_MODE not in RESIZE_MODES:
+            issues.append(f"RESIZE_MODE deve ser um de: {list(RESIZE_MODES)}")
+        
+        if cls.TARGET_SSIM is not None:
+            if not 0 < cls.TARGET_SSIM < 1:
+                issues.append("TARGET_SSIM deve estar entre 0 e 1")
+            elif not is_ssim_available():
+                issues.append("TARGET_SSIM requer o pacote numpy")
+        
+        for name in ('INTERACTIVE_EFFORT', 'BATCH_EFFORT'):
+            if getattr(cls, name) not in EFFORT_LEVELS:
+                issues.append(f"{name} deve ser um de: {list(EFFORT_LEVELS)}")
+        
+        if cls.BATCH_DOWNLOAD_WORKERS < 1:
+            issues.append("BATCH_DOWNLOAD_WORKERS deve ser pelo menos 1")
+        
+        if cls.BATCH_PROCESS_WORKERS < 0:
+            issues.append("BATCH_PROCESS_WORKERS não pode ser negativo (0 desativa processos)")
+        
+        if cls.REVALIDATION_WINDOW < 0:
+            issues.append("REVALIDATION_WINDOW não pode ser negativo (0 desativa a revalidação)")
+        
+        if not 0 <= cls.MIN_FRESH_TTL <= cls.CACHE_TTL:
+            issues.append("MIN_FRESH_TTL deve estar entre 0 e CACHE_TTL")
+        
+        if not 0 <= cls.STALE_WHILE_REVALIDATE <= cls.REVALIDATION_WINDOW:
+            issues.append("STALE_WHILE_REVALIDATE deve estar entre 0 e REVALIDATION_WINDOW")
+        
+        if cls.REFRESH_WORKERS < 1:
+            issues.append("REFRESH_WORKERS deve ser pelo menos 1")
+        
+        unknown_classes = set(cls.NEGATIVE_CACHE_TTLS) - set(NEGATIVE_CACHE_TTLS)
+        if unknown_classes:
+            issues.append(f"NEGATIVE_CACHE_TTLS: classes desconhecidas {sorted(unknown_classes)}; "
+                          f"use: {list(NEGATIVE_CACHE_TTLS)}")
+        
+        if cls.ASYNC_MAX_CONCURRENCY < 1 or cls.ASYNC_EXECUTOR_WORKERS < 1:
+            issues.append("ASYNC_MAX_CONCURRENCY e ASYNC_EXECUTOR_WORKERS devem ser pelo menos 1")
+        
+        if cls.JOB_BACKEND not in ('auto', 'memory', 'redis'):
+            issues.append("JOB_BACKEND deve ser auto, memory ou redis")
+        
+        if cls.JOB_WORKERS < 1:
+            issues.append("JOB_WORKERS deve ser pelo menos 1")
+        
+        if cls.WARM_MAX_CONCURRENCY < 1:
+            issues.append("WARM_MAX_CONCURRENCY deve ser pelo menos 1")
+        
+        if cls.WARM_HOST_RATE < 0:
+            issues.append("WARM_HOST_RATE não pode ser negativo (0 desativa o limite)")
+        
+        if cls.PROFILING_MODE not in PROFILE_MODES:
+            issues.append(f"PROFILING_MODE deve ser um de: {list(PROFILE_MODES)}")
+        
+        if cls.PROFILING_INTERVAL_MS <= 0:
+            issues.append("PROFILING_INTERVAL_MS deve ser positivo")
+        
         if cls.DEFAULT_FORMAT not in cls.SUPPORTED_FORMATS:
             issues.append(f"DEFAULT_FORMAT deve ser um de: {cls.SUPPORTED_FORMATS}")
         
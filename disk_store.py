@@ -0,0 +1,200 @@
+"""
+Armazenamento em disco endereçado por conteúdo para imagens otimizadas
+Escritas atômicas, leituras por mmap e remoção LRU por orçamento de bytes
+"""
+
+import os
+import mmap
+import time
+import fnmatch
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+from urllib.parse import quote, unquote
+
+logger = logging.getLogger(__name__)
+
+
+class DiskContentStore:
+    """
+    Armazena valores imutáveis (chave -> bytes) em diretórios particionados
+
+    Como as chaves são endereçadas por conteúdo, uma entrada nunca fica
+    desatualizada e não precisa de TTL: só sai do disco quando o orçamento
+    de bytes é excedido (remove-se a menos usada recentemente). Registros
+    que podem ser substituídos (ex.: variante recodificada com mais esforço)
+    são gravados com replace=True.
+
+    Args:
+        root: Diretório base do armazenamento
+        max_bytes: Orçamento total em bytes
+    """
+
+    def __init__(self, root: str, max_bytes: int = 1024 * 1024 * 1024):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._index: 'OrderedDict[str, int]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.evictions = 0
+
+        os.makedirs(root, exist_ok=True)
+        self._load_index()
+
+    def _path(self, key: str) -> str:
+        """Caminho do arquivo: <root>/<aa>/<bb>/<chave codificada>"""
+        shard = hashlib.md5(key.encode()).hexdigest()
+        return os.path.join(self.root, shard[:2], shard[2:4], quote(key, safe=''))
+
+    def _load_index(self) -> None:
+        """Reconstrói o índice LRU a partir do disco (ordem pelo último acesso)"""
+        entries = []
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                if filename.startswith('.tmp-'):
+                    # Escrita interrompida: descartar
+                    try:
+                        os.unlink(os.path.join(dirpath, filename))
+                    except OSError:
+                        pass
+                    continue
+                try:
+                    stat = os.stat(os.path.join(dirpath, filename))
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, unquote(filename), stat.st_size))
+
+        for _, key, size in sorted(entries):
+            self._index[key] = size
+            self.current_bytes += size
+
+        if entries:
+            logger.info(f"💽 Cache em disco carregado: {len(entries)} arquivos, {self.current_bytes} bytes")
+        self._evict()
+
+    def get(self, key: str) -> Optional[memoryview]:
+        """Lê o valor via mmap, sem copiar para a memória do processo"""
+        path = self.path_for(key)
+        if path is None:
+            return None
+
+        try:
+            with open(path, 'rb') as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    return memoryview(b'')
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except FileNotFoundError:
+            self._forget(key)
+            return None
+
+        return memoryview(mapped)
+
+    def path_for(self, key: str) -> Optional[str]:
+        """Caminho do arquivo se a chave existir (e a marca como usada)"""
+        with self._lock:
+            if key not in self._index:
+                return None
+            self._index.move_to_end(key)
+
+        path = self._path(key)
+        try:
+            # Persistir a recência para o índice reconstruído após reinício
+            os.utime(path, (time.time(), time.time()))
+        except FileNotFoundError:
+            self._forget(key)
+            return None
+        return path
+
+    def put(self, key: str, data: bytes, replace: bool = False) -> bool:
+        """
+        Grava o valor atomicamente (arquivo temporário + rename)
+
+        Sem replace, uma chave já gravada é mantida (o conteúdo é o mesmo);
+        com replace, o arquivo existente é substituído pelo novo valor.
+        """
+        size = len(data)
+        if size > self.max_bytes:
+            if replace:
+                self.delete(key)
+            return False
+
+        with self._lock:
+            if key in self._index and not replace:
+                self._index.move_to_end(key)
+                return True
+
+        path = self._path(key)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+
+        fd, tmp_path = tempfile.mkstemp(prefix='.tmp-', dir=directory)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+
+        with self._lock:
+            self.current_bytes += size - self._index.get(key, 0)
+            self._index[key] = size
+            self._index.move_to_end(key)
+        self._evict()
+        return True
+
+    def delete(self, key: str) -> bool:
+        with self._lock:
+            if key not in self._index:
+                return False
+        self._forget(key)
+        try:
+            os.unlink(self._path(key))
+        except FileNotFoundError:
+            pass
+        return True
+
+    def clear(self, pattern: str = '*') -> int:
+        """Remove as entradas cujas chaves casam com o padrão glob"""
+        with self._lock:
+            keys = [key for key in self._index if fnmatch.fnmatchcase(key, pattern)]
+        for key in keys:
+            self.delete(key)
+        return len(keys)
+
+    def _forget(self, key: str) -> None:
+        with self._lock:
+            size = self._index.pop(key, None)
+            if size is not None:
+                self.current_bytes -= size
+
+    def _evict(self) -> None:
+        """Remove as entradas menos usadas até caber no orçamento"""
+        while True:
+            with self._lock:
+                if self.current_bytes <= self.max_bytes or not self._index:
+                    return
+                key, size = self._index.popitem(last=False)
+                self.current_bytes -= size
+                self.evictions += 1
+            try:
+                os.unlink(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'enabled': True,
+                'root': self.root,
+                'entries': len(self._index),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+                'evictions': self.evictions
+            }
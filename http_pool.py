@@ -0,0 +1,240 @@
+"""
+Camada HTTP com pool de conexões persistentes e cache de DNS
+Compartilhada pelas threads do otimizador para reaproveitar conexões TCP/TLS
+"""
+
+import socket
+import threading
+import time
+import ipaddress
+import logging
+from typing import Dict, Any, Optional, Tuple
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+logger = logging.getLogger(__name__)
+
+
+class DNSCache:
+    """Cache de resolução DNS em processo, com TTL e thread-safe"""
+
+    def __init__(self, ttl: int = 300):
+        self.ttl = ttl
+        self._entries: Dict[Tuple[str, int], Tuple[str, float]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _is_ip(host: str) -> bool:
+        try:
+            ipaddress.ip_address(host)
+            return True
+        except ValueError:
+            return False
+
+    def resolve(self, host: str, port: int) -> str:
+        """Resolve host para um endereço IP, usando o cache quando válido"""
+        if self.ttl <= 0 or self._is_ip(host):
+            return host
+
+        key = (host, port)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[1] > now:
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        # Resolução fora do lock para não serializar as threads
+        address = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)[0][4][0]
+
+        with self._lock:
+            self._entries[key] = (address, now + self.ttl)
+        return address
+
+    def invalidate(self, host: str, port: int) -> None:
+        """Remove uma entrada (ex.: após falha de conexão no IP em cache)"""
+        with self._lock:
+            self._entries.pop((host, port), None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'ttl_seconds': self.ttl,
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+
+def _connection_class(base: type, dns_cache: DNSCache) -> type:
+    """Cria classe de conexão urllib3 que resolve o host pelo DNSCache"""
+
+    class CachedDNSConnection(base):
+        def _new_conn(self):
+            # SNI e validação de certificado continuam usando o hostname original
+            original_host = self._dns_host
+            self._dns_host = dns_cache.resolve(original_host, self.port)
+            try:
+                return super()._new_conn()
+            except Exception:
+                dns_cache.invalidate(original_host, self.port)
+                raise
+            finally:
+                self._dns_host = original_host
+
+    return CachedDNSConnection
+
+
+class CachedDNSAdapter(HTTPAdapter):
+    """HTTPAdapter cujos pools de conexão usam o DNSCache compartilhado"""
+
+    def __init__(self, dns_cache: DNSCache, **kwargs):
+        self.dns_cache = dns_cache
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+
+        class CachedHTTPConnectionPool(HTTPConnectionPool):
+            ConnectionCls = _connection_class(HTTPConnection, self.dns_cache)
+
+        class CachedHTTPSConnectionPool(HTTPSConnectionPool):
+            ConnectionCls = _connection_class(HTTPSConnection, self.dns_cache)
+
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': CachedHTTPConnectionPool,
+            'https': CachedHTTPSConnectionPool
+        }
+
+
+class PooledHTTPClient:
+    """
+    Sessão HTTP compartilhada com keep-alive, pools por host e cache de DNS
+
+    Args:
+        pool_maxsize: Conexões mantidas por host (padrão)
+        host_pool_sizes: Tamanho de pool específico por host
+        dns_ttl: TTL do cache de DNS em segundos (0 desativa)
+    """
+
+    def __init__(self, pool_maxsize: int = 10, host_pool_sizes: Dict[str, int] = None,
+                 dns_ttl: int = 300):
+        self.pool_maxsize = pool_maxsize
+        self.host_pool_sizes = dict(host_pool_sizes or {})
+        self.dns_cache = DNSCache(dns_ttl)
+        self.session = requests.Session()
+        self._adapters: Dict[str, CachedDNSAdapter] = {}
+
+        default_adapter = self._new_adapter(pool_maxsize)
+        self.session.mount('http://', default_adapter)
+        self.session.mount('https://', default_adapter)
+        self._adapters['*'] = default_adapter
+
+        for host, size in self.host_pool_sizes.items():
+            adapter = self._new_adapter(size)
+            # Barra final: o requests escolhe o adaptador por prefixo, e sem ela
+            # https://example.com também casaria com https://example.com.evil.net
+            self.session.mount(f'http://{host}/', adapter)
+            self.session.mount(f'https://{host}/', adapter)
+            self._adapters[host] = adapter
+
+        self._lock = threading.Lock()
+        self.requests_made = 0
+
+    def _new_adapter(self, pool_maxsize: int) -> CachedDNSAdapter:
+        return CachedDNSAdapter(
+            self.dns_cache,
+            pool_connections=max(self.pool_maxsize, 10),
+            pool_maxsize=pool_maxsize
+        )
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        """GET através da sessão compartilhada"""
+        with self._lock:
+            self.requests_made += 1
+        return self.session.get(url, **kwargs)
+
+    def stats(self) -> Dict[str, Any]:
+        """Estatísticas dos pools de conexão e do cache de DNS"""
+        hosts = {}
+        for adapter in self._adapters.values():
+            pools = adapter.poolmanager.pools
+            for key in list(pools.keys()):
+                pool = pools.get(key)
+                if pool is None:
+                    continue
+                idle = pool.pool.qsize() if pool.pool is not None else 0
+                hosts[f"{pool.scheme}://{pool.host}:{pool.port}"] = {
+                    'pool_maxsize': adapter._pool_maxsize,
+                    'connections_opened': pool.num_connections,
+                    'requests': pool.num_requests,
+                    'idle_connections': idle
+                }
+
+        return {
+            'requests': self.requests_made,
+            'default_pool_maxsize': self.pool_maxsize,
+            'host_pool_sizes': self.host_pool_sizes,
+            'hosts': hosts,
+            'dns_cache': self.dns_cache.stats()
+        }
+
+    def close(self) -> None:
+        self.session.close()
+
+
+class HostRateLimiter:
+    """
+    Limite de requisições por host de origem (token bucket, thread-safe)
+
+    Cada host acumula até burst fichas, repostas a rate por segundo. Uma
+    chamada sem ficha disponível reserva a próxima e dorme até ela, então
+    as threads de um mesmo host são atendidas em ordem de chegada.
+
+    Args:
+        rate: Requisições por segundo por host (0 desativa o limite)
+        burst: Requisições seguidas permitidas antes de limitar (padrão: max(1, rate))
+    """
+
+    def __init__(self, rate: float, burst: int = None):
+        self.rate = rate
+        self.burst = burst or max(1, int(rate))
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+        self.waited_seconds = 0.0
+
+    def acquire(self, url: str) -> float:
+        """Reserva uma requisição para o host da URL; retorna os segundos esperados"""
+        if self.rate <= 0:
+            return 0.0
+
+        host = urlsplit(url).hostname or url
+        with self._lock:
+            now = time.monotonic()
+            tokens, updated = self._buckets.get(host, (float(self.burst), now))
+            tokens = min(float(self.burst), tokens + (now - updated) * self.rate)
+            wait = 0.0 if tokens >= 1 else (1 - tokens) / self.rate
+            self._buckets[host] = (tokens - 1, now)
+            self.waited_seconds += wait
+
+        if wait:
+            time.sleep(wait)
+        return wait
+
+
+def parse_host_pool_sizes(value: Optional[str]) -> Dict[str, int]:
+    """Converte 'host1=20,host2=5' em {'host1': 20, 'host2': 5}"""
+    sizes = {}
+    for item in (value or '').split(','):
+        if '=' not in item:
+            continue
+        host, size = item.split('=', 1)
+        sizes[host.strip()] = int(size)
+    return sizes
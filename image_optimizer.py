@@ -5,22 +5,107 @@ Integrado com backend existente, cache Redis e validação de imagens
 
 import os
 import io
+import time
 import base64
+import asyncio
 import hashlib
 import logging
+import threading
+import multiprocessing
 import requests
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime, timedelta
-from typing import Dict, Any, Optional, Tuple
+from functools import partial
+from typing import Dict, Any, Optional, Tuple, List, Callable
 from PIL import Image, ImageOps
 import redis
 from flask import Flask, request, jsonify
 from urllib.parse import urlparse
 import json
 
+try:
+    import aiohttp
+except ImportError:  # aiohttp é opcional: só a API assíncrona depende dele
+    aiohttp = None
+
+from http_pool import PooledHTTPClient, HostRateLimiter
+from cache import MemoryLRUCache, CacheCounters, SingleFlight, RedisStatsBuffer
+from disk_store import DiskContentStore
+from metrics import OptimizerMetrics
+from quality_search import search_quality
+from utils import (sniff_image_content_type, get_format_mime_type, generate_responsive_sizes, resize_image,
+                   get_encoder_effort, SIGNATURE_SNIFF_BYTES, DEFAULT_RESIZE_MODE, EFFORT_LEVELS,
+                   NEGATIVE_CACHE_TTLS)
+
 # Configuração de logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Formatos em que a qualidade de compressão afeta o resultado
+LOSSY_FORMATS = ('WEBP', 'JPEG', 'AVIF')
+
+# Otimizador reutilizado pelos processos do pool de CPU (um por processo)
+_worker_optimizer = None
+
+
+def _init_process_worker(config: Dict[str, Any]) -> None:
+    """Inicializa o otimizador dentro de cada processo do pool"""
+    global _worker_optimizer
+    _worker_optimizer = ImageOptimizer(config=config)
+
+
+def _optimize_in_process(image_data: bytes, spec: Dict[str, Any],
+                         effort: str = None) -> Tuple[bytes, Dict[str, Any]]:
+    """Executa a otimização de uma especificação em um processo do pool de CPU"""
+    return _worker_optimizer._optimize_with_spec(image_data, spec, effort)
+
+
+# Máximo de chaves derivadas (variantes e binários) registradas no índice de uma URL
+MAX_INDEXED_KEYS = 64
+
+
+class ImageFetchError(ValueError):
+    """Falha de download classificada (a classe define o TTL do cache negativo)"""
+    
+    def __init__(self, message: str, error_class: str):
+        super().__init__(message)
+        self.error_class = error_class
+
+
+class _DownloadBuffer:
+    """Acumula um download em blocos, validando tamanho e assinatura e calculando o hash"""
+    
+    def __init__(self, max_file_size: int, sniff: Callable[[bytes], str]):
+        self.max_file_size = max_file_size
+        self.sniff = sniff
+        self.buffer = bytearray()
+        self.digest = hashlib.sha256()
+        self.sniffed_type = None
+    
+    def feed(self, chunk: bytes) -> None:
+        if not chunk:
+            return
+        
+        self.buffer += chunk
+        if len(self.buffer) > self.max_file_size:
+            raise ImageFetchError(f"Arquivo muito grande: mais de {self.max_file_size} bytes", 'too_large')
+        
+        if self.sniffed_type is None and len(self.buffer) >= SIGNATURE_SNIFF_BYTES:
+            self.sniffed_type = self.sniff(bytes(self.buffer[:SIGNATURE_SNIFF_BYTES]))
+        
+        self.digest.update(chunk)
+    
+    def finish(self) -> Dict[str, Any]:
+        if self.sniffed_type is None:
+            self.sniffed_type = self.sniff(bytes(self.buffer))
+        return {
+            'data': bytes(self.buffer),
+            'sniffed_type': self.sniffed_type,
+            'hash': self.digest.hexdigest()[:16]
+        }
+
+
 class ImageOptimizer:
     def __init__(self, redis_client=None, config=None):
         """
@@ -39,8 +124,86 @@ class ImageOptimizer:
         self.thumbnail_size = self.config.get('thumbnail_size', (1080, 1080))
         self.webp_quality = self.config.get('webp_quality', 85)
         self.jpeg_quality = self.config.get('jpeg_quality', 90)
+        self.resize_mode = self.config.get('resize_mode', DEFAULT_RESIZE_MODE)
+        
+        # Alvo de SSIM padrão (None = qualidade fixa por formato)
+        self.target_ssim = self.config.get('target_ssim')
+        
+        # Esforço do codificador: padrão por tipo de chamada (interativa ou em lote)
+        self.interactive_effort = self.config.get('interactive_effort', 'balanced')
+        self.batch_effort = self.config.get('batch_effort', 'max')
         self.cache_ttl = self.config.get('cache_ttl', 86400 * 7)  # 7 dias
         
+        # Revalidação na origem: entradas vencidas continuam guardadas por mais
+        # revalidation_window segundos e são renovadas por requisição condicional
+        self.revalidation_window = self.config.get('revalidation_window', 86400 * 7)
+        self.min_fresh_ttl = self.config.get('min_fresh_ttl', 300)
+        self.storage_ttl = self.cache_ttl + self.revalidation_window
+        
+        # Stale-while-revalidate: até stale_while_revalidate segundos após vencer, a
+        # entrada é servida na hora (stale) e renovada em segundo plano, uma vez por URL
+        self.stale_while_revalidate = min(self.config.get('stale_while_revalidate', 86400 * 7),
+                                          self.revalidation_window)
+        self.refresh_workers = self.config.get('refresh_workers', 2)
+        self._refresh_executor = None
+        self._refreshing = set()
+        self._refresh_lock = threading.Lock()
+        
+        # Matriz de variantes (srcset): larguras e formatos padrão
+        self.responsive_breakpoints = self.config.get('responsive_breakpoints', [320, 640, 768, 1024, 1280, 1920])
+        self.variant_formats = self.config.get('variant_formats', ['WEBP', 'JPEG'])
+        
+        # Paralelismo do lote: threads para download (I/O), processos para otimização (CPU)
+        self.batch_download_workers = self.config.get('batch_download_workers', 8)
+        self.batch_process_workers = self.config.get('batch_process_workers', os.cpu_count() or 1)
+        self._process_pool = None
+        self._pool_lock = threading.Lock()
+        
+        # API assíncrona: downloads concorrentes em um event loop, resto em threads
+        self.async_max_concurrency = self.config.get('async_max_concurrency', 200)
+        self.async_executor_workers = self.config.get('async_executor_workers', max(4, (os.cpu_count() or 1) * 2))
+        self._async_executor = None
+        
+        self.download_chunk_size = self.config.get('download_chunk_size', 64 * 1024)
+        
+        # Aquecimento do cache: URLs em paralelo e downloads por segundo por host de origem
+        self.warm_max_concurrency = self.config.get('warm_max_concurrency', 8)
+        self.warm_host_rate = self.config.get('warm_host_rate', 5.0)
+        self.warm_host_burst = self.config.get('warm_host_burst')
+        
+        # Camada de cache em processo (read-through/write-through sobre o Redis)
+        self.memory_cache = MemoryLRUCache(
+            max_bytes=self.config.get('memory_cache_bytes', 64 * 1024 * 1024),
+            ttl=min(self.config.get('memory_cache_ttl', 300), self.cache_ttl)
+        )
+        self.cache_counters = CacheCounters('memory', 'disk', 'redis')
+        
+        # Camada em disco para binários (imutáveis) e registros de variantes, sem TTL
+        disk_cache_dir = self.config.get('disk_cache_dir')
+        self.disk_store = DiskContentStore(
+            disk_cache_dir, max_bytes=self.config.get('disk_cache_bytes', 1024 * 1024 * 1024)
+        ) if disk_cache_dir else None
+        
+        # Contadores agregados no Redis (entries, bytes, hits, misses) para /cache-stats O(1)
+        self.redis_stats = RedisStatsBuffer(redis_client, flush_interval=self.config.get('stats_flush_interval', 5))
+        self.scan_batch_size = self.config.get('scan_batch_size', 500)
+        
+        # Otimizações idênticas em andamento são coalescidas pela chave de cache
+        self.inflight = SingleFlight()
+        
+        # Cache negativo: falhas repetidas respondem do cache até o TTL da classe de erro
+        self.negative_cache_ttls = {**NEGATIVE_CACHE_TTLS, **self.config.get('negative_cache_ttls', {})}
+        
+        # Latência por etapa, CPU por requisição e contadores para /metrics
+        self.metrics = OptimizerMetrics()
+        
+        # Sessão HTTP compartilhada (keep-alive, pools por host, cache de DNS)
+        self.http_client = PooledHTTPClient(
+            pool_maxsize=self.config.get('http_pool_maxsize', 10),
+            host_pool_sizes=self.config.get('http_host_pool_sizes'),
+            dns_ttl=self.config.get('dns_cache_ttl', 300)
+        )
+        
         # Formatos suportados
         self.supported_formats = ['JPEG', 'PNG', 'GIF', 'BMP', 'TIFF', 'WEBP']
         
@@ -59,10 +222,37 @@ class ImageOptimizer:
             'webp_quality': 85,
             'jpeg_quality': 90,
             'avif_quality': 80,
+            'resize_mode': DEFAULT_RESIZE_MODE,
+            'target_ssim': None,
+            'interactive_effort': 'balanced',
+            'batch_effort': 'max',
             'cache_ttl': 86400 * 7,  # 7 dias
+            'revalidation_window': 86400 * 7,
+            'min_fresh_ttl': 300,
+            'stale_while_revalidate': 86400 * 7,
+            'refresh_workers': 2,
+            'responsive_breakpoints': [320, 640, 768, 1024, 1280, 1920],
+            'variant_formats': ['WEBP', 'JPEG'],
             'max_file_size': 10 * 1024 * 1024,  # 10MB
             'timeout': 30,
-            'user_agent': 'TopGrupos-ImageOptimizer/1.0'
+            'user_agent': 'TopGrupos-ImageOptimizer/1.0',
+            'batch_download_workers': 8,
+            'batch_process_workers': os.cpu_count() or 1,
+            'async_max_concurrency': 200,
+            'async_executor_workers': max(4, (os.cpu_count() or 1) * 2),
+            'warm_max_concurrency': 8,
+            'warm_host_rate': 5.0,
+            'warm_host_burst': None,
+            'http_pool_maxsize': 10,
+            'http_host_pool_sizes': {},
+            'dns_cache_ttl': 300,
+            'download_chunk_size': 64 * 1024,
+            'memory_cache_bytes': 64 * 1024 * 1024,  # 64MB
+            'memory_cache_ttl': 300,
+            'disk_cache_dir': None,
+            'disk_cache_bytes': 1024 * 1024 * 1024,  # 1GB
+            'stats_flush_interval': 5,
+            'scan_batch_size': 500
         }
 
     def _generate_image_hash(self, image_data: bytes) -> str:
@@ -94,51 +284,121 @@ class ImageOptimizer:
         Returns:
             Tuple[bytes, str]: (dados da imagem, content-type)
         """
-        try:
-            logger.info(f"📥 Baixando imagem: {image_url}")
-            
-            headers = {
-                'User-Agent': self.config['user_agent'],
-                'Accept': 'image/*,*/*;q=0.8',
-                'Accept-Encoding': 'gzip, deflate',
-                'Connection': 'keep-alive'
-            }
-            
-            response = requests.get(
-                image_url,
-                headers=headers,
-                timeout=self.config['timeout'],
-                stream=True
-            )
-            response.raise_for_status()
-            
-            # Verificar content-type
-            content_type = response.headers.get('content-type', '')
-            if not content_type.startswith('image/'):
-                raise ValueError(f"URL não retorna uma imagem válida: {content_type}")
+        fetched = self._fetch_image(image_url)
+        return fetched['data'], fetched['content_type']
+
+    def _fetch_image(self, image_url: str, validators: Dict[str, Any] = None) -> Dict[str, Any]:
+        """
+        Baixa a imagem em blocos, validando e calculando o hash durante o download
+        
+        O download é abortado assim que o limite de tamanho é ultrapassado ou
+        quando os primeiros bytes não correspondem a nenhuma assinatura de imagem.
+        Com validators (etag/last_modified de um download anterior) a requisição
+        é condicional e um 304 dispensa o corpo.
+        
+        Returns:
+            Dict: data, content_type, sniffed_type, hash (SHA-256 truncado) e
+            origin (cabeçalhos de cache da origem); ou not_modified e origin
+            se a origem responder 304
+        """
+        with self.metrics.stage('download'):
+            try:
+                logger.info(f"📥 Baixando imagem: {image_url}")
             
-            # Verificar tamanho do arquivo
-            content_length = response.headers.get('content-length')
-            if content_length and int(content_length) > self.config['max_file_size']:
-                raise ValueError(f"Arquivo muito grande: {content_length} bytes")
+                headers = {**self._get_request_headers(), **self._get_conditional_headers(validators)}
+                max_file_size = self.config.get('max_file_size', 10 * 1024 * 1024)
             
-            image_data = response.content
+                response = self.http_client.get(
+                    image_url,
+                    headers=headers,
+                    timeout=self.config.get('timeout', 30),
+                    stream=True
+                )
             
-            if len(image_data) > self.config['max_file_size']:
-                raise ValueError(f"Arquivo muito grande: {len(image_data)} bytes")
+                try:
+                    origin = self._get_origin_headers(response.headers)
+                    if validators and response.status_code == 304:
+                        logger.info(f"♻️ Imagem não modificada na origem: {image_url}")
+                        return {'not_modified': True, 'origin': origin}
+                    
+                    response.raise_for_status()
+                    content_type = self._check_response_headers(response.headers, max_file_size)
+                
+                    download = _DownloadBuffer(max_file_size, self._sniff_or_reject)
+                    for chunk in response.iter_content(chunk_size=self.download_chunk_size):
+                        download.feed(chunk)
+                    fetched = download.finish()
+                finally:
+                    # Libera a conexão para o pool (ou descarta se abortado no meio)
+                    response.close()
             
-            logger.info(f"✅ Imagem baixada: {len(image_data)} bytes, tipo: {content_type}")
-            return image_data, content_type
+                self.metrics.bytes_in.inc(len(fetched['data']))
+                logger.info(f"✅ Imagem baixada: {len(fetched['data'])} bytes, tipo: {content_type}")
+                return {**fetched, 'content_type': content_type, 'origin': origin}
             
-        except requests.exceptions.RequestException as e:
-            logger.error(f"❌ Erro ao baixar imagem {image_url}: {e}")
-            raise
-        except Exception as e:
-            logger.error(f"❌ Erro inesperado ao baixar {image_url}: {e}")
-            raise
+            except requests.exceptions.RequestException as e:
+                logger.error(f"❌ Erro ao baixar imagem {image_url}: {e}")
+                raise
+            except Exception as e:
+                logger.error(f"❌ Erro inesperado ao baixar {image_url}: {e}")
+                raise
+
+    def _get_request_headers(self) -> Dict[str, str]:
+        """Cabeçalhos enviados à origem nos downloads"""
+        return {
+            'User-Agent': self.config.get('user_agent', 'TopGrupos-ImageOptimizer/1.0'),
+            'Accept': 'image/*,*/*;q=0.8',
+            'Accept-Encoding': 'gzip, deflate',
+            'Connection': 'keep-alive'
+        }
+
+    @staticmethod
+    def _get_conditional_headers(validators: Optional[Dict[str, Any]]) -> Dict[str, str]:
+        """If-None-Match/If-Modified-Since a partir dos validadores guardados"""
+        headers = {}
+        if validators and validators.get('etag'):
+            headers['If-None-Match'] = validators['etag']
+        if validators and validators.get('last_modified'):
+            headers['If-Modified-Since'] = validators['last_modified']
+        return headers
+
+    @staticmethod
+    def _get_origin_headers(headers) -> Dict[str, str]:
+        """ETag, Last-Modified e Cache-Control da resposta da origem"""
+        origin = {
+            'etag': headers.get('etag'),
+            'last_modified': headers.get('last-modified'),
+            'cache_control': headers.get('cache-control')
+        }
+        return {name: value for name, value in origin.items() if value}
+
+    @staticmethod
+    def _check_response_headers(headers, max_file_size: int) -> str:
+        """Valida content-type e content-length da resposta; retorna o content-type"""
+        # Verificar content-type
+        content_type = headers.get('content-type', '')
+        if not content_type.startswith('image/'):
+            raise ImageFetchError(f"URL não retorna uma imagem válida: {content_type}", 'not_image')
+        
+        # Verificar tamanho do arquivo
+        content_length = headers.get('content-length')
+        if content_length and int(content_length) > max_file_size:
+            raise ImageFetchError(f"Arquivo muito grande: {content_length} bytes", 'too_large')
+        
+        return content_type
+
+    @staticmethod
+    def _sniff_or_reject(header: bytes) -> str:
+        """Valida os magic bytes do arquivo baixado"""
+        sniffed_type = sniff_image_content_type(header)
+        if not sniffed_type:
+            raise ImageFetchError("Conteúdo baixado não corresponde a um formato de imagem suportado", 'not_image')
+        return sniffed_type
 
     def _optimize_image(self, image_data: bytes, output_format: str = 'WEBP', 
-                       is_thumbnail: bool = False) -> Tuple[bytes, Dict[str, Any]]:
+                       is_thumbnail: bool = False, quality: int = None,
+                       max_size: Tuple[int, int] = None, effort: str = None,
+                       target_ssim: float = None, max_bytes: int = None) -> Tuple[bytes, Dict[str, Any]]:
         """
         Otimiza a imagem: redimensiona e converte formato
         
@@ -146,12 +406,19 @@ class ImageOptimizer:
             image_data: Dados binários da imagem
             output_format: Formato de saída ('WEBP', 'JPEG', 'AVIF')
             is_thumbnail: Se deve criar thumbnail
+            quality: Qualidade de compressão (padrão do formato se None)
+            max_size: Limites (largura, altura); padrão thumbnail_size ou max_width x max_height
+            effort: Perfil de esforço do codificador (padrão: batch_effort)
+            target_ssim: Buscar a menor qualidade com SSIM >= alvo (formatos com perdas)
+            max_bytes: Buscar a maior qualidade que caiba neste tamanho
             
         Returns:
             Tuple[bytes, Dict]: (dados otimizados, metadados)
         """
         try:
             logger.info(f"🔄 Otimizando imagem para formato {output_format}")
+            started = time.perf_counter()
+            cpu_started = time.thread_time()
             
             # Abrir imagem com PIL
             with Image.open(io.BytesIO(image_data)) as img:
@@ -161,64 +428,145 @@ class ImageOptimizer:
                 
                 logger.info(f"📊 Imagem original: {original_size}, formato: {original_format}, modo: {original_mode}")
                 
-                # Converter para RGB se necessário (para WebP/JPEG)
-                if img.mode in ('RGBA', 'LA', 'P') and output_format in ['JPEG']:
-                    # Criar fundo branco para JPEG
-                    background = Image.new('RGB', img.size, (255, 255, 255))
-                    if img.mode == 'P':
-                        img = img.convert('RGBA')
-                    background.paste(img, mask=img.split()[-1] if img.mode == 'RGBA' else None)
-                    img = background
-                elif img.mode != 'RGB' and output_format == 'WEBP':
-                    # WebP suporta transparência, manter RGBA se necessário
-                    if img.mode not in ['RGB', 'RGBA']:
-                        img = img.convert('RGBA')
+                # Calcular o tamanho final pelo cabeçalho, antes de decodificar os pixels
+                oriented_size = self._get_oriented_size(img)
+                new_size = self._calculate_new_size(oriented_size, is_thumbnail, max_size)
+                
+                # JPEG: decodificar já reduzido (escala DCT 1/2, 1/4 ou 1/8) quando possível
+                draft_scale = self._apply_jpeg_draft(img, oriented_size, new_size)
                 
-                # Aplicar orientação EXIF se presente
+                # Aplicar orientação EXIF se presente (antes das conversões, que descartam o EXIF)
                 img = ImageOps.exif_transpose(img)
                 
-                # Redimensionar se necessário
-                new_size = self._calculate_new_size(img.size, is_thumbnail)
+                # Converter para RGB se necessário (para WebP/JPEG)
+                img = self._convert_mode(img, output_format)
+                img.load()
+                decoded = time.perf_counter()
+                
+                # Redimensionar se necessário (a partir da decodificação reduzida)
                 if new_size != img.size:
                     logger.info(f"📏 Redimensionando de {img.size} para {new_size}")
-                    img = img.resize(new_size, Image.Resampling.LANCZOS)
+                    img = resize_image(img, new_size, self.resize_mode)
+                resized = time.perf_counter()
                 
                 # Salvar imagem otimizada
-                output_buffer = io.BytesIO()
-                save_kwargs = self._get_save_kwargs(output_format)
+                def encode(encode_quality: int = None) -> bytes:
+                    output_buffer = io.BytesIO()
+                    save_kwargs = self._get_save_kwargs(output_format, encode_quality, effort)
+                    img.save(output_buffer, format=output_format, **save_kwargs)
+                    return output_buffer.getvalue()
                 
-                img.save(output_buffer, format=output_format, **save_kwargs)
-                optimized_data = output_buffer.getvalue()
+                search = None
+                if output_format in LOSSY_FORMATS and (target_ssim is not None or max_bytes is not None):
+                    search = search_quality(img, encode, target_ssim, max_bytes, start_quality=quality)
+                    optimized_data = search['data']
+                else:
+                    optimized_data = encode(quality)
+                encoded = time.perf_counter()
                 
                 # Calcular estatísticas
-                size_reduction = ((len(image_data) - len(optimized_data)) / len(image_data)) * 100
-                
-                metadata = {
-                    'original_size': original_size,
-                    'new_size': new_size,
-                    'original_format': original_format,
-                    'new_format': output_format,
-                    'original_bytes': len(image_data),
-                    'optimized_bytes': len(optimized_data),
-                    'size_reduction_percent': round(size_reduction, 2),
-                    'compression_ratio': round(len(image_data) / len(optimized_data), 2)
+                metadata = self._build_metadata(image_data, optimized_data, original_size, new_size,
+                                                original_format, output_format, draft_scale)
+                # Medido aqui para atravessar o pool de processos junto com o resultado
+                metadata['timings_ms'] = {
+                    'decode': round((decoded - started) * 1000, 3),
+                    'resize': round((resized - decoded) * 1000, 3),
+                    'encode': round((encoded - resized) * 1000, 3),
+                    'cpu': round((time.thread_time() - cpu_started) * 1000, 3)
                 }
+                if search:
+                    metadata['quality_search'] = {
+                        key: search[key] for key in ('quality', 'ssim', 'probes', 'content_class')
+                    }
                 
-                logger.info(f"✅ Otimização concluída: {size_reduction:.1f}% de redução")
+                logger.info(f"✅ Otimização concluída: {metadata['size_reduction_percent']:.1f}% de redução")
                 return optimized_data, metadata
                 
         except Exception as e:
             logger.error(f"❌ Erro na otimização: {e}")
             raise
 
+    @staticmethod
+    def _convert_mode(img: Image.Image, output_format: str) -> Image.Image:
+        """Ajusta o modo de cor ao formato de saída"""
+        if img.mode in ('RGBA', 'LA', 'P') and output_format in ['JPEG']:
+            # Criar fundo branco para JPEG
+            background = Image.new('RGB', img.size, (255, 255, 255))
+            if img.mode == 'P':
+                img = img.convert('RGBA')
+            background.paste(img, mask=img.split()[-1] if img.mode == 'RGBA' else None)
+            return background
+        elif img.mode != 'RGB' and output_format == 'WEBP':
+            # WebP suporta transparência, manter RGBA se necessário
+            if img.mode not in ['RGB', 'RGBA']:
+                return img.convert('RGBA')
+        return img
+
+    @staticmethod
+    def _build_metadata(image_data: bytes, optimized_data: bytes, original_size: Tuple[int, int],
+                        new_size: Tuple[int, int], original_format: str, output_format: str,
+                        draft_scale: int) -> Dict[str, Any]:
+        """Estatísticas de uma otimização"""
+        size_reduction = ((len(image_data) - len(optimized_data)) / len(image_data)) * 100
+        return {
+            'original_size': original_size,
+            'new_size': new_size,
+            'original_format': original_format,
+            'new_format': output_format,
+            'decode_scale': draft_scale,
+            'original_bytes': len(image_data),
+            'optimized_bytes': len(optimized_data),
+            'size_reduction_percent': round(size_reduction, 2),
+            'compression_ratio': round(len(image_data) / len(optimized_data), 2)
+        }
+
+    @staticmethod
+    def _get_oriented_size(img: Image.Image) -> Tuple[int, int]:
+        """Tamanho da imagem após aplicar a orientação EXIF (sem decodificar)"""
+        try:
+            orientation = img.getexif().get(0x0112, 1)
+        except Exception:
+            orientation = 1
+        
+        # Orientações 5-8 trocam largura e altura
+        if orientation in (5, 6, 7, 8):
+            return (img.size[1], img.size[0])
+        return img.size
+
+    @staticmethod
+    def _apply_jpeg_draft(img: Image.Image, oriented_size: Tuple[int, int],
+                          target_size: Tuple[int, int]) -> int:
+        """
+        Configura o decodificador JPEG para a menor redução em potência de 2
+        que ainda fique igual ou acima do tamanho alvo
+        
+        Returns:
+            int: Fator de redução aplicado na decodificação (1 = sem redução)
+        """
+        if img.format != 'JPEG' or target_size == oriented_size:
+            return 1
+        
+        # O alvo é calculado na orientação final; o draft opera na orientação armazenada
+        if oriented_size != img.size:
+            target_size = (target_size[1], target_size[0])
+        
+        full_width = img.size[0]
+        img.draft(None, target_size)
+        scale = full_width // img.size[0]
+        
+        if scale > 1:
+            logger.info(f"⚡ Decodificação JPEG reduzida 1/{scale}: {img.size}")
+        return scale
+
     def _calculate_new_size(self, original_size: Tuple[int, int], 
-                           is_thumbnail: bool = False) -> Tuple[int, int]:
+                           is_thumbnail: bool = False,
+                           max_size: Tuple[int, int] = None) -> Tuple[int, int]:
         """Calcula novo tamanho mantendo proporção"""
         width, height = original_size
         
         if is_thumbnail:
             # Para thumbnails, usar tamanho fixo com crop
-            target_width, target_height = self.thumbnail_size
+            target_width, target_height = max_size or self.thumbnail_size
             
             # Calcular proporção para manter aspecto
             ratio = min(target_width / width, target_height / height)
@@ -228,74 +576,159 @@ class ImageOptimizer:
             return (new_width, new_height)
         
         # Para imagens normais, respeitar limites máximos
-        if width <= self.max_width and height <= self.max_height:
+        max_width, max_height = max_size or (self.max_width, self.max_height)
+        if width <= max_width and height <= max_height:
             return original_size
         
         # Calcular nova proporção
-        ratio = min(self.max_width / width, self.max_height / height)
+        ratio = min(max_width / width, max_height / height)
         new_width = int(width * ratio)
         new_height = int(height * ratio)
         
         return (new_width, new_height)
 
-    def _get_save_kwargs(self, output_format: str) -> Dict[str, Any]:
-        """Retorna parâmetros de salvamento para cada formato"""
+    def _get_default_quality(self, output_format: str) -> int:
+        """Qualidade padrão configurada para o formato"""
+        if output_format == 'JPEG':
+            return self.jpeg_quality
+        elif output_format == 'AVIF':
+            return self.config.get('avif_quality', 80)
+        return self.webp_quality
+
+    def _get_save_kwargs(self, output_format: str, quality: int = None,
+                         effort: str = None) -> Dict[str, Any]:
+        """Retorna parâmetros de salvamento para cada formato e perfil de esforço"""
+        quality = quality or self._get_default_quality(output_format)
+        encoder = get_encoder_effort(effort or self.batch_effort)
         if output_format == 'WEBP':
             return {
-                'quality': self.webp_quality,
-                'method': 6,  # Melhor compressão
+                'quality': quality,
+                'method': encoder['webp_method'],
                 'optimize': True
             }
         elif output_format == 'JPEG':
             return {
-                'quality': self.jpeg_quality,
-                'optimize': True,
+                'quality': quality,
+                'optimize': encoder['jpeg_optimize'],
                 'progressive': True
             }
         elif output_format == 'AVIF':
             return {
-                'quality': self.config.get('avif_quality', 80),
-                'speed': 6  # Melhor qualidade
+                'quality': quality,
+                'speed': encoder['avif_speed']
             }
         else:
             return {'optimize': True}
 
-    def _get_cache_key(self, image_url: str, options: Dict[str, Any]) -> str:
-        """Gera chave única para cache baseada na URL e opções"""
-        options_str = json.dumps(options, sort_keys=True)
-        combined = f"{image_url}:{options_str}"
-        return f"img_opt:{hashlib.md5(combined.encode()).hexdigest()}"
+    def _get_transform_spec(self, opt_options: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Especificação canônica da transformação, com todos os padrões resolvidos
+        
+        Duas requisições que produzem o mesmo resultado têm a mesma especificação,
+        e opções que não afetam o resultado (ex.: return_base64) ficam de fora.
+        """
+        output_format = opt_options['format'].upper()
+        spec = {'format': output_format}
+        
+        if output_format in LOSSY_FORMATS:
+            # Alvo de SSIM/bytes: a qualidade é buscada; o alvo padrão só vale sem qualidade explícita
+            target_ssim = opt_options.get('target_ssim')
+            if target_ssim is None and opt_options.get('max_bytes') is None and not opt_options.get('quality'):
+                target_ssim = self.target_ssim
+            
+            if target_ssim is not None or opt_options.get('max_bytes') is not None:
+                if target_ssim is not None:
+                    spec['target_ssim'] = round(float(target_ssim), 4)
+                if opt_options.get('max_bytes') is not None:
+                    spec['max_bytes'] = int(opt_options['max_bytes'])
+            else:
+                spec['quality'] = int(opt_options.get('quality') or self._get_default_quality(output_format))
+        
+        if opt_options.get('is_thumbnail'):
+            spec['resize'] = 'fit'
+            spec['width'], spec['height'] = self.thumbnail_size
+        else:
+            spec['resize'] = 'clamp'
+            spec['width'] = int(opt_options.get('max_width') or self.max_width)
+            spec['height'] = int(opt_options.get('max_height') or self.max_height)
+        
+        return spec
+
+    @staticmethod
+    def _get_spec_id(spec: Dict[str, Any]) -> str:
+        """Identificador curto e estável de uma especificação"""
+        canonical = json.dumps(spec, sort_keys=True, separators=(',', ':'))
+        return hashlib.md5(canonical.encode()).hexdigest()[:16]
+
+    def _optimize_with_spec(self, image_data: bytes, spec: Dict[str, Any],
+                            effort: str = None) -> Tuple[bytes, Dict[str, Any]]:
+        """Aplica uma especificação canônica com _optimize_image"""
+        return self._optimize_image(
+            image_data,
+            spec['format'],
+            is_thumbnail=spec['resize'] == 'fit',
+            quality=spec.get('quality'),
+            max_size=(spec['width'], spec['height']),
+            effort=effort,
+            target_ssim=spec.get('target_ssim'),
+            max_bytes=spec.get('max_bytes')
+        )
+
+    def _resolve_effort(self, options: Dict[str, Any], default: str) -> str:
+        """Perfil de esforço da requisição (validado), ou o padrão do ponto de entrada"""
+        effort = options.get('effort') or default
+        get_encoder_effort(effort)
+        return effort
+
+    @staticmethod
+    def _satisfies_effort(record: Dict[str, Any], effort: str) -> bool:
+        """
+        Um resultado em cache serve se foi codificado com esforço igual ou maior
+        
+        Registros sem o campo são anteriores aos perfis (sempre esforço máximo).
+        """
+        return EFFORT_LEVELS.index(record.get('effort', 'max')) >= EFFORT_LEVELS.index(effort)
+
+    def _get_cache_key(self, image_url: str, spec: Dict[str, Any]) -> str:
+        """Chave que identifica a otimização de uma URL com uma especificação"""
+        return f"{self._get_url_index_key(image_url)}:{self._get_spec_id(spec)}"
+
+    @staticmethod
+    def _get_url_index_key(image_url: str) -> str:
+        """Chave do índice URL -> hash da imagem original"""
+        return f"img_url:{hashlib.md5(image_url.encode()).hexdigest()}"
+
+    @staticmethod
+    def _get_negative_key(image_url: str) -> str:
+        """Chave do cache negativo da URL (separada do índice, que continua válido)"""
+        return f"img_neg:{hashlib.md5(image_url.encode()).hexdigest()}"
+
+    def _get_variant_key(self, original_hash: str, spec: Dict[str, Any]) -> str:
+        """Chave da variante: hash do original + especificação da transformação"""
+        return f"img_var:{original_hash}:{self._get_spec_id(spec)}"
 
     def _save_to_cache(self, cache_key: str, data: Dict[str, Any]) -> None:
-        """Salva dados no cache Redis"""
-        if not self.redis_client:
-            return
-            
-        try:
-            cache_data = {
-                **data,
-                'cached_at': datetime.utcnow().isoformat(),
-                'expires_at': (datetime.utcnow() + timedelta(seconds=self.cache_ttl)).isoformat()
-            }
-            
-            self.redis_client.setex(
-                cache_key,
-                self.cache_ttl,
-                json.dumps(cache_data, default=str)
-            )
-            logger.info(f"💾 Dados salvos no cache: {cache_key}")
-            
-        except Exception as e:
-            logger.error(f"❌ Erro ao salvar no cache: {e}")
+        """
+        Salva dados no cache (memória e Redis)
+        
+        expires_at é quando a entrada sai do Redis (storage_ttl = cache_ttl +
+        revalidation_window). O frescor é o fresh_until do índice da URL: entre
+        os dois, a entrada é servida como stale ou revalidada na origem.
+        """
+        cache_data = {
+            **data,
+            'cached_at': datetime.utcnow().isoformat(),
+            'expires_at': (datetime.utcnow() + timedelta(seconds=self.storage_ttl)).isoformat()
+        }
+        self._write_through(cache_key, json.dumps(cache_data, default=str, separators=(',', ':')).encode())
 
     def _get_from_cache(self, cache_key: str) -> Optional[Dict[str, Any]]:
-        """Recupera dados do cache Redis"""
-        if not self.redis_client:
-            return None
-            
+        """Recupera dados do cache (memória, depois Redis)"""
         try:
-            cached_data = self.redis_client.get(cache_key)
+            cached_data = self._read_through(cache_key)
             if cached_data:
+                if isinstance(cached_data, memoryview):
+                    cached_data = cached_data.tobytes()
                 data = json.loads(cached_data)
                 logger.info(f"🎯 Cache HIT: {cache_key}")
                 return data
@@ -307,6 +740,212 @@ class ImageOptimizer:
             logger.error(f"❌ Erro ao ler cache: {e}")
             return None
 
+    def _save_blob(self, data_key: str, data: bytes) -> None:
+        """Salva bytes otimizados (sem base64) no cache"""
+        self._write_through(data_key, data)
+
+    def _get_blob(self, data_key: str) -> Optional[bytes]:
+        """Recupera bytes otimizados do cache"""
+        return self._read_through(data_key)
+
+    @staticmethod
+    def _is_disk_key(key: str) -> bool:
+        """
+        Binários (imutáveis) e registros de variantes vão para o disco
+        
+        Um registro de variante só muda quando é recodificado com mais
+        esforço; a escrita substitui então o arquivo (_write_disk com replace).
+        """
+        return key.startswith(('img_data:', 'img_var:'))
+
+    def _uses_disk(self, key: str) -> bool:
+        return self.disk_store is not None and self._is_disk_key(key)
+
+    def _read_through(self, key: str) -> Optional[bytes]:
+        """
+        Lê da memória, depois do disco (mmap) e por fim do Redis
+        
+        Um acerto no Redis popula as camadas anteriores; um acerto no disco
+        devolve um memoryview sobre o mmap, sem cópia para a memória.
+        """
+        if self.memory_cache.enabled:
+            value = self.memory_cache.get(key)
+            self.metrics.cache_lookup(key, 'memory', value is not None)
+            if value is not None:
+                self.cache_counters.hit('memory')
+                return value
+            self.cache_counters.miss('memory')
+        
+        if self._uses_disk(key):
+            try:
+                value = self.disk_store.get(key)
+            except OSError as e:
+                logger.error(f"❌ Erro ao ler cache em disco: {e}")
+                value = None
+            self.metrics.cache_lookup(key, 'disk', value is not None)
+            if value is not None:
+                self.cache_counters.hit('disk')
+                return value
+            self.cache_counters.miss('disk')
+        
+        if not self.redis_client:
+            return None
+        
+        try:
+            value = self.redis_client.get(key)
+        except Exception as e:
+            logger.error(f"❌ Erro ao ler cache Redis: {e}")
+            return None
+        
+        self.metrics.cache_lookup(key, 'redis', value is not None)
+        if value is None:
+            self.cache_counters.miss('redis')
+            self._record_redis_stat('misses')
+            return None
+        
+        self.cache_counters.hit('redis')
+        self._record_redis_stat('hits')
+        if isinstance(value, str):
+            value = value.encode()
+        self.memory_cache.set(key, value)
+        self._write_disk(key, value)
+        return value
+
+    def _write_through(self, key: str, value: bytes, ttl: int = None) -> None:
+        """Escreve na memória, no disco (binários e variantes) e no Redis (TTL padrão: storage_ttl)"""
+        self.memory_cache.set(key, value, ttl=None if ttl is None else min(ttl, self.memory_cache.ttl))
+        # Binários são endereçados por conteúdo; variantes podem ser recodificadas com mais esforço
+        self._write_disk(key, value, replace=key.startswith('img_var:'))
+        
+        if not self.redis_client:
+            return
+        
+        try:
+            self.redis_client.setex(key, ttl or self.storage_ttl, value)
+            logger.info(f"💾 Dados salvos no cache: {key} ({len(value)} bytes)")
+        except Exception as e:
+            logger.error(f"❌ Erro ao salvar no cache: {e}")
+            return
+        
+        self._record_redis_stat('entries')
+        self._record_redis_stat('bytes', len(value))
+
+    def _write_disk(self, key: str, value: bytes, replace: bool = False) -> None:
+        if not self._uses_disk(key):
+            return
+        try:
+            self.disk_store.put(key, value, replace=replace)
+        except OSError as e:
+            logger.error(f"❌ Erro ao salvar no cache em disco: {e}")
+
+    def _record_redis_stat(self, field: str, amount: int = 1) -> None:
+        """Acumula um contador agregado (enviado ao Redis em lote)"""
+        try:
+            self.redis_stats.incr(field, amount)
+        except Exception as e:
+            logger.error(f"❌ Erro ao atualizar contadores do cache: {e}")
+
+    @staticmethod
+    def _get_data_key(content_hash: str) -> str:
+        """Chave do binário otimizado, endereçada pelo hash do conteúdo"""
+        return f"img_data:{content_hash}"
+
+    def get_optimized_bytes(self, content_hash: str) -> Optional[bytes]:
+        """Retorna os bytes otimizados armazenados para o hash de conteúdo"""
+        return self._get_blob(self._get_data_key(content_hash))
+
+    def get_optimized_path(self, content_hash: str) -> Optional[str]:
+        """Caminho do binário no cache em disco, para envio direto do arquivo"""
+        if self.disk_store is None:
+            return None
+        return self.disk_store.path_for(self._get_data_key(content_hash))
+
+    def _build_response(self, record: Dict[str, Any], return_base64: bool,
+                        optimized_data: bytes = None) -> Optional[Dict[str, Any]]:
+        """
+        Monta a resposta a partir do registro de metadados
+        
+        O base64 só é gerado aqui, quando solicitado; retorna None se o
+        binário referenciado não estiver mais no cache.
+        """
+        result = {k: v for k, v in record.items() if k != 'data_key'}
+        ext = record['format'].lower()
+        
+        if return_base64:
+            if optimized_data is None:
+                optimized_data = self._get_blob(record['data_key'])
+                if optimized_data is None:
+                    logger.info(f"❌ Binário ausente no cache: {record['data_key']}")
+                    return None
+            
+            self.metrics.bytes_out.inc(len(optimized_data))
+            optimized_base64 = base64.b64encode(optimized_data).decode('utf-8')
+            result['optimized_base64'] = f"data:{get_format_mime_type(record['format'])};base64,{optimized_base64}"
+            result['optimized_url_or_base64'] = result['optimized_base64']
+        else:
+            result['optimized_url'] = f"/optimized/{record['content_hash']}.{ext}"
+            result['optimized_url_or_base64'] = result['optimized_url']
+        
+        return result
+
+    def _get_process_pool(self) -> Optional[ProcessPoolExecutor]:
+        """Retorna (criando sob demanda) o pool de processos para otimização"""
+        if self.batch_process_workers <= 0:
+            return None
+        
+        with self._pool_lock:
+            if self._process_pool is None:
+                # spawn evita herdar locks de threads do servidor Flask via fork
+                self._process_pool = ProcessPoolExecutor(
+                    max_workers=self.batch_process_workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_init_process_worker,
+                    initargs=(self.config,)
+                )
+                logger.info(f"⚙️ Pool de processos criado: {self.batch_process_workers} workers")
+            return self._process_pool
+
+    def _run_optimize(self, image_data: bytes, spec: Dict[str, Any],
+                      process_pool: Optional[ProcessPoolExecutor] = None,
+                      effort: str = None) -> Tuple[bytes, Dict[str, Any]]:
+        """Executa a otimização no pool de processos, se houver, ou na thread atual"""
+        if process_pool is not None:
+            try:
+                optimized_data, metadata = process_pool.submit(
+                    _optimize_in_process, image_data, spec, effort
+                ).result()
+                # CPU do processo do pool não aparece no thread_time da requisição
+                self.metrics.add_request_cpu(metadata['timings_ms']['cpu'] / 1000)
+                self.metrics.observe_stages(metadata['timings_ms'])
+                return optimized_data, metadata
+            except BrokenProcessPool:
+                logger.error("❌ Pool de processos quebrado, otimizando na thread atual")
+                with self._pool_lock:
+                    if self._process_pool is process_pool:
+                        self._process_pool = None
+        
+        optimized_data, metadata = self._optimize_with_spec(image_data, spec, effort)
+        self.metrics.observe_stages(metadata['timings_ms'])
+        return optimized_data, metadata
+
+    def close(self) -> None:
+        """Encerra os pools de execução e as conexões HTTP do otimizador"""
+        with self._pool_lock:
+            if self._process_pool is not None:
+                self._process_pool.shutdown(wait=True)
+                self._process_pool = None
+            if self._async_executor is not None:
+                self._async_executor.shutdown(wait=True)
+                self._async_executor = None
+            if self._refresh_executor is not None:
+                self._refresh_executor.shutdown(wait=True)
+                self._refresh_executor = None
+        self.http_client.close()
+
+    def get_http_stats(self) -> Dict[str, Any]:
+        """Retorna estatísticas do pool de conexões HTTP e do cache de DNS"""
+        return self.http_client.stats()
+
     def optimize_image_from_url(self, image_url: str, options: Dict[str, Any] = None) -> Dict[str, Any]:
         """
         Função principal para otimizar imagem a partir de URL
@@ -318,13 +957,48 @@ class ImageOptimizer:
         Returns:
             Dict com resultado da otimização
         """
+        return self._optimize_from_url(image_url, options)
+
+    def _optimize_from_url(self, image_url: str, options: Dict[str, Any] = None,
+                           process_pool: Optional[ProcessPoolExecutor] = None,
+                           fetched: Dict[str, Any] = None, cache_only: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        Pipeline de otimização de uma URL (cache, download, otimização, cache)
+        
+        O caminho assíncrono o usa em duas fases: cache_only=True só consulta o
+        cache (None em caso de falta) e fetched traz o download já feito,
+        dispensando a consulta.
+        """
+        with self.metrics.request() as timer:
+            result = self._run_url_pipeline(image_url, options, process_pool, fetched, cache_only)
+            if result is not None:
+                timer.outcome = self._get_request_outcome(result)
+            return result
+
+    @staticmethod
+    def _get_request_outcome(result: Dict[str, Any]) -> str:
+        """Rótulo da requisição nas métricas"""
+        if result.get('negative_cache'):
+            return 'negative_cache'
+        if not result.get('success'):
+            return 'error'
+        if result.get('stale'):
+            return 'stale'
+        if result.get('coalesced'):
+            return 'coalesced'
+        if result.get('from_cache'):
+            return result.get('cache_type', 'cache')
+        return 'optimized'
+
+    def _run_url_pipeline(self, image_url: str, options: Dict[str, Any],
+                          process_pool: Optional[ProcessPoolExecutor],
+                          fetched: Optional[Dict[str, Any]], cache_only: bool) -> Optional[Dict[str, Any]]:
         start_time = datetime.utcnow()
         
         try:
             # Configurações padrão + personalizadas
             opt_options = {
                 'format': 'WEBP',
-                'quality': self.webp_quality,
                 'is_thumbnail': False,
                 'return_base64': True,
                 **(options or {})
@@ -339,168 +1013,1132 @@ class ImageOptimizer:
                 return {
                     'success': False,
                     'error': 'Imagem genérica do Telegram não será otimizada',
+                    'error_class': 'generic',
+                    'retry_after': self.negative_cache_ttls['generic'],
                     'original_url': image_url,
                     'is_generic': True
                 }
             
-            # Gerar chave de cache
-            cache_key = self._get_cache_key(image_url, opt_options)
-            
-            # Verificar cache primeiro
-            cached_result = self._get_from_cache(cache_key)
-            if cached_result:
-                logger.info(f"✅ Retornando resultado do cache")
-                cached_result['from_cache'] = True
-                return cached_result
+            spec = self._get_transform_spec(opt_options)
+            effort = self._resolve_effort(opt_options, self.interactive_effort)
             
-            # Baixar imagem
-            image_data, content_type = self._download_image(image_url)
+            # URL já vista: resolver a variante pelo hash do original, sem download
+            # (índice vencido: servido como stale dentro da janela, senão revalidado na origem,
+            # exceto com falha recente da URL no cache negativo)
+            cached_record = None
+            url_index = previous_index = None
+            negative = None
+            if fetched is None:
+                with self.metrics.stage('cache_lookup'):
+                    url_index = self._get_from_cache(self._get_url_index_key(image_url))
+                if url_index and not self._is_fresh(url_index) and not self._is_servable_stale(url_index):
+                    negative = self._get_negative_response(image_url)
+                    if negative is None:
+                        if cache_only:
+                            return None
+                        # Um 200 com os mesmos bytes mescla as chaves do índice anterior
+                        previous_index = url_index
+                        url_index, fetched = self._revalidate_url_index(image_url, url_index)
+                if url_index:
+                    with self.metrics.stage('cache_lookup'):
+                        cached_record = self._get_from_cache(
+                            self._get_variant_key(url_index['original_hash'], spec)
+                        )
+            if cached_record and self._satisfies_effort(cached_record, effort):
+                cached_result = self._build_response(
+                    {**cached_record, 'original_url': image_url}, opt_options['return_base64']
+                )
+                if cached_result:
+                    logger.info(f"✅ Retornando resultado do cache")
+                    cached_result['from_cache'] = True
+                    if not self._is_fresh(url_index):
+                        cached_result['stale'] = True
+                    if self._is_servable_stale(url_index):
+                        self._schedule_refresh(image_url, url_index, lambda refreshed: self._resolve_cache_miss(
+                            image_url, spec, None, datetime.utcnow(), effort, refreshed, url_index))
+                    return cached_result
             
-            # Gerar hash da imagem original
-            original_hash = self._generate_image_hash(image_data)
+            # Sem variante utilizável: a falha recente da URL é respondida do cache negativo
+            if fetched is None:
+                negative = negative or self._get_negative_response(image_url)
+                if negative:
+                    return negative
             
-            # Verificar se já temos esta imagem otimizada (mesmo hash)
-            hash_cache_key = f"img_hash:{original_hash}:{opt_options['format']}:{opt_options['quality']}"
-            hash_cached = self._get_from_cache(hash_cache_key)
-            if hash_cached:
-                logger.info(f"🎯 Imagem já otimizada encontrada pelo hash: {original_hash}")
-                hash_cached['from_cache'] = True
-                hash_cached['cache_type'] = 'hash_match'
-                return hash_cached
+            if cache_only:
+                return None
             
-            # Otimizar imagem
-            optimized_data, metadata = self._optimize_image(
-                image_data, 
-                opt_options['format'],
-                opt_options['is_thumbnail']
+            # Download + otimização, coalescidos entre requisições idênticas em andamento
+            cache_key = f"{self._get_cache_key(image_url, spec)}:{effort}"
+            (record, optimized_data, cache_type), coalesced = self.inflight.do(
+                cache_key,
+                lambda: self._resolve_cache_miss(image_url, spec, process_pool, start_time, effort,
+                                                 fetched, url_index or previous_index)
             )
             
-            # Preparar resultado
-            result = {
-                'success': True,
-                'original_url': image_url,
-                'original_hash': original_hash,
-                'metadata': metadata,
-                'size_reduction_percent': metadata['size_reduction_percent'],
-                'timestamp': start_time.isoformat(),
-                'from_cache': False,
-                'processing_time_ms': int((datetime.utcnow() - start_time).total_seconds() * 1000)
+            result = self._build_response(record, opt_options['return_base64'], optimized_data)
+            result['from_cache'] = cache_type is not None
+            if cache_type:
+                result['cache_type'] = cache_type
+            if coalesced:
+                logger.info(f"🔗 Requisição coalescida com otimização em andamento: {image_url}")
+                result['coalesced'] = True
+            
+            return result
+            
+        except Exception as e:
+            logger.error(f"❌ Erro na otimização de {image_url}: {e}")
+            return self._failure_response(image_url, e, start_time)
+
+    @staticmethod
+    def _classify_fetch_error(error: Exception) -> Optional[str]:
+        """Classe de erro cacheável do download (None = transitório, não cachear)"""
+        if isinstance(error, ImageFetchError):
+            return error.error_class
+        if isinstance(error, (requests.exceptions.Timeout, asyncio.TimeoutError)):
+            return 'timeout'
+        
+        response = getattr(error, 'response', None)
+        status = getattr(response, 'status_code', None) or getattr(error, 'status', None)
+        if isinstance(error, requests.exceptions.HTTPError) or (aiohttp and isinstance(error, aiohttp.ClientResponseError)):
+            if status in (404, 410):
+                return 'not_found'
+        return None
+
+    def _failure_response(self, image_url: str, error: Exception, start_time: datetime) -> Dict[str, Any]:
+        """Resposta de erro; falhas classificadas vão para o cache negativo"""
+        result = {
+            'success': False,
+            'error': str(error) or type(error).__name__,
+            'original_url': image_url,
+            'timestamp': start_time.isoformat(),
+            'from_cache': False
+        }
+        
+        error_class = self._classify_fetch_error(error)
+        ttl = self.negative_cache_ttls.get(error_class) if error_class else None
+        if ttl:
+            entry = {
+                'error': result['error'],
+                'error_class': error_class,
+                'failed_at': datetime.utcnow().isoformat(),
+                'retry_at': (datetime.utcnow() + timedelta(seconds=ttl)).isoformat()
             }
+            # Chave própria: as variantes da URL já em cache continuam sendo servidas
+            self._write_through(self._get_negative_key(image_url),
+                                json.dumps(entry, separators=(',', ':')).encode(), ttl=ttl)
+            if error_class == 'not_found':
+                # A imagem saiu da origem: o índice e suas variantes deixam de valer
+                self._drop_url_index(image_url)
+            logger.info(f"🚫 Falha cacheada por {ttl}s ({error_class}): {image_url}")
+            result.update(error_class=error_class, retry_after=ttl)
+        return result
+
+    def _drop_url_index(self, image_url: str) -> None:
+        """Remove o índice da URL da memória e do Redis"""
+        index_key = self._get_url_index_key(image_url)
+        self.memory_cache.delete(index_key)
+        if not self.redis_client:
+            return
+        try:
+            self.redis_client.unlink(index_key)
+        except Exception as e:
+            logger.error(f"❌ Erro ao remover índice da URL: {e}")
+
+    def _get_negative_response(self, image_url: str) -> Optional[Dict[str, Any]]:
+        """
+        Falha recente da URL no cache negativo, ou None
+        
+        Lida fora de _read_through: a consulta não entra nos contadores de
+        acertos e faltas do cache de imagens.
+        """
+        negative_key = self._get_negative_key(image_url)
+        entry = self.memory_cache.get(negative_key)
+        if entry is None and self.redis_client:
+            try:
+                entry = self.redis_client.get(negative_key)
+            except Exception as e:
+                logger.error(f"❌ Erro ao ler cache negativo: {e}")
+        if entry is None:
+            return None
+        return self._build_negative_response(image_url, json.loads(entry))
+
+    @staticmethod
+    def _build_negative_response(image_url: str, entry: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Resposta da falha cacheada, com retry_after em segundos restantes"""
+        remaining = (datetime.fromisoformat(entry['retry_at']) - datetime.utcnow()).total_seconds()
+        if remaining <= 0:
+            return None
+        
+        return {
+            'success': False,
+            'error': entry['error'],
+            'error_class': entry['error_class'],
+            'retry_after': int(remaining) + 1,
+            'original_url': image_url,
+            'timestamp': entry['failed_at'],
+            'from_cache': True,
+            'negative_cache': True
+        }
+
+    def _get_freshness_ttl(self, cache_control: Optional[str]) -> int:
+        """
+        Segundos em que o índice da URL é usado sem consultar a origem
+        
+        Segue no-cache/no-store e max-age (s-maxage tem prioridade) do
+        Cache-Control da origem, limitado a [min_fresh_ttl, cache_ttl]; sem
+        diretivas (ou com a revalidação desligada) vale cache_ttl.
+        """
+        if not self.revalidation_window:
+            return self.cache_ttl
+        
+        directives = {}
+        for item in (cache_control or '').lower().split(','):
+            name, _, value = item.strip().partition('=')
+            directives[name] = value.strip('"')
+        
+        if 'no-cache' in directives or 'no-store' in directives:
+            return self.min_fresh_ttl
+        max_age = directives.get('s-maxage') or directives.get('max-age')
+        if max_age and max_age.isdigit():
+            return max(self.min_fresh_ttl, min(int(max_age), self.cache_ttl))
+        return self.cache_ttl
+
+    def _save_url_index(self, image_url: str, fetched: Dict[str, Any], cached_keys: list,
+                        previous: Dict[str, Any] = None) -> None:
+        """
+        Indexa a URL pelo hash do original, com os validadores da origem
+        
+        cached_keys são as variantes e binários derivados do original, cujo TTL
+        é estendido quando a origem responde 304; as chaves de um índice
+        anterior com o mesmo original são mantidas.
+        """
+        if previous and previous.get('original_hash') == fetched['hash']:
+            cached_keys = list(previous.get('cached_keys', [])) + list(cached_keys)
+        origin = fetched.get('origin') or {}
+        fresh_ttl = self._get_freshness_ttl(origin.get('cache_control'))
+        
+        with self.metrics.stage('cache_write'):
+            self._save_to_cache(self._get_url_index_key(image_url), {
+                'original_hash': fetched['hash'],
+                'content_type': fetched['content_type'],
+                **origin,
+                'fresh_until': (datetime.utcnow() + timedelta(seconds=fresh_ttl)).isoformat(),
+                'cached_keys': list(dict.fromkeys(cached_keys))[-MAX_INDEXED_KEYS:]
+            })
+
+    @staticmethod
+    def _is_fresh(url_index: Dict[str, Any]) -> bool:
+        """Índices sem fresh_until (gravados antes da revalidação) valem até sair do cache"""
+        fresh_until = url_index.get('fresh_until')
+        return fresh_until is None or datetime.fromisoformat(fresh_until) > datetime.utcnow()
+
+    def _revalidate_url_index(self, image_url: str, url_index: Dict[str, Any]
+                              ) -> Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]:
+        """
+        Confirma na origem, por requisição condicional, um índice vencido
+        
+        Requisições concorrentes pela mesma URL compartilham a revalidação.
+        
+        Só um 404/410 definitivo substitui o índice (a exceção segue para o
+        cache negativo); timeouts e demais falhas mantêm o índice, com os
+        validadores e as chaves das variantes, e o cache vencido é servido.
+        
+        Returns:
+            Tuple: (índice, None) se o índice está válido, a origem respondeu
+            304 ou falhou sem ser 404/410; ou (None, download) se a origem
+            enviou a imagem de novo
+        """
+        if self._is_fresh(url_index):
+            return url_index, None
+        
+        result, _ = self.inflight.do(
+            f"{self._get_url_index_key(image_url)}:revalidate",
+            lambda: self._refresh_url_index(image_url, url_index)
+        )
+        return result
+
+    def _refresh_url_index(self, image_url: str, url_index: Dict[str, Any]
+                           ) -> Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]:
+        try:
+            fetched = self._fetch_image(image_url, validators=url_index)
+        except Exception as e:
+            self.metrics.revalidations.inc(result='error')
+            if self._classify_fetch_error(e) == 'not_found':
+                raise
+            logger.warning(f"⚠️ Revalidação falhou, usando cache vencido de {image_url}: {e}")
+            return url_index, None
+        
+        if not fetched.get('not_modified'):
+            self.metrics.revalidations.inc(result='modified')
+            return None, fetched
+        
+        self.metrics.revalidations.inc(result='not_modified')
+        return self._extend_cache_entries(image_url, url_index, fetched['origin']), None
+
+    def _is_servable_stale(self, url_index: Dict[str, Any]) -> bool:
+        """Índice vencido há menos de stale_while_revalidate segundos"""
+        fresh_until = url_index.get('fresh_until')
+        if fresh_until is None or self._is_fresh(url_index):
+            return False
+        stale_until = datetime.fromisoformat(fresh_until) + timedelta(seconds=self.stale_while_revalidate)
+        return stale_until > datetime.utcnow()
+
+    def _get_refresh_executor(self) -> ThreadPoolExecutor:
+        """Threads que renovam entradas servidas como stale"""
+        with self._pool_lock:
+            if self._refresh_executor is None:
+                self._refresh_executor = ThreadPoolExecutor(max_workers=self.refresh_workers,
+                                                            thread_name_prefix='img-refresh')
+            return self._refresh_executor
+
+    def _schedule_refresh(self, image_url: str, url_index: Dict[str, Any],
+                          rebuild: Callable[[Dict[str, Any]], Any]) -> bool:
+        """
+        Agenda a renovação em segundo plano de uma URL servida como stale
+        
+        Só uma renovação por URL fica pendente; as demais requisições stale
+        apenas recebem o resultado antigo. Se a origem mandar uma imagem nova,
+        rebuild(fetched) regenera a variante pedida.
+        
+        Returns:
+            bool: Se uma nova renovação foi agendada
+        """
+        index_key = self._get_url_index_key(image_url)
+        with self._refresh_lock:
+            if index_key in self._refreshing:
+                return False
+            self._refreshing.add(index_key)
+        
+        try:
+            self._get_refresh_executor().submit(self._refresh_in_background, image_url, url_index, rebuild)
+        except RuntimeError as e:
+            # Otimizador encerrado (close): nada a agendar
+            logger.error(f"❌ Erro ao agendar renovação de {image_url}: {e}")
+            with self._refresh_lock:
+                self._refreshing.discard(index_key)
+            return False
+        
+        logger.info(f"🔁 Renovação em segundo plano agendada: {image_url}")
+        return True
+
+    def _refresh_in_background(self, image_url: str, url_index: Dict[str, Any],
+                               rebuild: Callable[[Dict[str, Any]], Any]) -> None:
+        """
+        Renova uma URL servida como stale
+        
+        Falhas só são registradas: a entrada vencida continua sendo servida.
+        A exceção é o 404/410 definitivo, que remove o índice e grava a falha
+        no cache negativo (a imagem saiu da origem).
+        """
+        start_time = datetime.utcnow()
+        try:
+            _, fetched = self._revalidate_url_index(image_url, url_index)
+            if fetched is not None:
+                rebuild(fetched)
+            self.metrics.background_refreshes.inc(result='ok')
+        except Exception as e:
+            self.metrics.background_refreshes.inc(result='error')
+            logger.error(f"❌ Erro na renovação em segundo plano de {image_url}: {e}")
+            if self._classify_fetch_error(e) == 'not_found':
+                self._failure_response(image_url, e, start_time)
+        finally:
+            with self._refresh_lock:
+                self._refreshing.discard(self._get_url_index_key(image_url))
+
+    def _extend_cache_entries(self, image_url: str, url_index: Dict[str, Any],
+                              origin: Dict[str, str]) -> Dict[str, Any]:
+        """Renova o índice e o TTL das variantes após um 304, sem decodificar nem codificar"""
+        refreshed = {key: value for key, value in url_index.items() if key not in ('cached_at', 'expires_at')}
+        refreshed.update(origin)
+        fresh_ttl = self._get_freshness_ttl(refreshed.get('cache_control'))
+        refreshed['fresh_until'] = (datetime.utcnow() + timedelta(seconds=fresh_ttl)).isoformat()
+        
+        with self.metrics.stage('cache_write'):
+            self._save_to_cache(self._get_url_index_key(image_url), refreshed)
             
-            # Adicionar dados otimizados (Base64 ou URL)
-            if opt_options['return_base64']:
-                optimized_base64 = base64.b64encode(optimized_data).decode('utf-8')
-                mime_type = f"image/{opt_options['format'].lower()}"
-                result['optimized_base64'] = f"data:{mime_type};base64,{optimized_base64}"
-                result['optimized_url_or_base64'] = result['optimized_base64']
-            else:
-                # TODO: Implementar salvamento em arquivo/CDN
-                result['optimized_url'] = f"/optimized/{original_hash}.{opt_options['format'].lower()}"
-                result['optimized_url_or_base64'] = result['optimized_url']
+            cached_keys = refreshed.get('cached_keys', [])
+            if self.redis_client and cached_keys:
+                try:
+                    pipe = self.redis_client.pipeline(transaction=False)
+                    for key in cached_keys:
+                        pipe.expire(key, self.storage_ttl)
+                    pipe.execute()
+                except Exception as e:
+                    logger.error(f"❌ Erro ao estender TTL das variantes: {e}")
+        
+        logger.info(f"♻️ Cache renovado sem recodificar: {len(cached_keys)} entradas de {image_url}")
+        return refreshed
+
+    def _resolve_cache_miss(self, image_url: str, spec: Dict[str, Any],
+                            process_pool: Optional[ProcessPoolExecutor],
+                            start_time: datetime, effort: str = 'max',
+                            fetched: Dict[str, Any] = None,
+                            url_index: Dict[str, Any] = None) -> Tuple[Dict[str, Any], bytes, Optional[str]]:
+        """
+        Baixa (se fetched não vier pronto) e otimiza a imagem após uma falta no cache
+        
+        Uma variante em cache codificada com esforço menor que o pedido é
+        substituída pelo novo resultado. url_index é o índice anterior da URL,
+        cujas chaves derivadas são preservadas no novo índice.
+        
+        Returns:
+            Tuple: (registro de metadados, bytes otimizados, tipo de cache ou None se novo)
+        """
+        # Baixar imagem (o hash é calculado durante o download)
+        if fetched is None:
+            fetched = self._fetch_image(image_url)
+        image_data = fetched['data']
+        original_hash = fetched['hash']
+        
+        # Mesmo conteúdo já otimizado com a mesma especificação (possivelmente outra URL)
+        variant_key = self._get_variant_key(original_hash, spec)
+        with self.metrics.stage('cache_lookup'):
+            hash_cached = self._get_from_cache(variant_key)
+        if hash_cached and self._satisfies_effort(hash_cached, effort):
+            cached_data = self._get_blob(hash_cached['data_key'])
+            if cached_data is not None:
+                logger.info(f"🎯 Imagem já otimizada encontrada pelo hash: {original_hash}")
+                self._save_url_index(image_url, fetched, [variant_key, hash_cached['data_key']], url_index)
+                return {**hash_cached, 'original_url': image_url}, cached_data, 'hash_match'
+        
+        # Otimizar imagem
+        optimized_data, metadata = self._run_optimize(image_data, spec, process_pool, effort)
+        
+        # Registro de metadados: aponta para o binário armazenado uma única vez
+        content_hash = self._generate_image_hash(optimized_data)
+        record = {
+            'success': True,
+            'original_url': image_url,
+            'original_hash': original_hash,
+            'content_hash': content_hash,
+            'data_key': self._get_data_key(content_hash),
+            'format': spec['format'],
+            'spec': spec,
+            'effort': effort,
+            'metadata': metadata,
+            'size_reduction_percent': metadata['size_reduction_percent'],
+            'timestamp': start_time.isoformat(),
+            'processing_time_ms': int((datetime.utcnow() - start_time).total_seconds() * 1000)
+        }
+        
+        # Salvar no cache: binário uma vez, metadados da variante pelo hash do original
+        with self.metrics.stage('cache_write'):
+            self._save_blob(record['data_key'], optimized_data)
+            self._save_to_cache(variant_key, record)
+        
+        # Indexar a URL pelo hash do original (próximas requisições dispensam o download)
+        self._save_url_index(image_url, fetched, [variant_key, record['data_key']], url_index)
+        
+        logger.info(f"✅ Otimização concluída: {metadata['size_reduction_percent']:.1f}% redução")
+        return record, optimized_data, None
+
+    def _get_matrix_spec(self, options: Dict[str, Any]) -> Dict[str, Any]:
+        """Especificação canônica de uma matriz de variantes (larguras x formatos)"""
+        widths = sorted({int(width) for width in (options.get('widths') or self.responsive_breakpoints)})
+        formats = []
+        for output_format in options.get('formats') or self.variant_formats:
+            output_format = output_format.upper()
+            if output_format not in ('WEBP', 'JPEG', 'AVIF', 'PNG'):
+                raise ValueError(f"Formato inválido na matriz de variantes: {output_format}")
+            if output_format not in formats:
+                formats.append(output_format)
+        
+        if not widths or widths[0] <= 0:
+            raise ValueError("Larguras da matriz de variantes devem ser positivas")
+        
+        return {
+            'matrix': 'srcset',
+            'widths': widths,
+            'formats': formats,
+            'qualities': {
+                output_format: int(options.get('quality') or self._get_default_quality(output_format))
+                for output_format in formats if output_format in LOSSY_FORMATS
+            },
+            'max_width': int(options.get('max_width') or self.max_width),
+            'max_height': int(options.get('max_height') or self.max_height)
+        }
+
+    def _render_variants(self, image_data: bytes, matrix_spec: Dict[str, Any],
+                         effort: str = None) -> List[Tuple[Dict[str, Any], bytes, Dict[str, Any]]]:
+        """
+        Gera todas as variantes da matriz a partir de uma única decodificação
+        
+        Os tamanhos de generate_responsive_sizes são obtidos do maior para o
+        menor, cada um reduzido a partir do bitmap anterior; todos os formatos
+        são codificados a partir do mesmo bitmap de cada tamanho.
+        
+        Returns:
+            Lista de (especificação da variante, bytes, metadados)
+        """
+        with Image.open(io.BytesIO(image_data)) as img:
+            original_size = img.size
+            original_format = img.format
+            
+            oriented_size = self._get_oriented_size(img)
+            max_size = (matrix_spec['max_width'], matrix_spec['max_height'])
+            sizes = sorted({
+                self._calculate_new_size(size, max_size=max_size)
+                for size in generate_responsive_sizes(*oriented_size, matrix_spec['widths']).values()
+            }, reverse=True)
+            
+            # Decodificar uma vez, já reduzido ao maior tamanho quando for JPEG
+            draft_scale = self._apply_jpeg_draft(img, oriented_size, sizes[0])
+            bitmap = ImageOps.exif_transpose(img)
+            if bitmap.mode not in ('RGB', 'RGBA'):
+                has_alpha = bitmap.mode in ('RGBA', 'LA', 'PA') or 'transparency' in bitmap.info
+                bitmap = bitmap.convert('RGBA' if has_alpha else 'RGB')
             
-            # Salvar no cache (tanto por URL quanto por hash)
-            self._save_to_cache(cache_key, result)
-            self._save_to_cache(hash_cache_key, result)
+            variants = []
+            for size in sizes:
+                if size != bitmap.size:
+                    logger.info(f"📏 Redimensionando de {bitmap.size} para {size}")
+                    bitmap = resize_image(bitmap, size, self.resize_mode)
+                
+                for output_format in matrix_spec['formats']:
+                    quality = matrix_spec['qualities'].get(output_format)
+                    output_buffer = io.BytesIO()
+                    self._convert_mode(bitmap, output_format).save(
+                        output_buffer, format=output_format, **(self._get_save_kwargs(output_format, quality, effort) or {})
+                    )
+                    optimized_data = output_buffer.getvalue()
+                    
+                    spec = {'format': output_format, 'resize': 'srcset', 'width': size[0], 'height': size[1]}
+                    if quality is not None:
+                        spec['quality'] = quality
+                    metadata = self._build_metadata(image_data, optimized_data, original_size, size,
+                                                    original_format, output_format, draft_scale)
+                    variants.append((spec, optimized_data, metadata))
+            
+            logger.info(f"✅ Matriz gerada: {len(sizes)} tamanhos x {len(matrix_spec['formats'])} formatos")
+            return variants
+
+    def optimize_variants_from_url(self, image_url: str, options: Dict[str, Any] = None) -> Dict[str, Any]:
+        """
+        Gera a matriz de variantes (tamanhos x formatos) de uma imagem
+        
+        A imagem é baixada e decodificada uma vez; cada variante é salva no
+        cache como uma otimização comum e o resultado é um manifesto pronto
+        para srcset, com URLs /optimized/<hash>.<ext>.
+        
+        Args:
+            image_url: URL da imagem
+            options: widths, formats, quality, max_width, max_height, effort
             
-            logger.info(f"✅ Otimização concluída: {metadata['size_reduction_percent']:.1f}% redução")
+        Returns:
+            Dict com o manifesto das variantes
+        """
+        start_time = datetime.utcnow()
+        
+        try:
+            if self._is_generic_telegram_image(image_url):
+                logger.warning(f"⚠️ Imagem genérica detectada: {image_url}")
+                return {
+                    'success': False,
+                    'error': 'Imagem genérica do Telegram não será otimizada',
+                    'error_class': 'generic',
+                    'retry_after': self.negative_cache_ttls['generic'],
+                    'original_url': image_url,
+                    'is_generic': True
+                }
+            
+            matrix_spec = self._get_matrix_spec(options or {})
+            effort = self._resolve_effort(options or {}, self.interactive_effort)
+            
+            fetched = None
+            negative = None
+            url_index = previous_index = self._get_from_cache(self._get_url_index_key(image_url))
+            if url_index and not self._is_fresh(url_index) and not self._is_servable_stale(url_index):
+                negative = self._get_negative_response(image_url)
+                if negative is None:
+                    url_index, fetched = self._revalidate_url_index(image_url, url_index)
+            if url_index:
+                manifest = self._get_from_cache(self._get_variant_key(url_index['original_hash'], matrix_spec))
+                if manifest and self._satisfies_effort(manifest, effort):
+                    result = {**manifest, 'original_url': image_url, 'from_cache': True}
+                    if not self._is_fresh(url_index):
+                        result['stale'] = True
+                    if self._is_servable_stale(url_index):
+                        self._schedule_refresh(image_url, url_index, lambda refreshed: self._resolve_variant_matrix(
+                            image_url, matrix_spec, datetime.utcnow(), effort, refreshed, url_index))
+                    return result
+            
+            if fetched is None:
+                negative = negative or self._get_negative_response(image_url)
+                if negative:
+                    return negative
+            
+            (manifest, cache_type), coalesced = self.inflight.do(
+                f"{self._get_cache_key(image_url, matrix_spec)}:{effort}",
+                lambda: self._resolve_variant_matrix(image_url, matrix_spec, start_time, effort,
+                                                     fetched, url_index or previous_index)
+            )
+            
+            result = {**manifest, 'from_cache': cache_type is not None}
+            if cache_type:
+                result['cache_type'] = cache_type
+            if coalesced:
+                result['coalesced'] = True
             return result
             
         except Exception as e:
-            logger.error(f"❌ Erro na otimização de {image_url}: {e}")
-            return {
-                'success': False,
-                'error': str(e),
+            logger.error(f"❌ Erro na matriz de variantes de {image_url}: {e}")
+            return self._failure_response(image_url, e, start_time)
+
+    def _resolve_variant_matrix(self, image_url: str, matrix_spec: Dict[str, Any], start_time: datetime,
+                                effort: str = 'max', fetched: Dict[str, Any] = None,
+                                url_index: Dict[str, Any] = None) -> Tuple[Dict[str, Any], Optional[str]]:
+        """Baixa a imagem (se fetched não vier pronto), gera e armazena todas as variantes e o manifesto"""
+        if fetched is None:
+            fetched = self._fetch_image(image_url)
+        image_data = fetched['data']
+        original_hash = fetched['hash']
+        
+        manifest_key = self._get_variant_key(original_hash, matrix_spec)
+        hash_cached = self._get_from_cache(manifest_key)
+        if hash_cached and self._satisfies_effort(hash_cached, effort):
+            logger.info(f"🎯 Matriz já gerada encontrada pelo hash: {original_hash}")
+            self._save_url_index(image_url, fetched, [manifest_key] + [
+                self._get_data_key(variant['content_hash']) for variant in hash_cached['variants']
+            ], url_index)
+            return {**hash_cached, 'original_url': image_url}, 'hash_match'
+        
+        variants = []
+        srcset = {}
+        cached_keys = [manifest_key]
+        for spec, optimized_data, metadata in self._render_variants(image_data, matrix_spec, effort):
+            content_hash = self._generate_image_hash(optimized_data)
+            record = {
+                'success': True,
                 'original_url': image_url,
-                'timestamp': start_time.isoformat(),
-                'from_cache': False
+                'original_hash': original_hash,
+                'content_hash': content_hash,
+                'data_key': self._get_data_key(content_hash),
+                'format': spec['format'],
+                'spec': spec,
+                'effort': effort,
+                'metadata': metadata,
+                'size_reduction_percent': metadata['size_reduction_percent'],
+                'timestamp': start_time.isoformat()
             }
+            self._save_blob(record['data_key'], optimized_data)
+            self._save_to_cache(self._get_variant_key(original_hash, spec), record)
+            cached_keys += [self._get_variant_key(original_hash, spec), record['data_key']]
+            
+            ext = spec['format'].lower()
+            url = f"/optimized/{content_hash}.{ext}"
+            variants.append({
+                'width': spec['width'],
+                'height': spec['height'],
+                'format': spec['format'],
+                'content_hash': content_hash,
+                'url': url,
+                'bytes': len(optimized_data)
+            })
+            srcset.setdefault(ext, []).append(f"{url} {spec['width']}w")
+        
+        manifest = {
+            'success': True,
+            'original_url': image_url,
+            'original_hash': original_hash,
+            'spec': matrix_spec,
+            'effort': effort,
+            'variants': variants,
+            # Do menor para o maior, como o navegador espera no srcset
+            'srcset': {ext: ', '.join(reversed(entries)) for ext, entries in srcset.items()},
+            # Fallback para <img src>: maior variante do último formato (ex.: JPEG)
+            'src': next(v['url'] for v in variants if v['format'] == matrix_spec['formats'][-1]),
+            'timestamp': start_time.isoformat(),
+            'processing_time_ms': int((datetime.utcnow() - start_time).total_seconds() * 1000)
+        }
+        self._save_to_cache(manifest_key, manifest)
+        self._save_url_index(image_url, fetched, cached_keys, url_index)
+        
+        logger.info(f"✅ Matriz de variantes salva: {len(variants)} variantes de {image_url}")
+        return manifest, None
 
-    def batch_optimize_images(self, image_urls: list, options: Dict[str, Any] = None) -> Dict[str, Any]:
+    def batch_optimize_images(self, image_urls: list, options: Dict[str, Any] = None,
+                              max_workers: int = None,
+                              progress_callback: Callable[[int, int, int], None] = None,
+                              use_processes: bool = True) -> Dict[str, Any]:
         """
         Otimiza múltiplas imagens em lote
         
+        Downloads rodam em um pool de threads e a otimização (CPU) em um pool
+        de processos; os resultados mantêm a ordem de image_urls.
+        
         Args:
             image_urls: Lista de URLs de imagens
             options: Opções de otimização
+            max_workers: Threads de download (padrão: batch_download_workers)
+            progress_callback: Chamado a cada imagem concluída com (concluídas, falhas, total)
+            use_processes: False otimiza nas threads (com max_workers=1, tudo na thread atual)
             
         Returns:
             Dict com resultados de todas as otimizações
         """
         logger.info(f"🔄 Iniciando otimização em lote: {len(image_urls)} imagens")
         
-        results = []
-        successful = 0
-        failed = 0
+        total = len(image_urls)
+        # Lotes rodam em segundo plano: padrão de esforço máximo de compressão
+        options = {**(options or {}), 'effort': (options or {}).get('effort') or self.batch_effort}
+        download_workers = max(1, min(max_workers or self.batch_download_workers, total or 1))
+        process_pool = self._get_process_pool() if total > 1 and use_processes else None
         
-        for i, url in enumerate(image_urls):
-            logger.info(f"📸 Processando imagem {i+1}/{len(image_urls)}: {url}")
-            
-            result = self.optimize_image_from_url(url, options)
-            results.append(result)
+        progress = {'completed': 0, 'failed': 0}
+        progress_lock = threading.Lock()
+        
+        def process(indexed_url):
+            i, url = indexed_url
+            logger.info(f"📸 Processando imagem {i+1}/{total}: {url}")
+            result = self._optimize_from_url(url, options, process_pool)
             
-            if result['success']:
-                successful += 1
-            else:
-                failed += 1
+            if progress_callback:
+                with progress_lock:
+                    progress['completed'] += 1
+                    progress['failed'] += 0 if result['success'] else 1
+                    completed, failed = progress['completed'], progress['failed']
+                try:
+                    progress_callback(completed, failed, total)
+                except Exception as e:
+                    logger.error(f"❌ Erro no callback de progresso: {e}")
+            return result
+        
+        if download_workers == 1 and process_pool is None:
+            # Sequencial: roda na thread atual (visível para o perfilador da requisição)
+            results = [process(indexed_url) for indexed_url in enumerate(image_urls)]
+        else:
+            with ThreadPoolExecutor(max_workers=download_workers,
+                                    thread_name_prefix='img-batch') as executor:
+                results = list(executor.map(process, enumerate(image_urls)))
+        
+        successful = sum(1 for result in results if result['success'])
+        failed = total - successful
         
         summary = {
-            'total_images': len(image_urls),
+            'total_images': total,
             'successful': successful,
             'failed': failed,
-            'success_rate': round((successful / len(image_urls)) * 100, 2) if image_urls else 0,
+            'success_rate': round((successful / total) * 100, 2) if image_urls else 0,
             'results': results
         }
         
-        logger.info(f"✅ Lote concluído: {successful}/{len(image_urls)} sucessos ({summary['success_rate']}%)")
+        logger.info(f"✅ Lote concluído: {successful}/{total} sucessos ({summary['success_rate']}%)")
         return summary
 
-    def get_cache_stats(self) -> Dict[str, Any]:
-        """Retorna estatísticas do cache"""
-        if not self.redis_client:
-            return {'cache_enabled': False}
+    def _get_async_executor(self) -> ThreadPoolExecutor:
+        """Threads que executam cache e otimização para a API assíncrona"""
+        with self._pool_lock:
+            if self._async_executor is None:
+                self._async_executor = ThreadPoolExecutor(max_workers=self.async_executor_workers,
+                                                          thread_name_prefix='img-async')
+            return self._async_executor
+
+    def _new_async_session(self, max_concurrency: int = None) -> 'aiohttp.ClientSession':
+        """Sessão aiohttp com limite de conexões e cache de DNS"""
+        if aiohttp is None:
+            raise RuntimeError("A API assíncrona requer o pacote aiohttp")
         
+        connector = aiohttp.TCPConnector(
+            limit=max_concurrency or self.async_max_concurrency,
+            ttl_dns_cache=self.config.get('dns_cache_ttl', 300) or None
+        )
+        return aiohttp.ClientSession(
+            connector=connector,
+            headers=self._get_request_headers(),
+            timeout=aiohttp.ClientTimeout(total=self.config.get('timeout', 30))
+        )
+
+    async def _fetch_image_async(self, session: 'aiohttp.ClientSession', image_url: str) -> Dict[str, Any]:
+        """Versão assíncrona de _fetch_image, com as mesmas validações e hash"""
+        logger.info(f"📥 Baixando imagem (async): {image_url}")
+        max_file_size = self.config.get('max_file_size', 10 * 1024 * 1024)
+        
+        with self.metrics.stage('download'):
+            async with session.get(image_url) as response:
+                response.raise_for_status()
+                content_type = self._check_response_headers(response.headers, max_file_size)
+                origin = self._get_origin_headers(response.headers)
+                
+                download = _DownloadBuffer(max_file_size, self._sniff_or_reject)
+                async for chunk in response.content.iter_chunked(self.download_chunk_size):
+                    download.feed(chunk)
+                fetched = download.finish()
+        
+        self.metrics.bytes_in.inc(len(fetched['data']))
+        logger.info(f"✅ Imagem baixada: {len(fetched['data'])} bytes, tipo: {content_type}")
+        return {**fetched, 'content_type': content_type, 'origin': origin}
+
+    async def optimize_image_from_url_async(self, image_url: str, options: Dict[str, Any] = None,
+                                            session: 'aiohttp.ClientSession' = None,
+                                            process_pool: Optional[ProcessPoolExecutor] = None) -> Dict[str, Any]:
+        """
+        Versão assíncrona de optimize_image_from_url
+        
+        O download roda no event loop; consulta ao cache e otimização rodam
+        em um pool de threads (e no pool de processos, se informado).
+        
+        Args:
+            image_url: URL da imagem
+            options: Opções de otimização
+            session: Sessão aiohttp compartilhada (criada e fechada aqui se None)
+            process_pool: Pool de processos para a otimização
+        """
+        loop = asyncio.get_running_loop()
+        executor = self._get_async_executor()
+        
+        cached = await loop.run_in_executor(
+            executor, partial(self._optimize_from_url, image_url, options, cache_only=True)
+        )
+        if cached is not None:
+            return cached
+        
+        own_session = session is None
+        if own_session:
+            session = self._new_async_session()
         try:
-            # Buscar chaves relacionadas a imagens
-            keys = self.redis_client.keys('img_opt:*') + self.redis_client.keys('img_hash:*')
+            fetched = await self._fetch_image_async(session, image_url)
+        except Exception as e:
+            logger.error(f"❌ Erro ao baixar imagem {image_url}: {e}")
+            return await loop.run_in_executor(
+                executor, partial(self._failure_response, image_url, e, datetime.utcnow())
+            )
+        finally:
+            if own_session:
+                await session.close()
+        
+        return await loop.run_in_executor(
+            executor, partial(self._optimize_from_url, image_url, options, process_pool, fetched)
+        )
+
+    async def batch_optimize_images_async(self, image_urls: list, options: Dict[str, Any] = None,
+                                          max_concurrency: int = None,
+                                          progress_callback: Callable[[int, int, int], None] = None) -> Dict[str, Any]:
+        """
+        Versão assíncrona de batch_optimize_images para lotes com muitas URLs
+        
+        Todas as URLs (sem repetição) são baixadas concorrentemente em uma
+        única sessão, limitadas por max_concurrency; o resumo tem o mesmo
+        formato do lote síncrono.
+        """
+        logger.info(f"🔄 Iniciando otimização em lote (async): {len(image_urls)} imagens")
+        
+        total = len(image_urls)
+        options = {**(options or {}), 'effort': (options or {}).get('effort') or self.batch_effort}
+        concurrency = max_concurrency or self.async_max_concurrency
+        unique_urls = list(dict.fromkeys(image_urls))
+        process_pool = self._get_process_pool() if len(unique_urls) > 1 else None
+        semaphore = asyncio.Semaphore(concurrency)
+        progress = {'completed': 0, 'failed': 0}
+        
+        async with self._new_async_session(concurrency) as session:
+            async def process(url):
+                async with semaphore:
+                    result = await self.optimize_image_from_url_async(url, options, session, process_pool)
+                
+                progress['completed'] += 1
+                progress['failed'] += 0 if result['success'] else 1
+                if progress_callback:
+                    try:
+                        progress_callback(progress['completed'], progress['failed'], len(unique_urls))
+                    except Exception as e:
+                        logger.error(f"❌ Erro no callback de progresso: {e}")
+                return result
             
-            total_size = 0
-            for key in keys[:100]:  # Limitar para não sobrecarregar
+            unique_results = await asyncio.gather(*(process(url) for url in unique_urls))
+        
+        results_by_url = dict(zip(unique_urls, unique_results))
+        results = [results_by_url[url] for url in image_urls]
+        successful = sum(1 for result in results if result['success'])
+        
+        summary = {
+            'total_images': total,
+            'successful': successful,
+            'failed': total - successful,
+            'success_rate': round((successful / total) * 100, 2) if image_urls else 0,
+            'results': results
+        }
+        
+        logger.info(f"✅ Lote (async) concluído: {successful}/{total} sucessos ({summary['success_rate']}%)")
+        return summary
+
+    def warm_cache(self, image_urls: list, variant_specs: list = None, max_concurrency: int = None,
+                   host_rate: float = None,
+                   progress_callback: Callable[[int, int, int], None] = None) -> Dict[str, Any]:
+        """
+        Preenche o cache com as variantes pedidas para uma lista de URLs
+        
+        Cada URL é baixada no máximo uma vez para todas as suas variantes;
+        variantes já frescas no cache são puladas e índices vencidos são
+        revalidados na origem antes. Os downloads respeitam o limite por host.
+        
+        Args:
+            image_urls: URLs das imagens
+            variant_specs: Opções de cada variante, como em optimize_image_from_url
+                (format, quality, is_thumbnail, max_width, max_height, effort) ou,
+                com widths/formats, uma matriz de variantes; padrão: [{}]
+            max_concurrency: URLs processadas em paralelo (padrão: warm_max_concurrency)
+            host_rate: Downloads por segundo por host (padrão: warm_host_rate; 0 sem limite)
+            progress_callback: Chamado com (concluídas, com falha, total) a cada URL
+            
+        Returns:
+            Dict: resumo no formato do lote, contagem por variante
+            (warmed, skipped, failed) e o resultado de cada URL
+        """
+        unique_urls = list(dict.fromkeys(url.strip() for url in image_urls))
+        specs = [self._get_warm_spec(options) for options in (variant_specs or [{}])]
+        limiter = HostRateLimiter(self.warm_host_rate if host_rate is None else host_rate, self.warm_host_burst)
+        workers = max(1, min(max_concurrency or self.warm_max_concurrency, len(unique_urls)))
+        process_pool = self._get_process_pool() if len(unique_urls) > 1 else None
+        progress = {'completed': 0, 'failed': 0}
+        progress_lock = threading.Lock()
+        
+        logger.info(f"🔥 Aquecendo cache: {len(unique_urls)} URLs x {len(specs)} variantes")
+        
+        def process(url):
+            result = self._warm_url(url, specs, limiter, process_pool)
+            with progress_lock:
+                progress['completed'] += 1
+                progress['failed'] += 0 if result['success'] else 1
+                completed, failed = progress['completed'], progress['failed']
+            if progress_callback:
                 try:
-                    size = self.redis_client.memory_usage(key)
-                    if size:
-                        total_size += size
-                except:
-                    pass
+                    progress_callback(completed, failed, len(unique_urls))
+                except Exception as e:
+                    logger.error(f"❌ Erro no callback de progresso: {e}")
+            return result
+        
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='img-warm') as executor:
+            results = list(executor.map(process, unique_urls))
+        
+        statuses = [status for result in results for status in result['variants']]
+        successful = sum(1 for result in results if result['success'])
+        summary = {
+            'total_images': len(unique_urls),
+            'successful': successful,
+            'failed': len(unique_urls) - successful,
+            'variants': {status: statuses.count(status) for status in ('warmed', 'skipped', 'failed')},
+            'host_rate_wait_seconds': round(limiter.waited_seconds, 3),
+            'results': results
+        }
+        
+        logger.info(f"✅ Cache aquecido: {summary['variants']['warmed']} geradas, "
+                    f"{summary['variants']['skipped']} já frescas, {summary['variants']['failed']} falhas")
+        return summary
+
+    def _get_warm_spec(self, options: Dict[str, Any]) -> Dict[str, Any]:
+        """Especificação canônica de uma variante a aquecer (simples ou matriz)"""
+        effort = self._resolve_effort(options, self.batch_effort)
+        if 'widths' in options or 'formats' in options:
+            return {'matrix': True, 'spec': self._get_matrix_spec(options), 'effort': effort}
+        return {
+            'matrix': False,
+            'spec': self._get_transform_spec({'format': 'WEBP', 'is_thumbnail': False, **options}),
+            'effort': effort
+        }
+
+    def _has_fresh_variant(self, url_index: Dict[str, Any], warm_spec: Dict[str, Any]) -> bool:
+        record = self._get_from_cache(self._get_variant_key(url_index['original_hash'], warm_spec['spec']))
+        return bool(record) and self._satisfies_effort(record, warm_spec['effort'])
+
+    def _warm_url(self, image_url: str, specs: list, limiter: HostRateLimiter,
+                  process_pool: Optional[ProcessPoolExecutor]) -> Dict[str, Any]:
+        """Aquece as variantes de uma URL com um único download (ou nenhum)"""
+        start_time = datetime.utcnow()
+        index_key = self._get_url_index_key(image_url)
+        statuses = ['skipped'] * len(specs)
+        pending = list(range(len(specs)))
+        
+        try:
+            if self._is_generic_telegram_image(image_url):
+                raise ValueError('Imagem genérica do Telegram não será otimizada')
+            
+            url_index = previous_index = self._get_from_cache(index_key)
+            fetched = None
+            negative = None
+            if url_index and not self._is_fresh(url_index):
+                negative = self._get_negative_response(image_url)
+                if negative is None:
+                    limiter.acquire(image_url)
+                    url_index, fetched = self._revalidate_url_index(image_url, url_index)
+            
+            pending = [position for position, warm_spec in enumerate(specs)
+                       if not (url_index and self._has_fresh_variant(url_index, warm_spec))]
+            if pending and fetched is None:
+                negative = negative or self._get_negative_response(image_url)
+                if negative:
+                    return {'url': image_url, 'success': False,
+                            'variants': ['failed' if position in pending else 'skipped'
+                                         for position in range(len(specs))],
+                            'error': negative['error'], 'error_class': negative['error_class']}
+                limiter.acquire(image_url)
+                fetched = self._fetch_image(image_url)
             
+            for position in pending:
+                spec, effort = specs[position]['spec'], specs[position]['effort']
+                if specs[position]['matrix']:
+                    resolve = partial(self._resolve_variant_matrix, image_url, spec, start_time, effort,
+                                      fetched, url_index or previous_index)
+                else:
+                    resolve = partial(self._resolve_cache_miss, image_url, spec, process_pool, start_time,
+                                      effort, fetched, url_index or previous_index)
+                self.inflight.do(f"{self._get_cache_key(image_url, spec)}:{effort}", resolve)
+                statuses[position] = 'warmed'
+                # Índice regravado com as chaves da variante, para a próxima mesclar
+                url_index = self._get_from_cache(index_key)
+            
+            return {'url': image_url, 'success': True, 'variants': statuses}
+            
+        except Exception as e:
+            logger.error(f"❌ Erro ao aquecer {image_url}: {e}")
+            failure = self._failure_response(image_url, e, start_time)
             return {
+                'url': image_url,
+                'success': False,
+                'variants': ['failed' if position in pending and status != 'warmed' else status
+                             for position, status in enumerate(statuses)],
+                'error': failure['error'],
+                'error_class': failure.get('error_class')
+            }
+
+    def get_cache_stats(self, sample_size: int = 0) -> Dict[str, Any]:
+        """
+        Retorna estatísticas do cache
+        
+        Os totais vêm dos contadores agregados (O(1)) e são aproximados:
+        entries/bytes somam as escritas (sobrescritas contam como novas) e não
+        descontam expirações. clear_cache zera os contadores numa limpeza
+        completa e os recalcula com SCAN numa parcial.
+        
+        Args:
+            sample_size: Se > 0, mede MEMORY USAGE de até N chaves via SCAN
+        """
+        tiers = {
+            'memory': self.memory_cache.stats(),
+            'disk': self.disk_store.stats() if self.disk_store else {'enabled': False},
+            'counters': self.cache_counters.snapshot()
+        }
+        singleflight = self.inflight.stats()
+        if not self.redis_client:
+            return {'cache_enabled': False, 'tiers': tiers, 'singleflight': singleflight}
+        
+        try:
+            counters = self.redis_stats.read()
+            lookups = counters['hits'] + counters['misses']
+            
+            stats = {
                 'cache_enabled': True,
-                'total_keys': len(keys),
-                'estimated_size_mb': round(total_size / (1024 * 1024), 2),
-                'redis_info': self.redis_client.info('memory')
+                'total_keys': counters['entries'],
+                'estimated_size_mb': round(counters['bytes'] / (1024 * 1024), 2),
+                'hits': counters['hits'],
+                'misses': counters['misses'],
+                'hit_rate': round(counters['hits'] / lookups * 100, 2) if lookups else 0,
+                'redis_info': self.redis_client.info('memory'),
+                'tiers': tiers,
+                'singleflight': singleflight
             }
             
+            if sample_size > 0:
+                stats['memory_sample'] = self._sample_memory_usage(sample_size)
+            
+            return stats
+            
         except Exception as e:
             logger.error(f"❌ Erro ao obter stats do cache: {e}")
-            return {'cache_enabled': True, 'error': str(e)}
+            return {'cache_enabled': True, 'error': str(e), 'tiers': tiers, 'singleflight': singleflight}
+
+    def _sample_memory_usage(self, sample_size: int) -> Dict[str, Any]:
+        """Mede o uso de memória de uma amostra de chaves (SCAN + pipeline)"""
+        keys = []
+        for key in self.redis_client.scan_iter(match='img_*', count=self.scan_batch_size):
+            keys.append(key)
+            if len(keys) >= sample_size:
+                break
+        
+        pipe = self.redis_client.pipeline(transaction=False)
+        for key in keys:
+            pipe.memory_usage(key)
+        sizes = [size for size in pipe.execute() if size]
+        
+        return {
+            'sampled_keys': len(keys),
+            'sampled_bytes': sum(sizes),
+            'avg_key_bytes': round(sum(sizes) / len(sizes), 1) if sizes else 0
+        }
 
     def clear_cache(self, pattern: str = 'img_*') -> Dict[str, Any]:
-        """Limpa cache de imagens"""
+        """Limpa cache de imagens (SCAN incremental + UNLINK em lotes)"""
+        local_deleted = {'memory_deleted_keys': self.memory_cache.clear(pattern)}
+        if self.disk_store is not None:
+            local_deleted['disk_deleted_keys'] = self.disk_store.clear(pattern)
         if not self.redis_client:
-            return {'cache_enabled': False}
+            return {'cache_enabled': False, **local_deleted}
         
         try:
-            keys = self.redis_client.keys(pattern)
-            if keys:
-                deleted = self.redis_client.delete(*keys)
+            deleted = 0
+            batch = []
+            for key in self.redis_client.scan_iter(match=pattern, count=self.scan_batch_size):
+                if key in (self.redis_stats.key, self.redis_stats.key.encode()):
+                    continue
+                batch.append(key)
+                if len(batch) >= self.scan_batch_size:
+                    deleted += self._unlink_batch(batch)
+                    batch = []
+            if batch:
+                deleted += self._unlink_batch(batch)
+            
+            # Contadores: zerar numa limpeza completa, recalcular numa parcial
+            if pattern == 'img_*':
+                self.redis_stats.reset()
+            elif deleted:
+                self._resync_redis_stats()
+            
+            if deleted:
                 logger.info(f"🗑️ Cache limpo: {deleted} chaves removidas")
-                return {'deleted_keys': deleted, 'success': True}
+                return {'deleted_keys': deleted, **local_deleted, 'success': True}
             else:
-                return {'deleted_keys': 0, 'success': True, 'message': 'Nenhuma chave encontrada'}
+                return {'deleted_keys': 0, **local_deleted, 'success': True,
+                        'message': 'Nenhuma chave encontrada'}
                 
         except Exception as e:
             logger.error(f"❌ Erro ao limpar cache: {e}")
             return {'success': False, 'error': str(e)}
 
+    def _unlink_batch(self, keys: list) -> int:
+        """Remove um lote de chaves sem bloquear o Redis (UNLINK)"""
+        return self.redis_client.unlink(*keys)
+
+    def _resync_redis_stats(self) -> Dict[str, int]:
+        """
+        Recalcula entries/bytes com SCAN + STRLEN em lotes
+        
+        Escritas concorrentes durante a varredura podem ficar de fora; os
+        contadores continuam aproximados, mas sem a deriva acumulada.
+        """
+        totals = {'entries': 0, 'bytes': 0}
+        
+        def measure(keys):
+            pipe = self.redis_client.pipeline(transaction=False)
+            for key in keys:
+                pipe.strlen(key)
+            sizes = pipe.execute()
+            totals['entries'] += sum(1 for size in sizes if size)
+            totals['bytes'] += sum(sizes)
+        
+        batch = []
+        for key in self.redis_client.scan_iter(match='img_*', count=self.scan_batch_size):
+            if key in (self.redis_stats.key, self.redis_stats.key.encode()):
+                continue
+            batch.append(key)
+            if len(batch) >= self.scan_batch_size:
+                measure(batch)
+                batch = []
+        if batch:
+            measure(batch)
+        
+        self.redis_stats.set_totals(**totals)
+        logger.info(f"🔢 Contadores do cache recalculados: {totals['entries']} chaves, {totals['bytes']} bytes")
+        return totals
+
 
 # Flask App Integration
 def create_image_optimizer_app(redis_client=None, config=None):
@@ -521,7 +2159,8 @@ def create_image_optimizer_app(redis_client=None, config=None):
             "format": "WEBP",  // opcional: WEBP, JPEG, AVIF
             "quality": 85,     // opcional: 1-100
             "is_thumbnail": false,  // opcional: true para thumbnails
-            "return_base64": true   // opcional: retornar base64 ou URL
+            "return_base64": true,  // opcional: retornar base64 ou URL
+            "effort": "balanced"    // opcional: fast, balanced, max
         }
         """
         try:
@@ -551,9 +2190,17 @@ def create_image_optimizer_app(redis_client=None, config=None):
                 'format': data.get('format', 'WEBP').upper(),
                 'quality': data.get('quality', 85),
                 'is_thumbnail': data.get('is_thumbnail', False),
-                'return_base64': data.get('return_base64', True)
+                'return_base64': data.get('return_base64', True),
+                'effort': data.get('effort')
             }
             
+            # Validar esforço do codificador
+            if options['effort'] is not None and options['effort'] not in EFFORT_LEVELS:
+                return jsonify({
+                    'success': False,
+                    'error': f"Esforço inválido. Use: {', '.join(EFFORT_LEVELS)}"
+                }), 400
+            
             # Validar formato
             if options['format'] not in ['WEBP', 'JPEG', 'AVIF', 'PNG']:
                 return jsonify({
@@ -640,9 +2287,9 @@ def create_image_optimizer_app(redis_client=None, config=None):
 
     @app.route('/cache-stats', methods=['GET'])
     def cache_stats_endpoint():
-        """Endpoint para estatísticas do cache"""
+        """Endpoint para estatísticas do cache (?sample=N para amostrar memória)"""
         try:
-            stats = optimizer.get_cache_stats()
+            stats = optimizer.get_cache_stats(request.args.get('sample', 0, type=int))
             return jsonify(stats), 200
         except Exception as e:
             logger.error(f"❌ Erro ao obter stats: {e}")
@@ -687,6 +2334,7 @@ def create_image_optimizer_app(redis_client=None, config=None):
                     'webp_quality': optimizer.webp_quality,
                     'cache_ttl': optimizer.cache_ttl
                 },
+                'http_pool': optimizer.get_http_stats(),
                 'timestamp': datetime.utcnow().isoformat()
             }), 200
             
@@ -0,0 +1,196 @@
+"""
+Jobs assíncronos de otimização de imagens
+Fila com pool de workers em processo e estado em memória ou no Redis
+"""
+
+import json
+import time
+import uuid
+import logging
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional, Callable
+
+logger = logging.getLogger(__name__)
+
+# Estados de um job
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_COMPLETED = 'completed'
+JOB_FAILED = 'failed'
+
+
+class JobQueueFull(Exception):
+    """A fila de jobs atingiu o limite de jobs pendentes"""
+
+
+class InMemoryJobStore:
+    """
+    Estado dos jobs em um dicionário do processo
+
+    Adequado para uma única instância; os jobs expiram após ttl segundos.
+    """
+
+    def __init__(self, ttl: int = 3600):
+        self.ttl = ttl
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._expires: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def save(self, job: Dict[str, Any]) -> None:
+        with self._lock:
+            self._purge_expired()
+            self._jobs[job['id']] = json.loads(json.dumps(job, default=str))
+            self._expires[job['id']] = time.monotonic() + self.ttl
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            if self._expires.get(job_id, 0) <= time.monotonic():
+                self._jobs.pop(job_id, None)
+                self._expires.pop(job_id, None)
+                return None
+            job = self._jobs.get(job_id)
+            return json.loads(json.dumps(job)) if job else None
+
+    def _purge_expired(self) -> None:
+        now = time.monotonic()
+        for job_id in [job_id for job_id, expires in self._expires.items() if expires <= now]:
+            self._jobs.pop(job_id, None)
+            self._expires.pop(job_id, None)
+
+
+class RedisJobStore:
+    """
+    Estado dos jobs no Redis (JSON com TTL)
+
+    Qualquer instância do serviço pode responder ao status de um job,
+    embora ele seja executado pelo pool da instância que o recebeu.
+    """
+
+    def __init__(self, redis_client, ttl: int = 3600, prefix: str = 'imgjob:'):
+        self.redis_client = redis_client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def save(self, job: Dict[str, Any]) -> None:
+        self.redis_client.setex(
+            f"{self.prefix}{job['id']}", self.ttl,
+            json.dumps(job, default=str, separators=(',', ':'))
+        )
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        value = self.redis_client.get(f"{self.prefix}{job_id}")
+        return json.loads(value) if value else None
+
+
+class JobManager:
+    """
+    Executa lotes de otimização em segundo plano
+
+    Args:
+        optimizer: ImageOptimizer usado pelos jobs
+        store: InMemoryJobStore ou RedisJobStore
+        workers: Jobs executados em paralelo
+        max_pending: Limite de jobs na fila ou em execução
+    """
+
+    def __init__(self, optimizer, store, workers: int = 2, max_pending: int = 100):
+        self.optimizer = optimizer
+        self.store = store
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='img-job')
+        self._lock = threading.Lock()
+        self._pending = 0
+
+    def submit(self, image_urls: list, options: Dict[str, Any] = None,
+               task: Callable[[Callable[[int, int, int], None]], Dict[str, Any]] = None,
+               kind: str = 'batch') -> Dict[str, Any]:
+        """
+        Enfileira um lote e retorna o job imediatamente
+
+        task(progress_callback) substitui o lote padrão (batch_optimize_images),
+        ex.: o aquecimento do cache; o resumo deve ter successful e total_images.
+        """
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise JobQueueFull(f"Limite de {self.max_pending} jobs pendentes atingido")
+            self._pending += 1
+
+        job = {
+            'id': uuid.uuid4().hex,
+            'kind': kind,
+            'status': JOB_QUEUED,
+            'progress': {'completed': 0, 'failed': 0, 'total': len(image_urls), 'percent': 0},
+            'created_at': datetime.utcnow().isoformat(),
+            'started_at': None,
+            'finished_at': None,
+            'result': None,
+            'error': None
+        }
+        try:
+            self.store.save(job)
+            self._executor.submit(self._run, job, image_urls, options, task)
+        except Exception:
+            with self._lock:
+                self._pending -= 1
+            raise
+
+        logger.info(f"📥 Job {job['id']} enfileirado: {len(image_urls)} imagens")
+        return job
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self.store.get(job_id)
+
+    def _run(self, job: Dict[str, Any], image_urls: list, options: Dict[str, Any],
+             task: Callable[[Callable[[int, int, int], None]], Dict[str, Any]] = None) -> None:
+        job = {**job, 'status': JOB_RUNNING, 'started_at': datetime.utcnow().isoformat()}
+        self._save(job)
+
+        progress_lock = threading.Lock()
+
+        def on_progress(completed: int, failed: int, total: int) -> None:
+            # Chamado pelas threads do lote; ignora atualizações fora de ordem
+            with progress_lock:
+                if completed <= job['progress']['completed']:
+                    return
+                job['progress'] = {
+                    'completed': completed,
+                    'failed': failed,
+                    'total': total,
+                    'percent': round(completed / total * 100, 1) if total else 100
+                }
+                self._save(job)
+
+        try:
+            if task is None:
+                result = self.optimizer.batch_optimize_images(image_urls, options, progress_callback=on_progress)
+            else:
+                result = task(on_progress)
+            job.update(status=JOB_COMPLETED, result=result)
+            logger.info(f"✅ Job {job['id']} concluído: {result['successful']}/{result['total_images']}")
+        except Exception as e:
+            logger.error(f"❌ Job {job['id']} falhou: {e}")
+            job.update(status=JOB_FAILED, error=str(e))
+        finally:
+            job['finished_at'] = datetime.utcnow().isoformat()
+            self._save(job)
+            with self._lock:
+                self._pending -= 1
+
+    def _save(self, job: Dict[str, Any]) -> None:
+        try:
+            self.store.save(job)
+        except Exception as e:
+            logger.error(f"❌ Erro ao salvar estado do job {job['id']}: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'backend': type(self.store).__name__,
+                'pending': self._pending,
+                'max_pending': self.max_pending
+            }
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,460 @@
+"""
+Teste de carga de ponta a ponta do create_app, sem Telegram nem Upstash
+Origem HTTP local (latência, banda e falhas configuráveis) + Redis em memória
+
+Uso:
+    python loadtest.py --requests 500 --concurrency 16
+    python loadtest.py --server single --redis-latency-ms 2 --set MEMORY_CACHE_BYTES=0
+    python loadtest.py --target http://localhost:5000 --duration 30
+"""
+
+import sys
+import json
+import math
+import time
+import random
+import logging
+import argparse
+import threading
+from datetime import datetime
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Tuple
+
+import requests
+
+from benchmark import build_corpus
+from memory_redis import InMemoryRedis
+from utils import detect_image_content_type
+
+# Mistura padrão de endpoints (frações do total de requisições)
+DEFAULT_MIX = {'optimize': 0.8, 'batch': 0.1, 'analyze': 0.1}
+
+ENDPOINTS = {
+    'optimize': '/optimize-image',
+    'batch': '/batch-optimize',
+    'analyze': '/analyze-image'
+}
+
+PERCENTILES = (50, 95, 99)
+
+
+class FakeOrigin:
+    """
+    Servidor HTTP local que serve o corpus em /img/<item>/<n>
+
+    Cada n gera uma URL distinta para o mesmo conteúdo, o que controla a
+    taxa de acerto do cache pelo número de URLs únicas.
+
+    Args:
+        corpus: Item -> bytes da imagem
+        latency: Segundos antes do primeiro byte
+        jitter: Variação aleatória (uniforme, 0 a jitter) somada à latência
+        bandwidth: Bytes por segundo por resposta (0 = sem limite)
+        failure_rate: Fração das requisições respondidas com 503
+        seed: Semente das falhas e do jitter
+    """
+
+    def __init__(self, corpus: Dict[str, bytes], latency: float = 0.0, jitter: float = 0.0,
+                 bandwidth: int = 0, failure_rate: float = 0.0, seed: int = 0):
+        self.corpus = corpus
+        self.latency = latency
+        self.jitter = jitter
+        self.bandwidth = bandwidth
+        self.failure_rate = failure_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.counters = {'requests': 0, 'failures_injected': 0, 'not_found': 0, 'bytes_sent': 0}
+        self._server = None
+
+    def _draw(self) -> Tuple[bool, float]:
+        with self._lock:
+            self.counters['requests'] += 1
+            fail = self._rng.random() < self.failure_rate
+            delay = self.latency + self._rng.uniform(0, self.jitter)
+        return fail, delay
+
+    def _count(self, field: str, amount: int = 1) -> None:
+        with self._lock:
+            self.counters[field] += amount
+
+    def _handler(self):
+        origin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                fail, delay = origin._draw()
+                if delay:
+                    time.sleep(delay)
+
+                parts = self.path.strip('/').split('/')
+                data = origin.corpus.get(parts[1]) if len(parts) == 3 and parts[0] == 'img' else None
+                if fail or data is None:
+                    origin._count('failures_injected' if fail else 'not_found')
+                    self.send_response(503 if fail else 404)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+
+                self.send_response(200)
+                self.send_header('Content-Type', detect_image_content_type(data))
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self._write(data)
+                origin._count('bytes_sent', len(data))
+
+            def _write(self, data: bytes) -> None:
+                if not origin.bandwidth:
+                    self.wfile.write(data)
+                    return
+                # Blocos de ~10ms de transferência na banda configurada
+                chunk = max(1024, origin.bandwidth // 100)
+                for start in range(0, len(data), chunk):
+                    self.wfile.write(data[start:start + chunk])
+                    time.sleep(len(data[start:start + chunk]) / origin.bandwidth)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> 'FakeOrigin':
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def url_for(self, index: int) -> str:
+        """URL única número index (itens do corpus em rodízio)"""
+        names = sorted(self.corpus)
+        return f"{self.base_url}/img/{names[index % len(names)]}/{index}"
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.counters)
+
+    def __enter__(self) -> 'FakeOrigin':
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+def build_plan(origin: FakeOrigin, total: int, mix: Dict[str, float], unique_urls: int,
+               batch_size: int, options: Dict[str, Any], seed: int = 0) -> List[Tuple[str, Dict[str, Any]]]:
+    """Sequência determinística de (endpoint, corpo JSON) a enviar"""
+    rng = random.Random(seed)
+    kinds = list(mix)
+    weights = [mix[kind] for kind in kinds]
+    plan = []
+    for _ in range(total):
+        kind = rng.choices(kinds, weights)[0]
+        if kind == 'batch':
+            urls = [origin.url_for(rng.randrange(unique_urls)) for _ in range(batch_size)]
+            plan.append((kind, {'image_urls': urls, **options}))
+        elif kind == 'analyze':
+            plan.append((kind, {'image_url': origin.url_for(rng.randrange(unique_urls))}))
+        else:
+            plan.append((kind, {'image_url': origin.url_for(rng.randrange(unique_urls)), **options}))
+    return plan
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Percentil pelo método do posto mais próximo"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def _summarize(samples: List[Dict[str, Any]], elapsed: float) -> Dict[str, Any]:
+    latencies = sorted(sample['latency_ms'] for sample in samples)
+    errors = sum(1 for sample in samples if not sample['ok'])
+    summary = {
+        'requests': len(samples),
+        'errors': errors,
+        'error_rate': round(errors / len(samples), 4) if samples else 0,
+        'throughput_rps': round(len(samples) / elapsed, 2) if elapsed else 0,
+        'mean_ms': round(sum(latencies) / len(latencies), 2) if latencies else 0,
+        'max_ms': round(latencies[-1], 2) if latencies else 0
+    }
+    for pct in PERCENTILES:
+        summary[f'p{pct}_ms'] = round(percentile(latencies, pct), 2)
+    return summary
+
+
+def _send(session: requests.Session, base_url: str, kind: str, body: Dict[str, Any],
+          timeout: float) -> Dict[str, Any]:
+    started = time.perf_counter()
+    try:
+        response = session.post(base_url + ENDPOINTS[kind], json=body, timeout=timeout)
+        status = response.status_code
+        payload = response.json() if response.headers.get('content-type', '').startswith('application/json') else {}
+    except requests.RequestException as e:
+        status, payload = None, {'error': str(e)}
+    latency_ms = (time.perf_counter() - started) * 1000
+
+    if kind == 'batch':
+        results = payload.get('results', [])
+        ok = status == 200 and bool(results) and all(r.get('success') for r in results)
+    else:
+        results = [payload] if kind == 'optimize' else []
+        ok = status == 200 and bool(payload.get('success'))
+
+    return {
+        'kind': kind,
+        'status': status,
+        'ok': ok,
+        'latency_ms': latency_ms,
+        'optimizations': sum(1 for r in results if r.get('success')),
+        'from_cache': sum(1 for r in results if r.get('success') and r.get('from_cache'))
+    }
+
+
+def drive(base_url: str, plan: List[Tuple[str, Dict[str, Any]]], concurrency: int,
+          duration: float = None, timeout: float = 60) -> Tuple[List[Dict[str, Any]], float]:
+    """
+    Envia o plano com concurrency clientes simultâneos
+
+    Com duration, o plano é repetido em ciclo até o tempo acabar.
+
+    Returns:
+        Tuple: (amostras por requisição, segundos decorridos)
+    """
+    lock = threading.Lock()
+    cursor = {'next': 0}
+    samples: List[Dict[str, Any]] = []
+    deadline = time.monotonic() + duration if duration else None
+
+    def next_request():
+        with lock:
+            index = cursor['next']
+            cursor['next'] += 1
+        if deadline is None:
+            return plan[index] if index < len(plan) else None
+        return plan[index % len(plan)] if time.monotonic() < deadline else None
+
+    def worker():
+        with requests.Session() as session:
+            while True:
+                item = next_request()
+                if item is None:
+                    return
+                sample = _send(session, base_url, item[0], item[1], timeout)
+                with lock:
+                    samples.append(sample)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='loadtest') as executor:
+        for future in [executor.submit(worker) for _ in range(concurrency)]:
+            future.result()
+    return samples, time.perf_counter() - started
+
+
+def build_report(samples: List[Dict[str, Any]], elapsed: float) -> Dict[str, Any]:
+    """Latências (p50/p95/p99), vazão e erros por endpoint, e taxa de acerto do cache"""
+    optimizations = sum(sample['optimizations'] for sample in samples)
+    from_cache = sum(sample['from_cache'] for sample in samples)
+    statuses: Dict[str, int] = {}
+    for sample in samples:
+        statuses[str(sample['status'])] = statuses.get(str(sample['status']), 0) + 1
+
+    return {
+        'elapsed_s': round(elapsed, 3),
+        'overall': _summarize(samples, elapsed),
+        'endpoints': {
+            kind: _summarize([sample for sample in samples if sample['kind'] == kind], elapsed)
+            for kind in ENDPOINTS if any(sample['kind'] == kind for sample in samples)
+        },
+        'status_codes': statuses,
+        'cache': {
+            'optimizations': optimizations,
+            'from_cache': from_cache,
+            'hit_ratio': round(from_cache / optimizations, 4) if optimizations else 0
+        }
+    }
+
+
+def _apply_overrides(config_class, overrides: Dict[str, str]) -> Dict[str, Any]:
+    """Aplica NOME=VALOR na classe de configuração; retorna os valores anteriores"""
+    previous = {}
+    for name, raw in overrides.items():
+        if not hasattr(config_class, name):
+            raise ValueError(f"Configuração desconhecida: {name}")
+        current = getattr(config_class, name)
+        if isinstance(current, bool):
+            value = raw.lower() in ('1', 'true', 'yes', 'on')
+        elif isinstance(current, (int, float)):
+            value = type(current)(raw)
+        else:
+            value = raw
+        previous[name] = current
+        setattr(config_class, name, value)
+    return previous
+
+
+def run_load_test(requests_total: int = 200, concurrency: int = 8, mix: Dict[str, float] = None,
+                  unique_urls: int = 50, batch_size: int = 5, options: Dict[str, Any] = None,
+                  duration: float = None, server: str = 'threaded', target: str = None,
+                  environment: str = 'development', overrides: Dict[str, str] = None,
+                  origin_latency: float = 0.0, origin_jitter: float = 0.0, origin_bandwidth: int = 0,
+                  failure_rate: float = 0.0, redis_latency: float = 0.0, corpus_scale: float = 0.25,
+                  seed: int = 0) -> Dict[str, Any]:
+    """
+    Sobe a origem falsa (e, sem target, o create_app com Redis em memória) e aplica a carga
+
+    Args:
+        server: 'threaded' ou 'single' (servidor WSGI local com ou sem threads)
+        target: URL de um serviço já em execução (ex.: gunicorn); ignora server,
+            overrides e redis_latency
+        overrides: NOME=VALOR aplicados à classe de configuração do ambiente
+    """
+    from werkzeug.serving import make_server
+    from app import create_app
+    from config import get_config
+
+    mix = mix or DEFAULT_MIX
+    options = {'return_base64': False, **(options or {})}
+    corpus = build_corpus(scale=corpus_scale)
+
+    with FakeOrigin(corpus, origin_latency, origin_jitter, origin_bandwidth, failure_rate, seed) as origin:
+        plan = build_plan(origin, requests_total, mix, unique_urls, batch_size, options, seed)
+
+        redis_client = None
+        wsgi_server = None
+        previous = {}
+        config_class = type(get_config(environment))
+        try:
+            if target is None:
+                previous = _apply_overrides(config_class, overrides or {})
+                redis_client = InMemoryRedis(latency=redis_latency)
+                app = create_app(environment, redis_client=redis_client)
+                wsgi_server = make_server('127.0.0.1', 0, app, threaded=server == 'threaded')
+                threading.Thread(target=wsgi_server.serve_forever, daemon=True).start()
+                target = f"http://127.0.0.1:{wsgi_server.server_port}"
+
+            samples, elapsed = drive(target.rstrip('/'), plan, concurrency, duration)
+        finally:
+            if wsgi_server:
+                wsgi_server.shutdown()
+            for name, value in previous.items():
+                setattr(config_class, name, value)
+
+        report = build_report(samples, elapsed)
+        report['origin'] = origin.stats()
+
+    report['redis'] = {
+        'commands': dict(redis_client.commands),
+        'pipelines': redis_client.pipelines_executed,
+        'keys': redis_client.dbsize()
+    } if redis_client else None
+    report['settings'] = {
+        'timestamp': datetime.utcnow().isoformat(),
+        'target': target if wsgi_server is None else f'local ({server})',
+        'environment': environment,
+        'overrides': overrides or {},
+        'requests': requests_total,
+        'duration_s': duration,
+        'concurrency': concurrency,
+        'mix': mix,
+        'unique_urls': unique_urls,
+        'batch_size': batch_size,
+        'options': options,
+        'origin': {'latency_s': origin_latency, 'jitter_s': origin_jitter,
+                   'bandwidth_bps': origin_bandwidth, 'failure_rate': failure_rate},
+        'redis_latency_s': redis_latency,
+        'corpus_scale': corpus_scale,
+        'seed': seed
+    }
+    return report
+
+
+def _parse_pairs(values: List[str], cast=str) -> Dict[str, Any]:
+    pairs = {}
+    for value in values or []:
+        name, _, raw = value.partition('=')
+        if not raw:
+            raise argparse.ArgumentTypeError(f"Use NOME=VALOR: {value}")
+        pairs[name.strip()] = cast(raw.strip())
+    return pairs
+
+
+def _print_report(report: Dict[str, Any]) -> None:
+    print(f"\n{'endpoint':<10} {'reqs':>6} {'erros':>6} {'rps':>8} {'p50':>9} {'p95':>9} {'p99':>9}")
+    rows = [('total', report['overall'])] + list(report['endpoints'].items())
+    for name, row in rows:
+        print(f"{name:<10} {row['requests']:>6} {row['errors']:>6} {row['throughput_rps']:>8.1f} "
+              f"{row['p50_ms']:>7.1f}ms {row['p95_ms']:>7.1f}ms {row['p99_ms']:>7.1f}ms")
+    cache = report['cache']
+    print(f"\n🎯 Cache: {cache['from_cache']}/{cache['optimizations']} ({cache['hit_ratio'] * 100:.1f}%)")
+    print(f"🌐 Origem: {report['origin']}")
+    print(f"📊 Status: {report['status_codes']}")
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description='Teste de carga do serviço de otimização de imagens')
+    parser.add_argument('--requests', type=int, default=200, help='Total de requisições (sem --duration)')
+    parser.add_argument('--duration', type=float, help='Segundos de carga (repete o plano em ciclo)')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--mix', nargs='+', default=[f'{k}={v}' for k, v in DEFAULT_MIX.items()],
+                        help='Frações por endpoint: optimize=0.8 batch=0.1 analyze=0.1')
+    parser.add_argument('--unique-urls', type=int, default=50, help='URLs distintas (controla acertos no cache)')
+    parser.add_argument('--batch-size', type=int, default=5)
+    parser.add_argument('--format', default='WEBP')
+    parser.add_argument('--effort', choices=('fast', 'balanced', 'max'))
+    parser.add_argument('--base64', action='store_true', help='Pedir return_base64=true')
+    parser.add_argument('--server', choices=('threaded', 'single'), default='threaded')
+    parser.add_argument('--target', help='URL de um serviço já em execução (em vez do app local)')
+    parser.add_argument('--env', default='development', help='Ambiente do create_app')
+    parser.add_argument('--set', nargs='+', default=[], metavar='NOME=VALOR',
+                        help='Sobrescreve atributos da configuração (ex.: MEMORY_CACHE_BYTES=0)')
+    parser.add_argument('--origin-latency-ms', type=float, default=0.0)
+    parser.add_argument('--origin-jitter-ms', type=float, default=0.0)
+    parser.add_argument('--origin-bandwidth-kbps', type=float, default=0.0, help='0 = sem limite')
+    parser.add_argument('--failure-rate', type=float, default=0.0)
+    parser.add_argument('--redis-latency-ms', type=float, default=0.0)
+    parser.add_argument('--corpus-scale', type=float, default=0.25)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Arquivo JSON para o relatório')
+    args = parser.parse_args(argv)
+
+    # O serviço registra cada etapa em INFO; o relatório é o que interessa aqui
+    logging.getLogger().setLevel(logging.WARNING)
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+
+    options = {'format': args.format.upper(), 'return_base64': args.base64}
+    if args.effort:
+        options['effort'] = args.effort
+
+    report = run_load_test(
+        requests_total=args.requests, concurrency=args.concurrency,
+        mix=_parse_pairs(args.mix, float), unique_urls=args.unique_urls, batch_size=args.batch_size,
+        options=options, duration=args.duration, server=args.server, target=args.target,
+        environment=args.env, overrides=_parse_pairs(args.set),
+        origin_latency=args.origin_latency_ms / 1000, origin_jitter=args.origin_jitter_ms / 1000,
+        origin_bandwidth=int(args.origin_bandwidth_kbps * 1024), failure_rate=args.failure_rate,
+        redis_latency=args.redis_latency_ms / 1000, corpus_scale=args.corpus_scale, seed=args.seed
+    )
+
+    _print_report(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"💾 Relatório salvo em {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
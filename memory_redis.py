@@ -0,0 +1,203 @@
+"""
+Substituto do Redis em memória para testes e testes de carga
+Implementa só os comandos usados pelo otimizador, com TTL e latência simulada
+"""
+
+import time
+import fnmatch
+import threading
+from collections import Counter
+from typing import Dict, Any, Optional, Iterator
+
+
+class InMemoryRedis:
+    """
+    Cliente compatível (no subconjunto usado) com redis.Redis, em memória
+
+    Thread-safe; valores são devolvidos como bytes (decode_responses=False).
+
+    Args:
+        latency: Segundos de espera por comando (ou por pipeline), simulando a
+            ida e volta até um Redis remoto como o Upstash
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.store: Dict[str, bytes] = {}
+        self.hashes: Dict[str, Dict[bytes, bytes]] = {}
+        self.commands: Counter = Counter()
+        self.pipelines_executed = 0
+        self._expires: Dict[str, float] = {}
+        self._lock = threading.RLock()
+        # Comandos dentro de um pipeline não pagam a latência individualmente
+        self._in_pipeline = threading.local()
+
+    @staticmethod
+    def _encode(value) -> bytes:
+        if isinstance(value, bytes):
+            return value
+        if isinstance(value, (memoryview, bytearray)):
+            return bytes(value)
+        return str(value).encode()
+
+    def _command(self, name: str) -> None:
+        with self._lock:
+            self.commands[name] += 1
+        if self.latency and not getattr(self._in_pipeline, 'active', False):
+            time.sleep(self.latency)
+
+    def _alive(self, key: str) -> bool:
+        expires_at = self._expires.get(key)
+        if expires_at is not None and expires_at <= time.monotonic():
+            self.store.pop(key, None)
+            self._expires.pop(key, None)
+            return False
+        return key in self.store or key in self.hashes
+
+    def get(self, key: str) -> Optional[bytes]:
+        self._command('get')
+        with self._lock:
+            return self.store.get(key) if self._alive(key) else None
+
+    def set(self, key: str, value, ex: int = None) -> bool:
+        self._command('set')
+        with self._lock:
+            self.store[key] = self._encode(value)
+            if ex:
+                self._expires[key] = time.monotonic() + ex
+            else:
+                self._expires.pop(key, None)
+        return True
+
+    def setex(self, key: str, ttl: int, value) -> bool:
+        self._command('setex')
+        with self._lock:
+            self.store[key] = self._encode(value)
+            self._expires[key] = time.monotonic() + ttl
+        return True
+
+    def exists(self, *keys: str) -> int:
+        self._command('exists')
+        with self._lock:
+            return sum(1 for key in keys if self._alive(key))
+
+    def expire(self, key: str, ttl: int) -> bool:
+        self._command('expire')
+        with self._lock:
+            if not self._alive(key):
+                return False
+            self._expires[key] = time.monotonic() + ttl
+            return True
+
+    def ttl(self, key: str) -> int:
+        self._command('ttl')
+        with self._lock:
+            if not self._alive(key):
+                return -2
+            expires_at = self._expires.get(key)
+            return -1 if expires_at is None else max(0, int(expires_at - time.monotonic()))
+
+    def unlink(self, *keys: str) -> int:
+        self._command('unlink')
+        with self._lock:
+            removed = 0
+            for key in keys:
+                alive = self._alive(key)
+                self.store.pop(key, None)
+                self.hashes.pop(key, None)
+                self._expires.pop(key, None)
+                removed += 1 if alive else 0
+            return removed
+
+    delete = unlink
+
+    def scan_iter(self, match: str = '*', count: int = None) -> Iterator[str]:
+        self._command('scan')
+        with self._lock:
+            keys = [key for key in list(self.store) + list(self.hashes)
+                    if self._alive(key) and fnmatch.fnmatchcase(key, match)]
+        return iter(keys)
+
+    def hincrby(self, key: str, field: str, amount: int = 1) -> int:
+        self._command('hincrby')
+        with self._lock:
+            fields = self.hashes.setdefault(key, {})
+            field = self._encode(field)
+            fields[field] = str(int(fields.get(field, 0)) + amount).encode()
+            return int(fields[field])
+
+    def hset(self, key: str, field: str = None, value=None, mapping: Dict[str, Any] = None) -> int:
+        self._command('hset')
+        items = dict(mapping or {})
+        if field is not None:
+            items[field] = value
+        with self._lock:
+            fields = self.hashes.setdefault(key, {})
+            added = sum(1 for name in items if self._encode(name) not in fields)
+            fields.update({self._encode(name): self._encode(item) for name, item in items.items()})
+            return added
+
+    def strlen(self, key: str) -> int:
+        self._command('strlen')
+        with self._lock:
+            return len(self.store[key]) if self._alive(key) and key in self.store else 0
+
+    def hgetall(self, key: str) -> Dict[bytes, bytes]:
+        self._command('hgetall')
+        with self._lock:
+            return dict(self.hashes.get(key, {}))
+
+    def memory_usage(self, key: str) -> Optional[int]:
+        self._command('memory_usage')
+        with self._lock:
+            return len(self.store[key]) + 50 if self._alive(key) and key in self.store else None
+
+    def info(self, section: str = None) -> Dict[str, Any]:
+        self._command('info')
+        with self._lock:
+            return {'used_memory': sum(len(value) for value in self.store.values())}
+
+    def dbsize(self) -> int:
+        with self._lock:
+            return sum(1 for key in list(self.store) + list(self.hashes) if self._alive(key))
+
+    def ping(self) -> bool:
+        self._command('ping')
+        return True
+
+    def flushall(self) -> bool:
+        with self._lock:
+            self.store.clear()
+            self.hashes.clear()
+            self._expires.clear()
+        return True
+
+    def pipeline(self, transaction: bool = True) -> '_Pipeline':
+        return _Pipeline(self)
+
+
+class _Pipeline:
+    """Acumula comandos e os executa com uma única latência simulada"""
+
+    def __init__(self, redis_client: InMemoryRedis):
+        self._redis = redis_client
+        self._calls = []
+
+    def __getattr__(self, name: str):
+        def queue(*args, **kwargs):
+            self._calls.append((name, args, kwargs))
+            return self
+        return queue
+
+    def execute(self) -> list:
+        redis_client = self._redis
+        with redis_client._lock:
+            redis_client.pipelines_executed += 1
+        if redis_client.latency:
+            time.sleep(redis_client.latency)
+        redis_client._in_pipeline.active = True
+        try:
+            return [getattr(redis_client, name)(*args, **kwargs) for name, args, kwargs in self._calls]
+        finally:
+            redis_client._in_pipeline.active = False
+            self._calls = []
@@ -0,0 +1,232 @@
+"""
+Métricas do otimizador no formato de texto do Prometheus
+Contadores e histogramas em processo, sem dependências externas
+"""
+
+import time
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Any, Optional, Tuple, Iterator
+
+# Limites (segundos) dos histogramas de latência
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Etapas instrumentadas de optimize_image_from_url
+STAGES = ('cache_lookup', 'download', 'decode', 'resize', 'encode', 'cache_write')
+
+
+def _escape_label(value: Any) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels: Tuple[Tuple[str, Any], ...]) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape_label(value)}"' for name, value in labels) + '}'
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Contador monotônico com rótulos (thread-safe)"""
+
+    type_name = 'counter'
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple:
+        return tuple((name, labels[name]) for name in self.labelnames)
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def render(self) -> Iterator[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        for labels, value in values:
+            yield f"{self.name}{_format_labels(labels)} {_format_value(value)}"
+
+
+class Histogram:
+    """Histograma cumulativo com rótulos (thread-safe)"""
+
+    type_name = 'histogram'
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Por série: contagens por faixa (não cumulativas, última = +Inf), soma
+        self._series: Dict[Tuple, Tuple[list, list]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple((name, labels[name]) for name in self.labelnames)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = ([0] * (len(self.buckets) + 1), [0.0])
+            series[0][index] += 1
+            series[1][0] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """Observa a duração (perf_counter) do bloco"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels) -> int:
+        key = tuple((name, labels[name]) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            return sum(series[0]) if series else 0
+
+    def render(self) -> Iterator[str]:
+        with self._lock:
+            snapshot = sorted((key, list(counts), total[0]) for key, (counts, total) in self._series.items())
+        for labels, counts, total in snapshot:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                bucket_labels = labels + (('le', _format_value(float(bound))),)
+                yield f"{self.name}_bucket{_format_labels(bucket_labels)} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(labels)} {_format_value(float(total))}"
+            yield f"{self.name}_count{_format_labels(labels)} {cumulative}"
+
+
+class MetricsRegistry:
+    """Conjunto de métricas renderizado em /metrics"""
+
+    def __init__(self):
+        self._metrics: Dict[str, Any] = {}
+
+    def counter(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(name, help_text, labelnames))
+
+    def histogram(self, name: str, help_text: str, labelnames: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help_text, labelnames, buckets))
+
+    def _register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Métrica já registrada: {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        """Exposição no formato de texto do Prometheus (versão 0.0.4)"""
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.type_name}")
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+class _RequestTimer:
+    """Estado de uma requisição em andamento (thread atual)"""
+
+    __slots__ = ('started', 'cpu_started', 'extra_cpu', 'outcome')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.cpu_started = time.thread_time()
+        self.extra_cpu = 0.0
+        self.outcome = None
+
+
+class OptimizerMetrics(MetricsRegistry):
+    """
+    Métricas do ImageOptimizer
+
+    Latência por etapa, duração e tempo de CPU por requisição, consultas ao
+    cache por tipo de chave e camada, e bytes recebidos da origem e entregues.
+    O tempo de CPU é o da thread da requisição (time.thread_time) somado ao
+    informado pelos processos do pool quando a otimização roda fora dela.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.requests = self.counter(
+            'image_optimizer_requests_total', 'Otimizações por resultado', ('outcome',))
+        self.request_seconds = self.histogram(
+            'image_optimizer_request_duration_seconds', 'Duração das otimizações', ('outcome',))
+        self.request_cpu_seconds = self.histogram(
+            'image_optimizer_request_cpu_seconds', 'Tempo de CPU das otimizações', ('outcome',))
+        self.stage_seconds = self.histogram(
+            'image_optimizer_stage_duration_seconds', 'Duração de cada etapa da otimização', ('stage',))
+        self.cache_lookups = self.counter(
+            'image_optimizer_cache_lookups_total', 'Consultas ao cache por tipo de chave, camada e resultado',
+            ('key_type', 'tier', 'result'))
+        self.revalidations = self.counter(
+            'image_optimizer_revalidations_total', 'Revalidações condicionais na origem por resultado', ('result',))
+        self.background_refreshes = self.counter(
+            'image_optimizer_background_refreshes_total', 'Renovações stale-while-revalidate por resultado',
+            ('result',))
+        self.bytes_in = self.counter(
+            'image_optimizer_bytes_in_total', 'Bytes de imagem baixados da origem')
+        self.bytes_out = self.counter(
+            'image_optimizer_bytes_out_total', 'Bytes de imagem otimizada entregues')
+        self._local = threading.local()
+
+    @contextmanager
+    def request(self):
+        """
+        Mede uma requisição na thread atual
+
+        O resultado é definido pelo chamador em timer.outcome; requisições
+        sem resultado (None) não são registradas.
+        """
+        timer = _RequestTimer()
+        previous = getattr(self._local, 'timer', None)
+        self._local.timer = timer
+        try:
+            yield timer
+        finally:
+            self._local.timer = previous
+            if timer.outcome is not None:
+                elapsed = time.perf_counter() - timer.started
+                cpu = time.thread_time() - timer.cpu_started + timer.extra_cpu
+                self.requests.inc(outcome=timer.outcome)
+                self.request_seconds.observe(elapsed, outcome=timer.outcome)
+                self.request_cpu_seconds.observe(cpu, outcome=timer.outcome)
+
+    def add_request_cpu(self, seconds: float) -> None:
+        """Soma tempo de CPU gasto fora da thread (pool de processos) à requisição atual"""
+        timer = getattr(self._local, 'timer', None)
+        if timer is not None:
+            timer.extra_cpu += seconds
+
+    def stage(self, name: str):
+        return self.stage_seconds.time(stage=name)
+
+    def observe_stages(self, timings_ms: Optional[Dict[str, float]]) -> None:
+        """Registra as etapas medidas dentro de _optimize_image (em milissegundos)"""
+        for name, value in (timings_ms or {}).items():
+            if name in STAGES:
+                self.stage_seconds.observe(value / 1000, stage=name)
+
+    def cache_lookup(self, key: str, tier: str, hit: bool) -> None:
+        self.cache_lookups.inc(key_type=key.split(':', 1)[0], tier=tier, result='hit' if hit else 'miss')
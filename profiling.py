@@ -0,0 +1,152 @@
+"""
+Perfilamento sob demanda de uma única requisição
+Amostragem de pilhas (formato collapsed do flamegraph) ou cProfile determinístico
+"""
+
+import os
+import sys
+import time
+import pstats
+import cProfile
+import threading
+from collections import Counter
+from typing import Dict, Any, Tuple, Callable, Optional
+
+# Modos aceitos: 'sample' (amostragem de pilhas) ou 'cprofile' (determinístico)
+PROFILE_MODES = ('sample', 'cprofile')
+
+# Intervalo padrão entre amostras e número de funções no relatório
+DEFAULT_SAMPLE_INTERVAL = 0.005
+DEFAULT_TOP = 25
+
+
+def _frame_label(code) -> str:
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}:{code.co_firstlineno}"
+
+
+class SamplingProfiler:
+    """
+    Amostra periodicamente a pilha de uma thread
+
+    Uma thread auxiliar lê sys._current_frames() a cada intervalo; a thread
+    perfilada não é instrumentada. Só os quadros abaixo de stop_frame (a
+    chamada perfilada) entram nas pilhas.
+
+    Args:
+        thread_id: Identificador da thread perfilada
+        interval: Segundos entre amostras
+        stop_frame: Quadro em que a subida da pilha para
+    """
+
+    def __init__(self, thread_id: int, interval: float = DEFAULT_SAMPLE_INTERVAL, stop_frame=None):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stop_frame = stop_frame
+        self.stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='img-profiler', daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None and frame is not self.stop_frame:
+                stack.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            if stack:
+                self.stacks[tuple(reversed(stack))] += 1
+
+    def report(self, top: int = DEFAULT_TOP) -> Dict[str, Any]:
+        """Funções mais quentes (estimativa por amostras) e pilhas collapsed"""
+        interval_ms = self.interval * 1000
+        self_samples: Counter = Counter()
+        total_samples: Counter = Counter()
+        for stack, count in self.stacks.items():
+            self_samples[stack[-1]] += count
+            for label in set(stack):
+                total_samples[label] += count
+
+        return {
+            'samples': sum(self.stacks.values()),
+            'interval_ms': interval_ms,
+            'top_functions': [
+                {
+                    'function': label,
+                    'self_ms': round(count * interval_ms, 1),
+                    'total_ms': round(total_samples[label] * interval_ms, 1)
+                }
+                for label, count in self_samples.most_common(top)
+            ],
+            'collapsed_stacks': '\n'.join(
+                f"{';'.join(stack)} {count}" for stack, count in self.stacks.most_common()
+            )
+        }
+
+
+def _cprofile_report(profiler: cProfile.Profile, top: int) -> Dict[str, Any]:
+    """Funções com maior tempo próprio segundo o cProfile"""
+    stats = pstats.Stats(profiler).stats
+    hottest = sorted(stats.items(), key=lambda item: item[1][2], reverse=True)[:top]
+    return {
+        'top_functions': [
+            {
+                'function': f"{os.path.basename(filename)}:{name}:{line}",
+                'calls': calls,
+                'self_ms': round(self_time * 1000, 3),
+                'total_ms': round(cumulative * 1000, 3)
+            }
+            for (filename, line, name), (_, calls, self_time, cumulative, _) in hottest
+        ],
+        # O cProfile não guarda pilhas completas, só pares chamador/chamado
+        'collapsed_stacks': None
+    }
+
+
+def profile_call(func: Callable[[], Any], mode: str = 'sample',
+                 interval: float = DEFAULT_SAMPLE_INTERVAL, top: int = DEFAULT_TOP) -> Tuple[Any, Dict[str, Any]]:
+    """
+    Executa func na thread atual sob o perfilador escolhido
+
+    Returns:
+        Tuple: (retorno de func, relatório com mode, duration_ms, top_functions
+        e collapsed_stacks)
+    """
+    if mode not in PROFILE_MODES:
+        raise ValueError(f"Modo de perfilamento inválido: {mode}")
+
+    started = time.perf_counter()
+    if mode == 'cprofile':
+        profiler = cProfile.Profile()
+        result = profiler.runcall(func)
+        report = _cprofile_report(profiler, top)
+    else:
+        profiler = SamplingProfiler(threading.get_ident(), interval, stop_frame=sys._getframe())
+        profiler.start()
+        try:
+            result = func()
+        finally:
+            profiler.stop()
+        report = profiler.report(top)
+
+    return result, {
+        'mode': mode,
+        'duration_ms': round((time.perf_counter() - started) * 1000, 3),
+        **report
+    }
+
+
+def parse_profile_header(value: Optional[str], default_mode: str = 'sample') -> Optional[str]:
+    """Modo pedido no cabeçalho X-Profile (None se ausente ou desligado)"""
+    value = (value or '').strip().lower()
+    if value in ('', '0', 'false', 'off'):
+        return None
+    if value in ('1', 'true', 'on'):
+        return default_mode
+    return value
@@ -0,0 +1,189 @@
+"""
+Busca de qualidade de codificação por alvo de SSIM ou tamanho máximo em bytes
+SSIM vetorizado com NumPy sobre o plano de luminância reduzido
+"""
+
+import io
+import logging
+from typing import Dict, Any, Optional, Callable
+
+from PIL import Image
+
+try:
+    import numpy as np
+except ImportError:  # numpy é opcional: sem ele só o alvo por bytes está disponível
+    np = None
+
+logger = logging.getLogger(__name__)
+
+# Lado máximo do plano de luminância comparado no SSIM
+SSIM_MAX_SIDE = 256
+
+# Janela (blocos não sobrepostos) e constantes do SSIM para valores 0-255
+SSIM_WINDOW = 8
+SSIM_C1 = (0.01 * 255) ** 2
+SSIM_C2 = (0.03 * 255) ** 2
+
+# Margem acima do alvo em que a busca para imediatamente
+SSIM_EARLY_EXIT_MARGIN = 0.003
+
+# Faixa de qualidade explorada e palpite inicial por classe de conteúdo
+QUALITY_RANGE = (30, 95)
+CLASS_START_QUALITY = {
+    'graphic': 60,  # poucas cores, bordas nítidas: comprime bem com qualidade baixa
+    'photo': 80
+}
+
+# Imagens com até este número de cores (na versão reduzida) são gráficos
+GRAPHIC_MAX_COLORS = 256
+
+
+def is_ssim_available() -> bool:
+    """Indica se o NumPy está instalado (necessário para o alvo de SSIM)"""
+    return np is not None
+
+
+def luma_plane(image: Image.Image, max_side: int = SSIM_MAX_SIDE):
+    """Plano de luminância reduzido como array float64"""
+    luma = image.convert('L')
+    if max(luma.size) > max_side:
+        luma = luma.copy()
+        luma.thumbnail((max_side, max_side), Image.Resampling.BOX)
+    return np.asarray(luma, dtype=np.float64)
+
+
+def ssim(reference, candidate) -> float:
+    """
+    SSIM médio entre dois planos de luminância de mesmo tamanho
+
+    Calculado em janelas 8x8 não sobrepostas, todas de uma vez (sem laços
+    em Python): médias, variâncias e covariância por bloco via reshape.
+    """
+    w = SSIM_WINDOW
+    height = (reference.shape[0] // w) * w
+    width = (reference.shape[1] // w) * w
+    if not height or not width:
+        # Imagem menor que a janela: uma única janela com tudo
+        blocks_a = reference.reshape(1, -1)
+        blocks_b = candidate.reshape(1, -1)
+    else:
+        shape = (height // w, w, width // w, w)
+        blocks_a = reference[:height, :width].reshape(shape).swapaxes(1, 2).reshape(-1, w * w)
+        blocks_b = candidate[:height, :width].reshape(shape).swapaxes(1, 2).reshape(-1, w * w)
+
+    mu_a = blocks_a.mean(axis=1)
+    mu_b = blocks_b.mean(axis=1)
+    var_a = blocks_a.var(axis=1)
+    var_b = blocks_b.var(axis=1)
+    cov = ((blocks_a - mu_a[:, None]) * (blocks_b - mu_b[:, None])).mean(axis=1)
+
+    ssim_map = ((2 * mu_a * mu_b + SSIM_C1) * (2 * cov + SSIM_C2)) / \
+               ((mu_a ** 2 + mu_b ** 2 + SSIM_C1) * (var_a + var_b + SSIM_C2))
+    return float(ssim_map.mean())
+
+
+def classify_content(image: Image.Image) -> str:
+    """Classifica a imagem como 'graphic' (poucas cores) ou 'photo'"""
+    small = image.convert('RGB')
+    small.thumbnail((64, 64), Image.Resampling.BOX)
+    colors = small.getcolors(maxcolors=GRAPHIC_MAX_COLORS)
+    return 'graphic' if colors is not None else 'photo'
+
+
+def search_quality(image: Image.Image, encode: Callable[[int], bytes],
+                   target_ssim: float = None, max_bytes: int = None,
+                   start_quality: int = None) -> Dict[str, Any]:
+    """
+    Busca binária da qualidade do codificador
+
+    Com target_ssim, procura a menor qualidade cujo SSIM atinge o alvo; com
+    max_bytes, a maior qualidade que cabe no limite. Com os dois, o alvo de
+    SSIM é atendido se couber no limite de bytes; senão, o limite prevalece.
+
+    Args:
+        image: Imagem já redimensionada (referência do SSIM)
+        encode: Função que codifica a imagem com uma qualidade e retorna os bytes
+        target_ssim: SSIM mínimo (0-1)
+        max_bytes: Tamanho máximo do resultado
+        start_quality: Primeiro candidato (padrão: palpite pela classe de conteúdo)
+
+    Returns:
+        Dict com data, quality, ssim, bytes, probes e content_class
+    """
+    if target_ssim is None and max_bytes is None:
+        raise ValueError("Informe target_ssim e/ou max_bytes")
+    if target_ssim is not None and not is_ssim_available():
+        raise ValueError("target_ssim requer o pacote numpy")
+
+    content_class = classify_content(image)
+    low, high = QUALITY_RANGE
+    start = min(max(start_quality or CLASS_START_QUALITY[content_class], low), high)
+
+    reference = luma_plane(image) if target_ssim is not None else None
+    candidates: Dict[int, Dict[str, Any]] = {}
+
+    def probe(quality: int) -> Dict[str, Any]:
+        if quality not in candidates:
+            data = encode(quality)
+            score = None
+            if reference is not None:
+                # Mesmo tamanho da referência: a redução do plano é idêntica
+                with Image.open(io.BytesIO(data)) as decoded:
+                    score = ssim(reference, luma_plane(decoded))
+            candidates[quality] = {'data': data, 'quality': quality, 'ssim': score, 'bytes': len(data)}
+        return candidates[quality]
+
+    chosen = None
+    if target_ssim is not None:
+        chosen = _lowest_passing(low, high, start, probe,
+                                 lambda c: c['ssim'] >= target_ssim,
+                                 lambda c: c['ssim'] - target_ssim <= SSIM_EARLY_EXIT_MARGIN)
+
+    if max_bytes is not None and (chosen is None or chosen['bytes'] > max_bytes):
+        first = chosen['quality'] if chosen else start
+        chosen = _highest_passing(low, high, first, probe, lambda c: c['bytes'] <= max_bytes)
+        if chosen is None:
+            # Nem a menor qualidade cabe: entregar o menor resultado possível
+            chosen = probe(low)
+
+    if chosen is None:
+        # Alvo de SSIM inatingível na faixa: usar a maior qualidade
+        chosen = probe(high)
+
+    logger.info(f"🎯 Qualidade escolhida: {chosen['quality']} ({content_class}, {len(candidates)} codificações, "
+                f"SSIM {chosen['ssim']}, {chosen['bytes']} bytes)")
+    return {**chosen, 'probes': len(candidates), 'content_class': content_class}
+
+
+def _lowest_passing(low: int, high: int, first: int, probe: Callable, passes: Callable,
+                    good_enough: Callable = None) -> Optional[Dict[str, Any]]:
+    """Menor qualidade em [low, high] que passa (predicado monotônico crescente)"""
+    best = None
+    quality = first
+    while low <= high:
+        candidate = probe(quality)
+        if passes(candidate):
+            best = candidate
+            if good_enough and good_enough(candidate):
+                break
+            high = quality - 1
+        else:
+            low = quality + 1
+        quality = (low + high) // 2
+    return best
+
+
+def _highest_passing(low: int, high: int, first: int, probe: Callable,
+                     passes: Callable) -> Optional[Dict[str, Any]]:
+    """Maior qualidade em [low, high] que passa (predicado monotônico decrescente)"""
+    best = None
+    quality = min(max(first, low), high)
+    while low <= high:
+        candidate = probe(quality)
+        if passes(candidate):
+            best = candidate
+            low = quality + 1
+        else:
+            high = quality - 1
+        quality = (low + high + 1) // 2
+    return best
@@ -5,11 +5,26 @@ Testes para o módulo de otimização de imagens
 import pytest
 import json
 import io
+import time
+import threading
+from datetime import datetime, timedelta
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 from PIL import Image
 from unittest.mock import Mock, patch
 from app import create_app
 from image_optimizer import ImageOptimizer
 from config import ImageOptimizerConfig
+from memory_redis import InMemoryRedis
+
+
+def fetched_image(image_data, content_type='image/jpeg'):
+    """Resultado de _fetch_image para uso em mocks"""
+    return {
+        'data': image_data,
+        'content_type': content_type,
+        'sniffed_type': content_type,
+        'hash': ImageOptimizer()._generate_image_hash(image_data)
+    }
 
 @pytest.fixture
 def app():
@@ -31,6 +46,86 @@ def sample_image_data():
     img.save(buffer, format='JPEG', quality=95)
     return buffer.getvalue()
 
+@pytest.fixture
+def image_server(sample_image_data):
+    """Servidor HTTP local que serve a imagem de exemplo"""
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header('Content-Type', 'image/jpeg')
+            self.send_header('Content-Length', str(len(sample_image_data)))
+            self.end_headers()
+            self.wfile.write(sample_image_data)
+        
+        def log_message(self, *args):
+            pass
+    
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://localhost:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def conditional_origin(sample_image_data):
+    """Origem com ETag que responde 304 a requisições condicionais"""
+    state = {'etag': '"v1"', 'body': sample_image_data, 'conditional': 0, 'not_modified': 0, 'fail': False,
+             'status': None, 'delay': 0, 'gate': threading.Event()}
+    state['gate'].set()
+    
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        
+        def do_GET(self):
+            state['gate'].wait(5)
+            time.sleep(state['delay'])
+            if state['fail'] or state['status']:
+                self.send_response(state['status'] or 503)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            if self.headers.get('If-None-Match'):
+                state['conditional'] += 1
+            if self.headers.get('If-None-Match') == state['etag']:
+                state['not_modified'] += 1
+                self.send_response(304)
+                self.send_header('ETag', state['etag'])
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', 'image/jpeg')
+            self.send_header('Content-Length', str(len(state['body'])))
+            self.send_header('ETag', state['etag'])
+            self.send_header('Last-Modified', 'Mon, 05 Oct 2026 10:00:00 GMT')
+            self.send_header('Cache-Control', 'public, max-age=0')
+            self.end_headers()
+            self.wfile.write(state['body'])
+        
+        def log_message(self, *args):
+            pass
+    
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    state['url'] = f"http://localhost:{server.server_address[1]}/group.jpg"
+    yield state
+    server.shutdown()
+    server.server_close()
+
+class DictRedis(InMemoryRedis):
+    """Redis em memória que registra as chaves lidas com GET"""
+    
+    def __init__(self):
+        super().__init__()
+        self.gets = []
+    
+    def get(self, key):
+        self.gets.append(key)
+        return super().get(key)
+
 @pytest.fixture
 def mock_redis():
     """Mock do cliente Redis"""
@@ -80,12 +175,12 @@ class TestImageOptimizer:
         assert len(hash1) == 16  # Hash truncado para 16 caracteres
         assert isinstance(hash1, str)
 
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_download_image_success(self, mock_get, sample_image_data):
         """Testa download bem-sucedido de imagem"""
         # Mock da resposta HTTP
         mock_response = Mock()
-        mock_response.content = sample_image_data
+        mock_response.iter_content.return_value = [sample_image_data[:1000], sample_image_data[1000:]]
         mock_response.headers = {'content-type': 'image/jpeg'}
         mock_response.raise_for_status.return_value = None
         mock_get.return_value = mock_response
@@ -96,7 +191,57 @@ class TestImageOptimizer:
         assert data == sample_image_data
         assert content_type == 'image/jpeg'
 
-    @patch('requests.get')
+    @patch('requests.Session.get')
+    def test_download_aborts_when_over_size_limit(self, mock_get):
+        """Testa que o download é interrompido assim que passa do limite"""
+        consumed = []
+        
+        def chunks():
+            for i in range(100):
+                consumed.append(i)
+                yield (b'\xFF\xD8\xFF' if i == 0 else b'') + b'\x00' * 1024
+        
+        mock_response = Mock()
+        mock_response.iter_content.return_value = chunks()
+        mock_response.headers = {'content-type': 'image/jpeg'}  # Sem Content-Length
+        mock_get.return_value = mock_response
+        
+        optimizer = ImageOptimizer(config={'max_file_size': 4 * 1024})
+        with pytest.raises(ValueError, match='muito grande'):
+            optimizer._fetch_image('https://example.com/huge.jpg')
+        
+        assert len(consumed) == 4  # 4 blocos de ~1KB já passam de 4KB
+        mock_response.close.assert_called_once()
+
+    @patch('requests.Session.get')
+    def test_download_rejects_non_image_bytes(self, mock_get):
+        """Testa a rejeição por magic bytes mesmo com content-type de imagem"""
+        mock_response = Mock()
+        mock_response.iter_content.return_value = [b'<!DOCTYPE html><html>...</html>']
+        mock_response.headers = {'content-type': 'image/jpeg'}
+        mock_get.return_value = mock_response
+        
+        optimizer = ImageOptimizer()
+        with pytest.raises(ValueError, match='formato de imagem'):
+            optimizer._fetch_image('https://example.com/fake.jpg')
+
+    @patch('requests.Session.get')
+    def test_download_hashes_incrementally(self, mock_get, sample_image_data):
+        """Testa que o hash do download coincide com _generate_image_hash"""
+        mock_response = Mock()
+        mock_response.iter_content.return_value = [
+            sample_image_data[i:i + 4096] for i in range(0, len(sample_image_data), 4096)
+        ]
+        mock_response.headers = {'content-type': 'image/jpeg'}
+        mock_get.return_value = mock_response
+        
+        optimizer = ImageOptimizer()
+        fetched = optimizer._fetch_image('https://example.com/photo.jpg')
+        
+        assert fetched['hash'] == optimizer._generate_image_hash(sample_image_data)
+        assert fetched['sniffed_type'] == 'image/jpeg'
+
+    @patch('requests.Session.get')
     def test_download_image_failure(self, mock_get):
         """Testa falha no download de imagem"""
         mock_get.side_effect = Exception("Network error")
@@ -116,9 +261,38 @@ class TestImageOptimizer:
         assert metadata['new_format'] == 'WEBP'
         assert metadata['size_reduction_percent'] > 0
 
+    def test_optimize_large_jpeg_uses_reduced_decode(self):
+        """Testa a decodificação JPEG reduzida (draft) para thumbnails"""
+        img = Image.new('RGB', (4000, 3000), color='green')
+        buffer = io.BytesIO()
+        img.save(buffer, format='JPEG')
+        
+        optimizer = ImageOptimizer(config={'thumbnail_size': (800, 800)})
+        optimized_data, metadata = optimizer._optimize_image(buffer.getvalue(), 'WEBP', is_thumbnail=True)
+        
+        assert metadata['decode_scale'] == 4  # 4000x3000 -> 1000x750, ainda >= 800x600
+        assert metadata['new_size'] == (800, 600)
+        with Image.open(io.BytesIO(optimized_data)) as result:
+            assert result.size == (800, 600)
+
+    def test_optimize_respects_exif_orientation_with_reduced_decode(self):
+        """Testa que o alvo do draft considera a rotação EXIF"""
+        img = Image.new('RGB', (4000, 3000), color='green')
+        exif = img.getexif()
+        exif[0x0112] = 6  # Rotacionar 90° -> retrato 3000x4000
+        buffer = io.BytesIO()
+        img.save(buffer, format='JPEG', exif=exif)
+        
+        optimizer = ImageOptimizer(config={'thumbnail_size': (800, 800)})
+        optimized_data, metadata = optimizer._optimize_image(buffer.getvalue(), 'JPEG', is_thumbnail=True)
+        
+        assert metadata['new_size'] == (600, 800)
+        with Image.open(io.BytesIO(optimized_data)) as result:
+            assert result.size == (600, 800)
+
     def test_cache_operations(self, mock_redis):
         """Testa operações de cache"""
-        optimizer = ImageOptimizer(redis_client=mock_redis)
+        optimizer = ImageOptimizer(redis_client=mock_redis, config={'memory_cache_bytes': 0})
         
         # Teste de salvamento
         cache_key = "test_key"
@@ -134,6 +308,968 @@ class TestImageOptimizer:
         assert cached_data == data
 
 
+class TestBinaryCacheLayout:
+    """Testes do layout de cache binário + metadados"""
+    
+    def test_optimized_bytes_stored_once_without_base64(self, sample_image_data):
+        """Testa que o binário é salvo uma vez e os metadados não contêm base64"""
+        redis_client = DictRedis()
+        optimizer = ImageOptimizer(redis_client=redis_client)
+        
+        with patch.object(ImageOptimizer, '_fetch_image', return_value=fetched_image(sample_image_data)):
+            result = optimizer.optimize_image_from_url('https://example.com/a.jpg')
+        
+        assert result['success'] and result['optimized_base64'].startswith('data:image/webp;base64,')
+        blob_keys = [k for k in redis_client.store if k.startswith('img_data:')]
+        assert blob_keys == [f"img_data:{result['content_hash']}"]
+        assert redis_client.store[blob_keys[0]][:4] == b'RIFF'
+        
+        for key, value in redis_client.store.items():
+            if not key.startswith('img_data:'):
+                assert b'base64' not in value
+                assert len(value) < 1024
+
+    def test_cache_hit_builds_base64_only_when_requested(self, sample_image_data):
+        """Testa que o hit em modo URL não lê o binário do cache"""
+        redis_client = DictRedis()
+        optimizer = ImageOptimizer(redis_client=redis_client)
+        
+        with patch.object(ImageOptimizer, '_fetch_image', return_value=fetched_image(sample_image_data)):
+            first = optimizer.optimize_image_from_url('https://example.com/a.jpg')
+        
+        with patch.object(ImageOptimizer, '_fetch_image', side_effect=AssertionError('sem download')):
+            redis_client.gets.clear()
+            as_url = optimizer.optimize_image_from_url('https://example.com/a.jpg', {'return_base64': False})
+            assert as_url['from_cache']
+            assert as_url['optimized_url'] == f"/optimized/{first['content_hash']}.webp"
+            assert not any(k.startswith('img_data:') for k in redis_client.gets)
+            
+            as_base64 = optimizer.optimize_image_from_url('https://example.com/a.jpg')
+            assert as_base64['from_cache']
+            assert as_base64['optimized_base64'] == first['optimized_base64']
+
+
+class TestVariantStore:
+    """Testes do armazenamento de variantes endereçado por conteúdo"""
+    
+    def test_thumbnail_and_full_size_are_distinct_variants(self):
+        """Testa que thumbnail e tamanho normal não compartilham a entrada de cache"""
+        img = Image.new('RGB', (1200, 900), color='red')
+        buffer = io.BytesIO()
+        img.save(buffer, format='JPEG')
+        image_data = buffer.getvalue()
+        
+        optimizer = ImageOptimizer(redis_client=DictRedis(), config={'thumbnail_size': (400, 400)})
+        with patch.object(ImageOptimizer, '_fetch_image', return_value=fetched_image(image_data)) as mock_fetch:
+            full = optimizer.optimize_image_from_url('https://example.com/a.jpg')
+            thumb = optimizer.optimize_image_from_url('https://example.com/a.jpg', {'is_thumbnail': True})
+            small = optimizer.optimize_image_from_url('https://example.com/a.jpg', {'max_width': 800})
+        
+        assert mock_fetch.call_count == 3
+        assert not thumb['from_cache'] and not small['from_cache']
+        assert tuple(full['metadata']['new_size']) == (1200, 900)
+        assert tuple(thumb['metadata']['new_size']) == (400, 300)
+        assert tuple(small['metadata']['new_size']) == (800, 600)
+
+    def test_same_bytes_under_different_urls_share_one_encode(self, sample_image_data):
+        """Testa que URLs com o mesmo conteúdo reutilizam a mesma variante"""
+        optimizer = ImageOptimizer(redis_client=DictRedis())
+        with patch.object(ImageOptimizer, '_fetch_image', return_value=fetched_image(sample_image_data)):
+            first = optimizer.optimize_image_from_url('https://cdn1.example.com/a.jpg')
+            with patch.object(ImageOptimizer, '_optimize_image', side_effect=AssertionError('sem reencode')):
+                mirror = optimizer.optimize_image_from_url('https://cdn2.example.com/a.jpg')
+        
+        assert mirror['cache_type'] == 'hash_match'
+        assert mirror['original_url'] == 'https://cdn2.example.com/a.jpg'
+        assert mirror['content_hash'] == first['content_hash']
+
+    def test_requested_quality_is_applied(self, sample_image_data):
+        """Testa que a qualidade solicitada faz parte da especificação e do resultado"""
+        optimizer = ImageOptimizer()
+        with patch.object(ImageOptimizer, '_fetch_image', return_value=fetched_image(sample_image_data)):
+            low = optimizer.optimize_image_from_url('https://example.com/q.jpg', {'format': 'JPEG', 'quality': 20})
+            high = optimizer.optimize_image_from_url('https://example.com/q.jpg', {'format': 'JPEG', 'quality': 95})
+        
+        assert low['spec']['quality'] == 20 and high['spec']['quality'] == 95
+        assert low['metadata']['optimized_bytes'] < high['metadata']['optimized_bytes']
+
+
+class TestResizeEngine:
+    """Testes do redimensionamento em etapas"""
+    
+    def test_modes_reduce_before_resampling(self):
+        """Testa que balanced/fast usam redução inteira e quality não"""
+        from utils import resize_image
+        
+        img = Image.new('RGB', (4000, 3000), color='green')
+        with patch.object(Image.Image, 'reduce', autospec=True, side_effect=Image.Image.reduce) as mock_reduce:
+            assert resize_image(img, (400, 300), 'quality').size == (400, 300)
+            assert mock_reduce.call_count == 0
+            assert resize_image(img, (400, 300), 'balanced').size == (400, 300)
+            assert resize_image(img, (400, 300), 'fast').size == (400, 300)
+            assert mock_reduce.call_count == 2
+        
+        with pytest.raises(ValueError):
+            resize_image(img, (400, 300), 'turbo')
+    
+    def test_optimizer_uses_configured_mode(self, sample_image_data):
+        """Testa que o caminho de otimização usa o modo configurado"""
+        optimizer = ImageOptimizer(config={'resize_mode': 'fast', 'max_width': 300, 'max_height': 300})
+        with patch('image_optimizer.resize_image', wraps=__import__('utils').resize_image) as mock_resize:
+            _, metadata = optimizer._optimize_image(sample_image_data)
+        
+        assert tuple(metadata['new_size']) == (300, 225)
+        assert mock_resize.call_args[0][2] == 'fast'
+
+
+class TestEncoderEffort:
+    """Testes dos perfis de esforço do codificador"""
+    
+    def test_save_kwargs_follow_effort_profile(self):
+        """Testa os parâmetros do codificador por perfil"""
+        optimizer = ImageOptimizer()
+        
+        assert optimizer._get_save_kwargs('WEBP', effort='fast')['method'] == 2
+        assert optimizer._get_save_kwargs('WEBP')['method'] == 6  # padrão: batch_effort (max)
+        assert optimizer._get_save_kwargs('AVIF', effort='balanced')['speed'] == 7
+        with pytest.raises(ValueError):
+            optimizer._get_save_kwargs('WEBP', effort='extreme')
+    
+    def test_higher_effort_replaces_cached_lower_effort(self, sample_image_data):
+        """Testa que um pedido de esforço maior substitui a variante em cache"""
+        optimizer = ImageOptimizer(redis_client=DictRedis())
+        url = 'https://example.com/effort.jpg'
+        with patch.object(ImageOptimizer, '_fetch_image', return_value=fetched_image(sample_image_data)):
+            fast = optimizer.optimize_image_from_url(url, {'effort': 'fast'})
+            fast_again = optimizer.optimize_image_from_url(url, {'effort': 'fast'})
+            best = optimizer.optimize_image_from_url(url, {'effort': 'max'})
+            fast_after = optimizer.optimize_image_from_url(url, {'effort': 'fast'})
+        
+        assert fast['effort'] == 'fast' and not fast['from_cache']
+        assert fast_again['from_cache']
+        assert best['effort'] == 'max' and not best['from_cache']
+        assert fast_after['from_cache'] and fast_after['effort'] == 'max'
+    
+    def test_batch_defaults_to_batch_effort(self, sample_image_data):
+        """Testa o padrão de esforço por ponto de entrada"""
+        optimizer = ImageOptimizer(config={'interactive_effort': 'fast', 'batch_effort': 'max',
+                                           'batch_process_workers': 0})
+        with patch.object(ImageOptimizer, '_fetch_image', return_value=fetched_image(sample_image_data)):
+            single = optimizer.optimize_image_from_url('https://example.com/one.jpg')
+            batch = optimizer.batch_optimize_images(['https://example.com/two.jpg'])
+        
+        assert single['effort'] == 'fast'
+        assert batch['results'][0]['effort'] == 'max'
+
+
+class TestQualitySearch:
+    """Testes da busca de qualidade por SSIM / tamanho"""
+    
+    @staticmethod
+    def _noisy_image():
+        return Image.merge('RGB', [Image.effect_noise((320, 240), sigma) for sigma in (40, 60, 80)])
+    
+    @staticmethod
+    def _encoder(img):
+        def encode(quality):
+            buffer = io.BytesIO()
+            img.save(buffer, format='WEBP', quality=quality, method=2)
+            return buffer.getvalue()
+        return encode
+    
+    def test_vectorized_ssim(self):
+        """Testa SSIM = 1 para imagens idênticas e menor com ruído"""
+        from quality_search import ssim, luma_plane
+        
+        img = self._noisy_image()
+        reference = luma_plane(img)
+        blurred = luma_plane(img.resize((80, 60)).resize(img.size))
+        
+        assert ssim(reference, reference) == pytest.approx(1.0)
+        assert ssim(reference, blurred) < 0.9
+    
+    def test_target_ssim_and_max_bytes(self):
+        """Testa a busca pela menor qualidade com o SSIM alvo e pelo limite de bytes"""
+        from quality_search import search_quality
+        
+        img = self._noisy_image()
+        by_ssim = search_quality(img, self._encoder(img), target_ssim=0.8)
+        assert by_ssim['ssim'] >= 0.8
+        assert by_ssim['content_class'] == 'photo'
+        assert by_ssim['probes'] <= 7
+        
+        limit = len(self._encoder(img)(70))
+        by_size = search_quality(img, self._encoder(img), max_bytes=limit)
+        assert by_size['bytes'] <= limit
+        assert by_size['quality'] >= 70
+    
+    def test_target_ssim_replaces_quality_in_spec(self, sample_image_data):
+        """Testa que o alvo entra na especificação e a qualidade escolhida nos metadados"""
+        optimizer = ImageOptimizer(redis_client=DictRedis())
+        spec = optimizer._get_transform_spec({'format': 'WEBP', 'target_ssim': 0.95})
+        assert spec['target_ssim'] == 0.95 and 'quality' not in spec
+        
+        with patch.object(ImageOptimizer, '_fetch_image', return_value=fetched_image(sample_image_data)):
+            result = optimizer.optimize_image_from_url('https://example.com/ssim.jpg', {'target_ssim': 0.95})
+        
+        assert result['success']
+        assert result['metadata']['quality_search']['ssim'] >= 0.95
+        assert result['metadata']['quality_search']['content_class'] == 'graphic'
+
+
+class TestVariantMatrix:
+    """Testes da matriz de variantes (tamanhos x formatos)"""
+    
+    def test_matrix_decodes_once_and_builds_srcset(self):
+        """Testa uma decodificação para todas as variantes e o manifesto srcset"""
+        img = Image.new('RGB', (1200, 900), color='blue')
+        buffer = io.BytesIO()
+        img.save(buffer, format='JPEG')
+        
+        optimizer = ImageOptimizer(redis_client=DictRedis())
+        with patch.object(ImageOptimizer, '_fetch_image', return_value=fetched_image(buffer.getvalue())) as mock_fetch, \
+             patch('image_optimizer.Image.open', wraps=Image.open) as mock_open:
+            manifest = optimizer.optimize_variants_from_url(
+                'https://example.com/card.jpg', {'widths': [320, 800, 1920], 'formats': ['webp', 'jpeg']})
+            cached = optimizer.optimize_variants_from_url(
+                'https://example.com/card.jpg', {'widths': [1920, 800, 320], 'formats': ['WEBP', 'JPEG']})
+        
+        assert manifest['success']
+        assert mock_fetch.call_count == 1
+        assert mock_open.call_count == 1
+        assert len(manifest['variants']) == 6  # 1920 é limitado ao original (1200)
+        assert [v['width'] for v in manifest['variants'] if v['format'] == 'WEBP'] == [1200, 800, 320]
+        assert manifest['srcset']['webp'].endswith('1200w') and '320w' in manifest['srcset']['webp']
+        assert manifest['src'].endswith('.jpeg')
+        for variant in manifest['variants']:
+            assert optimizer.get_optimized_bytes(variant['content_hash']) is not None
+        assert cached['from_cache'] and cached['variants'] == manifest['variants']
+    
+    def test_variants_endpoint_validates_widths(self, client):
+        """Testa validação do endpoint /variants"""
+        response = client.post('/variants', json={'image_url': 'https://example.com/a.jpg', 'widths': [0]})
+        assert response.status_code == 400
+        
+        response = client.post('/variants', json={'image_url': 'https://example.com/a.jpg', 'formats': ['GIF']})
+        assert response.status_code == 400
+
+
+class TestRedisMaintenance:
+    """Testes de estatísticas e limpeza do cache sem KEYS"""
+    
+    def test_cache_stats_come_from_counters(self, sample_image_data):
+        """Testa que /cache-stats usa contadores agregados atualizados nas escritas"""
+        redis_client = DictRedis()
+        optimizer = ImageOptimizer(redis_client=redis_client, config={'memory_cache_bytes': 0})
+        with patch.object(ImageOptimizer, '_fetch_image', return_value=fetched_image(sample_image_data)):
+            optimizer.optimize_image_from_url('https://example.com/a.jpg')
+            optimizer.optimize_image_from_url('https://example.com/a.jpg')
+        
+        stats = optimizer.get_cache_stats()
+        assert stats['total_keys'] == 3  # índice da URL, variante e binário
+        assert stats['estimated_size_mb'] >= 0
+        assert stats['hits'] == 3 and stats['misses'] == 2
+        assert 'memory_sample' not in stats
+        
+        sampled = optimizer.get_cache_stats(sample_size=2)['memory_sample']
+        assert sampled['sampled_keys'] == 2
+
+    def test_clear_cache_scans_and_unlinks_in_batches(self):
+        """Testa a limpeza incremental em lotes"""
+        redis_client = DictRedis()
+        for i in range(25):
+            redis_client.setex(f'img_data:{i}', 60, b'x')
+        redis_client.setex('other:key', 60, b'x')
+        
+        optimizer = ImageOptimizer(redis_client=redis_client, config={'scan_batch_size': 10})
+        optimizer._record_redis_stat('entries', 25)
+        result = optimizer.clear_cache()
+        
+        assert result['deleted_keys'] == 25
+        assert redis_client.commands['unlink'] == 4  # 3 lotes + hash de contadores (reset)
+        assert list(redis_client.store) == ['other:key']
+        assert optimizer.get_cache_stats()['total_keys'] == 0
+    
+    def test_partial_clear_resyncs_counters(self, sample_image_data):
+        """Testa que uma limpeza parcial recalcula entradas e bytes com SCAN"""
+        redis_client = DictRedis()
+        optimizer = ImageOptimizer(redis_client=redis_client, config={'memory_cache_bytes': 0})
+        with patch.object(ImageOptimizer, '_fetch_image', return_value=fetched_image(sample_image_data)):
+            optimizer.optimize_image_from_url('https://example.com/a.jpg', {'effort': 'fast'})
+            # Recodificação com mais esforço sobrescreve a variante (contada de novo)
+            optimizer.optimize_image_from_url('https://example.com/a.jpg', {'effort': 'max'})
+        
+        optimizer.clear_cache('img_url:*')
+        
+        remaining = [key for key in redis_client.store if key.startswith('img_')]
+        counters = optimizer.redis_stats.read()
+        assert counters['entries'] == len(remaining)
+        assert counters['bytes'] == sum(len(redis_client.store[key]) for key in remaining)
+
+
+class TestMemoryCacheTier:
+    """Testes da camada de cache em processo"""
+    
+    def test_lru_respects_byte_budget(self):
+        """Testa a remoção dos itens menos usados ao exceder o orçamento"""
+        from cache import MemoryLRUCache
+        
+        cache = MemoryLRUCache(max_bytes=300, ttl=60)
+        cache.set('a', b'x' * 99)
+        cache.set('b', b'x' * 99)
+        cache.set('c', b'x' * 99)
+        assert cache.get('a') is not None  # 'a' passa a ser o mais recente
+        
+        cache.set('d', b'x' * 99)
+        assert cache.get('b') is None
+        assert cache.get('a') is not None
+        assert cache.stats()['bytes'] <= 300
+        assert cache.stats()['evictions'] == 1
+
+    def test_entries_expire(self):
+        """Testa a expiração por TTL"""
+        from cache import MemoryLRUCache
+        
+        cache = MemoryLRUCache(max_bytes=1024, ttl=60)
+        cache.set('k', b'value', ttl=0)
+        assert cache.get('k') is None
+        assert cache.stats()['entries'] == 0
+
+    def test_read_through_populates_memory(self, sample_image_data):
+        """Testa que um hit no Redis popula a memória e o próximo hit não sai do processo"""
+        redis_client = DictRedis()
+        writer = ImageOptimizer(redis_client=redis_client)
+        with patch.object(ImageOptimizer, '_fetch_image', return_value=fetched_image(sample_image_data)):
+            writer.optimize_image_from_url('https://example.com/hot.jpg')
+        
+        reader = ImageOptimizer(redis_client=redis_client)
+        reader.optimize_image_from_url('https://example.com/hot.jpg')
+        redis_client.gets.clear()
+        result = reader.optimize_image_from_url('https://example.com/hot.jpg')
+        
+        assert result['from_cache']
+        assert redis_client.gets == []
+        counters = reader.get_cache_stats()['tiers']['counters']
+        assert counters['redis']['hits'] == 3  # índice da URL + variante + binário
+        assert counters['memory']['hits'] == 3
+
+
+class TestDiskContentStore:
+    """Testes do cache em disco endereçado por conteúdo"""
+
+    def test_put_get_roundtrip_via_mmap(self, tmp_path):
+        """Testa escrita atômica (sem temporários) e leitura por mmap"""
+        from disk_store import DiskContentStore
+
+        store = DiskContentStore(str(tmp_path), max_bytes=1024)
+        assert store.put('img_data:abc', b'conteudo')
+
+        value = store.get('img_data:abc')
+        assert isinstance(value, memoryview)
+        assert value == b'conteudo'
+        assert store.get('img_data:missing') is None
+        files = [f.name for f in tmp_path.rglob('*') if f.is_file()]
+        assert files == ['img_data%3Aabc']
+
+    def test_evicts_lru_and_rebuilds_index(self, tmp_path):
+        """Testa remoção LRU pelo orçamento e reconstrução do índice após reinício"""
+        from disk_store import DiskContentStore
+
+        store = DiskContentStore(str(tmp_path), max_bytes=300)
+        store.put('a', b'x' * 100)
+        store.put('b', b'x' * 100)
+        store.put('c', b'x' * 100)
+        assert store.get('a') is not None  # 'a' passa a ser o mais recente
+        store.put('d', b'x' * 100)
+
+        assert store.get('b') is None
+        assert store.stats()['evictions'] == 1
+
+        reopened = DiskContentStore(str(tmp_path), max_bytes=300)
+        assert reopened.stats()['entries'] == 3
+        assert reopened.stats()['bytes'] == 300
+        assert reopened.get('a') == b'x' * 100
+
+    def test_variant_survives_redis_expiry(self, tmp_path, sample_image_data):
+        """Testa que, sem as chaves no Redis, a variante em disco evita nova codificação"""
+        config = {'disk_cache_dir': str(tmp_path), 'memory_cache_bytes': 0}
+        with patch.object(ImageOptimizer, '_fetch_image', return_value=fetched_image(sample_image_data)):
+            first = ImageOptimizer(redis_client=DictRedis(), config=config).optimize_image_from_url(
+                'https://example.com/disk.jpg', {'return_base64': False})
+
+            optimizer = ImageOptimizer(redis_client=DictRedis(), config=config)
+            with patch.object(ImageOptimizer, '_run_optimize', side_effect=AssertionError('re-encode')):
+                result = optimizer.optimize_image_from_url('https://example.com/disk.jpg', {'return_base64': True})
+
+        assert result['success']
+        assert result['cache_type'] == 'hash_match'
+        assert result['content_hash'] == first['content_hash']
+        assert optimizer.get_optimized_path(first['content_hash']).startswith(str(tmp_path))
+        assert optimizer.get_cache_stats()['tiers']['counters']['disk']['hits'] >= 2
+
+
+    def test_effort_upgrade_replaces_variant_on_disk(self, tmp_path, sample_image_data):
+        """Testa que a variante recodificada com mais esforço substitui a do disco"""
+        optimizer = ImageOptimizer(redis_client=DictRedis(), config={
+            'disk_cache_dir': str(tmp_path), 'memory_cache_bytes': 0
+        })
+        url = 'https://example.com/upgrade.jpg'
+        
+        with patch.object(ImageOptimizer, '_fetch_image',
+                          return_value=fetched_image(sample_image_data)) as mock_fetch:
+            optimizer.optimize_image_from_url(url, {'effort': 'balanced', 'return_base64': False})
+            results = [optimizer.optimize_image_from_url(url, {'effort': 'max', 'return_base64': False})
+                       for _ in range(3)]
+        
+        assert mock_fetch.call_count == 2
+        assert [result['from_cache'] for result in results] == [False, True, True]
+        assert all(result['effort'] == 'max' for result in results)
+        
+        index = optimizer._get_from_cache(optimizer._get_url_index_key(url))
+        spec = optimizer._get_transform_spec({'format': 'WEBP', 'is_thumbnail': False})
+        variant_key = optimizer._get_variant_key(index['original_hash'], spec)
+        assert json.loads(bytes(optimizer.disk_store.get(variant_key)))['effort'] == 'max'
+    
+    def test_replace_updates_byte_accounting(self, tmp_path):
+        """Testa put com replace sobre uma chave existente"""
+        from disk_store import DiskContentStore
+        
+        store = DiskContentStore(str(tmp_path), max_bytes=1000)
+        store.put('k', b'a' * 100)
+        store.put('k', b'b' * 10)
+        assert store.get('k') == b'a' * 100
+        
+        store.put('k', b'c' * 40, replace=True)
+        assert store.get('k') == b'c' * 40
+        assert store.stats() == {**store.stats(), 'entries': 1, 'bytes': 40}
+
+class TestNegativeCache:
+    """Testes do cache negativo de falhas de download"""
+    
+    @staticmethod
+    def _http_error(status):
+        import requests
+        return requests.exceptions.HTTPError(f"{status} Client Error", response=Mock(status_code=status))
+    
+    def test_dead_url_is_not_downloaded_again(self):
+        """Testa que um 404 é respondido do cache até o TTL da classe"""
+        redis_client = DictRedis()
+        optimizer = ImageOptimizer(redis_client=redis_client, config={'negative_cache_ttls': {'not_found': 600}})
+        url = 'https://example.com/dead.jpg'
+        
+        with patch.object(ImageOptimizer, '_fetch_image', side_effect=self._http_error(404)) as mock_fetch:
+            first = optimizer.optimize_image_from_url(url)
+            second = optimizer.optimize_image_from_url(url)
+        
+        assert mock_fetch.call_count == 1
+        assert first['error_class'] == 'not_found' and first['retry_after'] == 600
+        assert not first['from_cache']
+        assert second['negative_cache'] and second['from_cache']
+        assert 0 < second['retry_after'] <= 600
+        assert 0 < redis_client.ttl(optimizer._get_negative_key(url)) <= 600
+        assert optimizer.metrics.requests.value(outcome='negative_cache') == 1
+    
+    def test_cached_variant_survives_failed_fetch_for_other_spec(self, sample_image_data):
+        """Testa que a falha de um formato não apaga o índice nem as variantes já em cache"""
+        import requests
+        
+        optimizer = ImageOptimizer(redis_client=DictRedis())
+        url = 'https://example.com/a.jpg'
+        with patch.object(ImageOptimizer, '_fetch_image', return_value=fetched_image(sample_image_data)):
+            optimizer.optimize_image_from_url(url, {'format': 'WEBP'})
+        index = optimizer._get_from_cache(optimizer._get_url_index_key(url))
+        
+        with patch.object(ImageOptimizer, '_fetch_image', side_effect=requests.exceptions.ReadTimeout('lento')) as mock_fetch:
+            failed = optimizer.optimize_image_from_url(url, {'format': 'JPEG'})
+            webp = optimizer.optimize_image_from_url(url, {'format': 'WEBP'})
+            jpeg = optimizer.optimize_image_from_url(url, {'format': 'JPEG'})
+        
+        assert failed['error_class'] == 'timeout'
+        assert webp['success'] and webp['from_cache'] and 'negative_cache' not in webp
+        assert jpeg['negative_cache'] and jpeg['error_class'] == 'timeout'
+        assert mock_fetch.call_count == 1
+        assert optimizer._get_from_cache(optimizer._get_url_index_key(url))['cached_keys'] == index['cached_keys']
+    
+    def test_transient_errors_are_not_cached(self):
+        """Testa que erros de conexão e 5xx tentam de novo"""
+        import requests
+        
+        optimizer = ImageOptimizer()
+        errors = [requests.exceptions.ConnectionError('recusada'), self._http_error(503)]
+        with patch.object(ImageOptimizer, '_fetch_image', side_effect=errors) as mock_fetch:
+            first = optimizer.optimize_image_from_url('https://example.com/flaky.jpg')
+            second = optimizer.optimize_image_from_url('https://example.com/flaky.jpg')
+        
+        assert mock_fetch.call_count == 2
+        assert 'error_class' not in first and 'error_class' not in second
+    
+    @pytest.mark.parametrize('error, error_class', [
+        ('timeout', 'timeout'),
+        ('not_image', 'not_image'),
+        ('too_large', 'too_large')
+    ])
+    def test_error_classes(self, error, error_class):
+        """Testa a classificação de timeouts, content-types e tamanhos"""
+        import requests
+        from image_optimizer import ImageFetchError
+        
+        exception = requests.exceptions.ReadTimeout('lento') if error == 'timeout' else \
+            ImageFetchError('falhou', error)
+        assert ImageOptimizer._classify_fetch_error(exception) == error_class
+    
+    def test_endpoint_sends_retry_after(self, client):
+        """Testa o cabeçalho Retry-After nas falhas cacheadas"""
+        from image_optimizer import ImageFetchError
+        
+        body = {'image_url': 'https://example.com/huge.jpg'}
+        with patch.object(ImageOptimizer, '_fetch_image',
+                          side_effect=ImageFetchError('Arquivo muito grande', 'too_large')) as mock_fetch:
+            client.post('/optimize-image', json=body)
+            response = client.post('/optimize-image', json=body)
+        
+        assert mock_fetch.call_count == 1
+        assert response.status_code == 400
+        assert int(response.headers['Retry-After']) > 0
+        assert json.loads(response.data)['negative_cache'] is True
+
+class TestOriginRevalidation:
+    """Testes da revalidação condicional (ETag/Last-Modified) de entradas vencidas"""
+    
+    @staticmethod
+    def _optimizer(redis_client):
+        # max-age=0 da origem com piso 0: o índice vence logo após a gravação;
+        # sem stale-while-revalidate a revalidação acontece na própria requisição
+        return ImageOptimizer(redis_client=redis_client, config={
+            'min_fresh_ttl': 0, 'memory_cache_bytes': 0, 'stale_while_revalidate': 0
+        })
+    
+    def test_not_modified_extends_variants_without_encoding(self, conditional_origin):
+        """Testa que um 304 renova o cache sem decodificar nem codificar"""
+        redis_client = DictRedis()
+        optimizer = self._optimizer(redis_client)
+        
+        first = optimizer.optimize_image_from_url(conditional_origin['url'])
+        index = optimizer._get_from_cache(optimizer._get_url_index_key(conditional_origin['url']))
+        assert index['etag'] == '"v1"' and index['last_modified']
+        assert optimizer._get_data_key(first['content_hash']) in index['cached_keys']
+        
+        for key in index['cached_keys']:
+            redis_client.expire(key, 10)
+        
+        with patch.object(ImageOptimizer, '_run_optimize') as mock_optimize:
+            second = optimizer.optimize_image_from_url(conditional_origin['url'])
+        
+        mock_optimize.assert_not_called()
+        assert second['success'] and second['from_cache']
+        assert second['content_hash'] == first['content_hash']
+        assert conditional_origin['not_modified'] == 1
+        assert optimizer.metrics.revalidations.value(result='not_modified') == 1
+        assert all(redis_client.ttl(key) > 10 for key in index['cached_keys'])
+    
+    def test_same_bytes_keep_indexed_variants(self, conditional_origin):
+        """Testa que um 200 com os mesmos bytes mantém as chaves das demais variantes no índice"""
+        redis_client = DictRedis()
+        optimizer = self._optimizer(redis_client)
+        url = conditional_origin['url']
+        optimizer.optimize_image_from_url(url, {'format': 'WEBP'})
+        optimizer.optimize_image_from_url(url, {'format': 'JPEG'})
+        index = optimizer._get_from_cache(optimizer._get_url_index_key(url))
+        not_modified = conditional_origin['not_modified']
+        
+        # ETag novo para o mesmo conteúdo: a origem responde 200 com os mesmos bytes
+        conditional_origin['etag'] = '"v2"'
+        with patch.object(ImageOptimizer, '_run_optimize') as mock_optimize:
+            optimizer.optimize_image_from_url(url, {'format': 'WEBP'})
+            rebuilt = optimizer._get_from_cache(optimizer._get_url_index_key(url))
+            for key in index['cached_keys']:
+                redis_client.expire(key, 10)
+            jpeg = optimizer.optimize_image_from_url(url, {'format': 'JPEG'})
+        
+        mock_optimize.assert_not_called()
+        assert rebuilt['etag'] == '"v2"'
+        assert set(index['cached_keys']) <= set(rebuilt['cached_keys'])
+        assert jpeg['from_cache'] and conditional_origin['not_modified'] == not_modified + 1
+        assert all(redis_client.ttl(key) > 10 for key in index['cached_keys'])
+    
+    def test_index_expires_with_storage_ttl(self, conditional_origin):
+        """Testa que expires_at acompanha o TTL do Redis, e não o frescor"""
+        redis_client = DictRedis()
+        optimizer = self._optimizer(redis_client)
+        optimizer.optimize_image_from_url(conditional_origin['url'])
+        index_key = optimizer._get_url_index_key(conditional_origin['url'])
+        index = optimizer._get_from_cache(index_key)
+        
+        remaining = (datetime.fromisoformat(index['expires_at']) - datetime.utcnow()).total_seconds()
+        assert abs(remaining - redis_client.ttl(index_key)) <= 2
+        assert datetime.fromisoformat(index['fresh_until']) < datetime.fromisoformat(index['expires_at'])
+    
+    def test_changed_image_is_downloaded_again(self, conditional_origin, sample_image_data):
+        """Testa que um ETag diferente traz a nova imagem"""
+        optimizer = self._optimizer(DictRedis())
+        first = optimizer.optimize_image_from_url(conditional_origin['url'])
+        
+        new_image = Image.new('RGB', (400, 300), color='blue')
+        buffer = io.BytesIO()
+        new_image.save(buffer, format='JPEG')
+        conditional_origin.update(etag='"v2"', body=buffer.getvalue())
+        
+        second = optimizer.optimize_image_from_url(conditional_origin['url'])
+        
+        assert conditional_origin['conditional'] == 1 and conditional_origin['not_modified'] == 0
+        assert second['success'] and not second['from_cache']
+        assert second['original_hash'] != first['original_hash']
+        assert optimizer.metrics.revalidations.value(result='modified') == 1
+    
+    def test_transient_origin_failure_serves_expired_entry(self, conditional_origin):
+        """Testa que uma falha transitória na revalidação usa o cache vencido"""
+        optimizer = self._optimizer(DictRedis())
+        first = optimizer.optimize_image_from_url(conditional_origin['url'])
+        
+        conditional_origin['fail'] = True
+        second = optimizer.optimize_image_from_url(conditional_origin['url'])
+        
+        assert second['success'] and second['from_cache']
+        assert second['content_hash'] == first['content_hash']
+        assert optimizer.metrics.revalidations.value(result='error') == 1
+    
+    def test_timeout_keeps_index_and_validators(self, conditional_origin):
+        """Testa que um timeout na revalidação não troca o índice pelo cache negativo"""
+        redis_client = DictRedis()
+        optimizer = ImageOptimizer(redis_client=redis_client, config={
+            'min_fresh_ttl': 0, 'memory_cache_bytes': 0, 'stale_while_revalidate': 0, 'timeout': 0.2
+        })
+        first = optimizer.optimize_image_from_url(conditional_origin['url'])
+        
+        conditional_origin['delay'] = 0.5
+        during = optimizer.optimize_image_from_url(conditional_origin['url'])
+        conditional_origin['delay'] = 0
+        after = optimizer.optimize_image_from_url(conditional_origin['url'])
+        
+        assert during['success'] and during['content_hash'] == first['content_hash']
+        assert 'error_class' not in during
+        assert after['success'] and after['from_cache']
+        assert conditional_origin['not_modified'] == 1
+        index = optimizer._get_from_cache(optimizer._get_url_index_key(conditional_origin['url']))
+        assert index['etag'] == '"v1"' and index['cached_keys']
+    
+    def test_not_found_replaces_index(self, conditional_origin):
+        """Testa que um 404 definitivo na revalidação vai para o cache negativo"""
+        optimizer = self._optimizer(DictRedis())
+        optimizer.optimize_image_from_url(conditional_origin['url'])
+        
+        conditional_origin['status'] = 404
+        removed = optimizer.optimize_image_from_url(conditional_origin['url'])
+        cached = optimizer.optimize_image_from_url(conditional_origin['url'])
+        
+        assert removed['error_class'] == 'not_found'
+        assert cached['negative_cache']
+    
+    @pytest.mark.parametrize('cache_control, expected', [
+        (None, 86400),
+        ('public, max-age=3600', 3600),
+        ('max-age=60', 300),
+        ('max-age=31536000', 86400),
+        ('s-maxage=7200, max-age=60', 7200),
+        ('no-cache', 300)
+    ])
+    def test_freshness_from_cache_control(self, cache_control, expected):
+        """Testa o tempo de validade derivado do Cache-Control da origem"""
+        optimizer = ImageOptimizer(config={'cache_ttl': 86400, 'min_fresh_ttl': 300})
+        assert optimizer._get_freshness_ttl(cache_control) == expected
+
+class TestStaleWhileRevalidate:
+    """Testes do serviço de entradas vencidas com renovação em segundo plano"""
+    
+    def test_stale_entry_served_without_origin_fetch(self, conditional_origin):
+        """Testa que a entrada vencida volta na hora e é renovada uma única vez"""
+        optimizer = ImageOptimizer(redis_client=DictRedis(), config={'min_fresh_ttl': 0, 'memory_cache_bytes': 0})
+        first = optimizer.optimize_image_from_url(conditional_origin['url'])
+        
+        # Origem lenta: as requisições não podem esperar por ela
+        conditional_origin['gate'].clear()
+        with patch.object(optimizer, '_schedule_refresh', wraps=optimizer._schedule_refresh) as mock_schedule:
+            stale = [optimizer.optimize_image_from_url(conditional_origin['url']) for _ in range(3)]
+        conditional_origin['gate'].set()
+        optimizer.close()
+        
+        assert all(result['stale'] and result['from_cache'] for result in stale)
+        assert all(result['content_hash'] == first['content_hash'] for result in stale)
+        assert [call.args[0] for call in mock_schedule.call_args_list] == [conditional_origin['url']] * 3
+        assert conditional_origin['conditional'] == 1 and conditional_origin['not_modified'] == 1
+        assert optimizer.metrics.requests.value(outcome='stale') == 3
+        assert not optimizer._refreshing
+    
+    def test_refresh_replaces_changed_image(self, conditional_origin):
+        """Testa que a renovação em segundo plano regenera a variante de uma imagem alterada"""
+        optimizer = ImageOptimizer(redis_client=DictRedis(), config={'min_fresh_ttl': 0, 'memory_cache_bytes': 0})
+        first = optimizer.optimize_image_from_url(conditional_origin['url'])
+        
+        new_image = Image.new('RGB', (400, 300), color='blue')
+        buffer = io.BytesIO()
+        new_image.save(buffer, format='JPEG')
+        conditional_origin.update(etag='"v2"', body=buffer.getvalue())
+        
+        stale = optimizer.optimize_image_from_url(conditional_origin['url'])
+        optimizer.close()
+        refreshed = optimizer.optimize_image_from_url(conditional_origin['url'])
+        
+        assert stale['stale'] and stale['content_hash'] == first['content_hash']
+        assert refreshed['content_hash'] != first['content_hash']
+        assert list(refreshed['metadata']['original_size']) == [400, 300]
+    
+    def test_refresh_timeout_keeps_serving_cached_image(self, conditional_origin):
+        """Testa que um timeout na renovação em segundo plano mantém a entrada stale"""
+        optimizer = ImageOptimizer(redis_client=DictRedis(), config={
+            'min_fresh_ttl': 0, 'memory_cache_bytes': 0, 'timeout': 0.2
+        })
+        first = optimizer.optimize_image_from_url(conditional_origin['url'])
+        
+        conditional_origin['delay'] = 0.5
+        stale = optimizer.optimize_image_from_url(conditional_origin['url'])
+        while optimizer._refreshing:
+            time.sleep(0.01)
+        conditional_origin['delay'] = 0
+        after = optimizer.optimize_image_from_url(conditional_origin['url'])
+        optimizer.close()
+        
+        assert stale['stale'] and after['success'] and after['from_cache']
+        assert after['content_hash'] == first['content_hash']
+        assert 'error_class' not in after
+        assert optimizer.metrics.revalidations.value(result='error') == 1
+    
+    def test_refresh_not_found_replaces_entry(self, conditional_origin):
+        """Testa que um 404 na renovação em segundo plano vai para o cache negativo"""
+        optimizer = ImageOptimizer(redis_client=DictRedis(), config={'min_fresh_ttl': 0, 'memory_cache_bytes': 0})
+        optimizer.optimize_image_from_url(conditional_origin['url'])
+        
+        conditional_origin['status'] = 410
+        stale = optimizer.optimize_image_from_url(conditional_origin['url'])
+        optimizer.close()
+        removed = optimizer.optimize_image_from_url(conditional_origin['url'])
+        
+        assert stale['stale'] and stale['success']
+        assert removed['negative_cache'] and removed['error_class'] == 'not_found'
+        assert optimizer.metrics.background_refreshes.value(result='error') == 1
+    
+    def test_stale_window(self):
+        """Testa os limites entre fresco, stale e vencido"""
+        optimizer = ImageOptimizer(config={'stale_while_revalidate': 600})
+        now = datetime.utcnow()
+        
+        def index(seconds_ago):
+            return {'original_hash': 'abc', 'fresh_until': (now - timedelta(seconds=seconds_ago)).isoformat()}
+        
+        assert not optimizer._is_servable_stale(index(-60))
+        assert optimizer._is_servable_stale(index(60))
+        assert not optimizer._is_servable_stale(index(900))
+        assert not optimizer._is_servable_stale({'original_hash': 'abc'})
+
+class TestRequestCoalescing:
+    """Testes da coalescência de otimizações idênticas em andamento"""
+    
+    def test_concurrent_identical_requests_download_once(self, sample_image_data):
+        """Testa que requisições simultâneas para a mesma URL compartilham o trabalho"""
+        import time
+        from concurrent.futures import ThreadPoolExecutor
+        
+        calls = []
+        
+        def slow_fetch(url):
+            calls.append(url)
+            time.sleep(0.3)
+            return fetched_image(sample_image_data)
+        
+        optimizer = ImageOptimizer()
+        with patch.object(ImageOptimizer, '_fetch_image', side_effect=slow_fetch):
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                options = [{'return_base64': i % 2 == 0} for i in range(8)]
+                results = list(executor.map(
+                    lambda opts: optimizer.optimize_image_from_url('https://example.com/viral.jpg', opts),
+                    options
+                ))
+        
+        assert len(calls) == 1
+        assert all(r['success'] for r in results)
+        assert sum(1 for r in results if r.get('coalesced')) == 7
+        assert 'optimized_base64' in results[0] and 'optimized_url' in results[1]
+        assert optimizer.get_cache_stats()['singleflight']['coalesced_requests'] == 7
+
+    def test_followers_receive_leader_error(self):
+        """Testa que a falha do líder é propagada às requisições coalescidas"""
+        import time
+        from cache import SingleFlight
+        
+        flight = SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+        errors = []
+        
+        def failing():
+            started.set()
+            release.wait()
+            raise ValueError('origem indisponível')
+        
+        def call():
+            try:
+                flight.do('key', failing)
+            except ValueError as e:
+                errors.append(str(e))
+        
+        leader = threading.Thread(target=call)
+        leader.start()
+        started.wait()
+        follower = threading.Thread(target=call)
+        follower.start()
+        while flight.stats()['coalesced_requests'] == 0:
+            time.sleep(0.01)
+        release.set()
+        leader.join()
+        follower.join()
+        
+        assert errors == ['origem indisponível', 'origem indisponível']
+        assert flight.stats()['in_flight'] == 0
+
+
+class TestBatchOptimization:
+    """Testes do motor de lote concorrente"""
+    
+    @staticmethod
+    def _images_by_url(urls):
+        images = {}
+        for i, url in enumerate(urls):
+            img = Image.new('RGB', (200 + i * 10, 100), color='blue')
+            buffer = io.BytesIO()
+            img.save(buffer, format='JPEG')
+            images[url] = fetched_image(buffer.getvalue())
+        return images
+
+    @pytest.mark.parametrize('process_workers', [0, 2])
+    def test_batch_preserves_input_order(self, process_workers):
+        """Testa que o lote retorna resultados na ordem de entrada"""
+        urls = [f'https://example.com/img{i}.jpg' for i in range(6)]
+        images = self._images_by_url(urls)
+        
+        optimizer = ImageOptimizer(config={
+            'batch_download_workers': 4,
+            'batch_process_workers': process_workers
+        })
+        try:
+            with patch.object(ImageOptimizer, '_fetch_image', side_effect=lambda url: images[url]):
+                summary = optimizer.batch_optimize_images(urls, {'format': 'WEBP'})
+        finally:
+            optimizer.close()
+        
+        assert summary['successful'] == len(urls)
+        assert [r['original_url'] for r in summary['results']] == urls
+        assert [r['metadata']['original_size'][0] for r in summary['results']] == [200 + i * 10 for i in range(6)]
+
+    def test_batch_isolates_failures(self):
+        """Testa que uma falha não interrompe o restante do lote"""
+        urls = ['https://example.com/ok.jpg', 'https://example.com/broken.jpg']
+        images = self._images_by_url(urls[:1])
+        
+        def fake_download(url):
+            if url not in images:
+                raise ValueError("URL não retorna uma imagem válida: text/html")
+            return images[url]
+        
+        optimizer = ImageOptimizer(config={'batch_process_workers': 0})
+        with patch.object(ImageOptimizer, '_fetch_image', side_effect=fake_download):
+            summary = optimizer.batch_optimize_images(urls)
+        
+        assert summary['successful'] == 1
+        assert summary['failed'] == 1
+        assert summary['results'][1]['success'] is False
+
+    def test_async_batch_downloads_and_dedupes(self, image_server):
+        """Testa o lote assíncrono com download real via aiohttp"""
+        pytest.importorskip('aiohttp')
+        import asyncio
+
+        urls = [f'{image_server}/a.jpg', f'{image_server}/b.jpg', f'{image_server}/a.jpg']
+        progress = []
+        optimizer = ImageOptimizer(config={'batch_process_workers': 0})
+        try:
+            summary = asyncio.run(optimizer.batch_optimize_images_async(
+                urls, {'return_base64': False}, max_concurrency=2,
+                progress_callback=lambda *args: progress.append(args)
+            ))
+            again = asyncio.run(optimizer.optimize_image_from_url_async(urls[1]))
+        finally:
+            optimizer.close()
+
+        assert summary['successful'] == 3
+        assert [r['original_url'] for r in summary['results']] == urls
+        assert progress[-1] == (2, 0, 2)
+        assert summary['results'][0]['effort'] == optimizer.batch_effort
+        assert again['from_cache'] is True
+
+    def test_async_download_failure(self):
+        """Testa que falhas de download viram resultados de erro"""
+        pytest.importorskip('aiohttp')
+        import asyncio
+
+        optimizer = ImageOptimizer(config={'batch_process_workers': 0, 'timeout': 2})
+        try:
+            summary = asyncio.run(optimizer.batch_optimize_images_async(['http://127.0.0.1:1/x.jpg']))
+        finally:
+            optimizer.close()
+
+        assert summary['failed'] == 1
+        assert summary['results'][0]['success'] is False
+
+
+class TestHTTPPool:
+    """Testes do pool de conexões HTTP e do cache de DNS"""
+    
+    def test_dns_cache_ttl(self):
+        """Testa que o cache de DNS respeita o TTL"""
+        from http_pool import DNSCache
+        
+        cache = DNSCache(ttl=300)
+        with patch('socket.getaddrinfo', return_value=[(2, 1, 6, '', ('10.0.0.1', 443))]) as mock_resolve:
+            assert cache.resolve('cdn.example.com', 443) == '10.0.0.1'
+            assert cache.resolve('cdn.example.com', 443) == '10.0.0.1'
+            assert mock_resolve.call_count == 1
+            
+            cache._entries[('cdn.example.com', 443)] = ('10.0.0.1', 0)  # Expirar
+            cache.resolve('cdn.example.com', 443)
+            assert mock_resolve.call_count == 2
+        
+        assert cache.resolve('127.0.0.1', 80) == '127.0.0.1'  # IPs não passam pelo cache
+        assert cache.stats()['hits'] == 1
+
+    def test_host_pool_matches_exact_host(self):
+        """Testa que o pool de um host não é usado por hosts com o mesmo prefixo"""
+        from http_pool import PooledHTTPClient
+        
+        client = PooledHTTPClient(host_pool_sizes={'example.com': 4})
+        try:
+            pinned = client._adapters['example.com']
+            assert client.session.get_adapter('https://example.com/a.jpg') is pinned
+            assert client.session.get_adapter('http://example.com/a.jpg') is pinned
+            assert client.session.get_adapter('https://example.com.evil.net/a.jpg') is client._adapters['*']
+        finally:
+            client.close()
+    
+    def test_connections_are_reused(self, image_server, sample_image_data):
+        """Testa keep-alive e cache de DNS em downloads repetidos"""
+        optimizer = ImageOptimizer()
+        try:
+            for _ in range(3):
+                data, _ = optimizer._download_image(f'{image_server}/photo.jpg')
+                assert data == sample_image_data
+            
+            stats = optimizer.get_http_stats()
+        finally:
+            optimizer.close()
+        
+        host_stats = next(iter(stats['hosts'].values()))
+        assert host_stats['connections_opened'] == 1
+        assert host_stats['requests'] == 3
+        assert stats['dns_cache']['misses'] == 1
+
+
 class TestFlaskEndpoints:
     """Testes dos endpoints Flask"""
     
@@ -204,6 +1340,7 @@ class TestFlaskEndpoints:
         assert data['status'] == 'healthy'
         assert 'redis_status' in data
         assert 'optimizer_config' in data
+        assert 'dns_cache' in data['http_pool']
 
     def test_cache_stats_endpoint(self, client):
         """Testa endpoint de estatísticas"""
@@ -221,6 +1358,419 @@ class TestFlaskEndpoints:
         data = json.loads(response.data)
         assert not data['success']
         assert 'available_endpoints' in data
+        
+        # Mesmos endpoints da página inicial
+        listed = {item for entry in json.loads(client.get('/').data)['endpoints'].values()
+                  for item in entry.split(', ')}
+        assert listed == set(data['available_endpoints'])
+
+
+class TestMetrics:
+    """Testes das métricas do Prometheus"""
+    
+    def test_registry_renders_prometheus_text(self):
+        """Testa o formato de contadores e histogramas"""
+        from metrics import MetricsRegistry
+        
+        registry = MetricsRegistry()
+        counter = registry.counter('demo_total', 'Contador', ('kind',))
+        histogram = registry.histogram('demo_seconds', 'Histograma', ('stage',), buckets=(0.1, 1.0))
+        counter.inc(kind='a"b')
+        counter.inc(2, kind='a"b')
+        histogram.observe(0.05, stage='x')
+        histogram.observe(0.5, stage='x')
+        histogram.observe(5, stage='x')
+        
+        text = registry.render()
+        assert '# TYPE demo_total counter' in text
+        assert 'demo_total{kind="a\\"b"} 3' in text
+        assert 'demo_seconds_bucket{stage="x",le="0.1"} 1' in text
+        assert 'demo_seconds_bucket{stage="x",le="1.0"} 2' in text
+        assert 'demo_seconds_bucket{stage="x",le="+Inf"} 3' in text
+        assert 'demo_seconds_count{stage="x"} 3' in text
+    
+    def test_pipeline_records_stages_and_cache_hits(self, sample_image_data):
+        """Testa as etapas, o CPU por requisição e os contadores do pipeline"""
+        optimizer = ImageOptimizer(redis_client=DictRedis(), config={'batch_process_workers': 0})
+        metrics = optimizer.metrics
+        url = 'https://example.com/metrics.jpg'
+        
+        with patch.object(ImageOptimizer, '_fetch_image', return_value=fetched_image(sample_image_data)):
+            first = optimizer.optimize_image_from_url(url)
+            second = optimizer.optimize_image_from_url(url)
+        
+        assert set(first['metadata']['timings_ms']) == {'decode', 'resize', 'encode', 'cpu'}
+        for stage in ('cache_lookup', 'decode', 'resize', 'encode', 'cache_write'):
+            assert metrics.stage_seconds.count(stage=stage) >= 1
+        assert metrics.requests.value(outcome='optimized') == 1
+        assert metrics.requests.value(outcome='cache') == 1
+        assert metrics.request_cpu_seconds.count(outcome='optimized') == 1
+        assert metrics.cache_lookups.value(key_type='img_var', tier='memory', result='hit') >= 1
+        assert metrics.cache_lookups.value(key_type='img_url', tier='redis', result='miss') == 1
+        assert metrics.bytes_out.value() == 2 * first['metadata']['optimized_bytes']
+        assert second['from_cache']
+    
+    def test_metrics_endpoint(self, client):
+        """Testa o endpoint /metrics"""
+        response = client.get('/metrics')
+        
+        assert response.status_code == 200
+        assert response.content_type.startswith('text/plain')
+        assert b'# TYPE image_optimizer_stage_duration_seconds histogram' in response.data
+
+class TestProfiling:
+    """Testes do perfilamento sob demanda"""
+    
+    @staticmethod
+    def _busy_work():
+        total = 0
+        for i in range(300000):
+            total += i % 7
+        return total
+    
+    @pytest.mark.parametrize('mode', ['sample', 'cprofile'])
+    def test_profile_call_reports_hot_functions(self, mode):
+        """Testa os dois modos do perfilador"""
+        from profiling import profile_call
+        
+        result, profile = profile_call(self._busy_work, mode, interval=0.001)
+        
+        assert result == self._busy_work()
+        assert profile['mode'] == mode
+        assert any('_busy_work' in f['function'] for f in profile['top_functions'])
+        if mode == 'sample':
+            assert profile['samples'] > 0
+            assert '_busy_work' in profile['collapsed_stacks']
+            assert 'profile_call' not in profile['collapsed_stacks']
+    
+    def test_endpoint_requires_admin_token(self, client, monkeypatch, sample_image_data):
+        """Testa que X-Profile exige o token e anexa o perfil à resposta"""
+        monkeypatch.setattr(ImageOptimizerConfig, 'PROFILING_TOKEN', 'segredo')
+        body = {'image_url': 'https://example.com/profile.jpg'}
+        
+        denied = client.post('/optimize-image', json=body, headers={'X-Profile': '1', 'X-Profile-Token': 'x'})
+        with patch.object(ImageOptimizer, '_fetch_image', return_value=fetched_image(sample_image_data)):
+            plain = client.post('/optimize-image', json=body)
+            profiled = client.post('/batch-optimize', json={'image_urls': [body['image_url']] * 2},
+                                   headers={'X-Profile': 'sample', 'X-Profile-Token': 'segredo'})
+        
+        assert denied.status_code == 403
+        assert 'profile' not in json.loads(plain.data)
+        profile = json.loads(profiled.data)['profile']
+        assert profile['mode'] == 'sample'
+        assert 'top_functions' in profile
+    
+    def test_non_ascii_token_is_rejected(self, client, monkeypatch):
+        """Testa que um token com caracteres não ASCII é recusado com 403, não 500"""
+        monkeypatch.setattr(ImageOptimizerConfig, 'PROFILING_TOKEN', 'segredo')
+        response = client.post('/optimize-image', json={'image_url': 'https://example.com/profile.jpg'},
+                               headers={'X-Profile': '1', 'X-Profile-Token': 'senha-inválida'})
+        
+        assert response.status_code == 403
+
+class TestBenchmark:
+    """Testes da suíte de microbenchmarks"""
+    
+    def test_corpus_is_deterministic(self):
+        """Testa que a mesma semente gera os mesmos bytes"""
+        from benchmark import build_corpus, CORPUS_SIZES
+        
+        first = build_corpus(seed=7, scale=0.05)
+        assert first == build_corpus(seed=7, scale=0.05)
+        assert set(first) == set(CORPUS_SIZES)
+        assert first != build_corpus(seed=8, scale=0.05)
+        with Image.open(io.BytesIO(first['rgba_png'])) as img:
+            assert img.mode == 'RGBA'
+        with Image.open(io.BytesIO(first['palette_gif'])) as img:
+            assert img.mode == 'P'
+    
+    def test_run_and_compare_to_baseline(self):
+        """Testa as medidas por etapa e a detecção de regressões"""
+        from benchmark import run_benchmarks, compare_to_baseline
+        
+        report = run_benchmarks(scale=0.05, repeats=1, formats=['JPEG'], efforts=['fast'],
+                                items=['photo_noise'])
+        benches = report['results']['photo_noise']
+        assert {'decode', 'decode_draft', 'resize:fast', 'encode:JPEG:fast', 'optimize:JPEG:fast'} <= set(benches)
+        
+        slower = json.loads(json.dumps(report))
+        slower['results']['photo_noise']['decode']['median_ms'] = benches['decode']['median_ms'] * 2
+        comparison = compare_to_baseline(slower, report)
+        
+        assert comparison['comparable']
+        assert [c['bench'] for c in comparison['regressions']] == ['decode']
+
+class TestLoadTest:
+    """Testes do harness de carga (origem falsa + Redis em memória)"""
+    
+    def test_percentile_nearest_rank(self):
+        """Testa o cálculo de percentis"""
+        from loadtest import percentile
+        
+        values = list(range(1, 101))
+        assert percentile(values, 50) == 50
+        assert percentile(values, 99) == 99
+        assert percentile([7.0], 95) == 7.0
+        assert percentile([], 50) == 0.0
+    
+    def test_create_app_uses_injected_redis(self):
+        """Testa a injeção do cliente Redis no create_app"""
+        redis_client = InMemoryRedis()
+        client = create_app('development', redis_client=redis_client).test_client()
+        
+        assert json.loads(client.get('/health').data)['redis_status'] == 'connected'
+        assert redis_client.commands['ping'] >= 1
+    
+    def test_load_test_reports_latency_and_cache(self):
+        """Testa uma rodada curta contra o app local"""
+        from loadtest import run_load_test
+        
+        original_workers = ImageOptimizerConfig.BATCH_PROCESS_WORKERS
+        report = run_load_test(requests_total=12, concurrency=3, mix={'optimize': 0.75, 'analyze': 0.25},
+                               unique_urls=2, corpus_scale=0.05, overrides={'BATCH_PROCESS_WORKERS': '0'})
+        
+        assert report['overall']['requests'] == 12
+        assert report['overall']['errors'] == 0
+        assert report['overall']['p50_ms'] <= report['overall']['p99_ms']
+        assert report['cache']['hit_ratio'] > 0
+        assert report['redis']['commands']['setex'] > 0
+        assert ImageOptimizerConfig.BATCH_PROCESS_WORKERS == original_workers
+    
+    def test_origin_failures_count_as_errors(self):
+        """Testa a injeção de falhas na origem"""
+        from loadtest import run_load_test
+        
+        report = run_load_test(requests_total=4, concurrency=2, mix={'optimize': 1.0}, unique_urls=4,
+                               corpus_scale=0.05, failure_rate=1.0)
+        
+        assert report['overall']['error_rate'] == 1.0
+        assert report['origin']['failures_injected'] == report['origin']['requests'] > 0
+
+class TestJobs:
+    """Testes da API de jobs assíncronos"""
+    
+    @staticmethod
+    def _wait(manager, job_id, timeout=10):
+        import time
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            job = manager.get(job_id)
+            if job['status'] in ('completed', 'failed'):
+                return job
+            time.sleep(0.02)
+        raise AssertionError('job não terminou')
+    
+    @pytest.mark.parametrize('backend', ['memory', 'redis'])
+    def test_job_reports_progress_and_result(self, backend, sample_image_data):
+        """Testa o ciclo de vida do job nos dois backends"""
+        from jobs import JobManager, InMemoryJobStore, RedisJobStore
+        
+        store = InMemoryJobStore() if backend == 'memory' else RedisJobStore(DictRedis())
+        optimizer = ImageOptimizer(config={'batch_process_workers': 0})
+        manager = JobManager(optimizer, store, workers=1)
+        urls = [f'https://example.com/job{i}.jpg' for i in range(3)]
+        
+        with patch.object(ImageOptimizer, '_fetch_image', return_value=fetched_image(sample_image_data)):
+            job = manager.submit(urls, {'return_base64': False})
+            assert job['status'] == 'queued'
+            finished = self._wait(manager, job['id'])
+        manager.shutdown()
+        
+        assert finished['status'] == 'completed'
+        assert finished['progress'] == {'completed': 3, 'failed': 0, 'total': 3, 'percent': 100.0}
+        assert finished['result']['successful'] == 3
+        assert manager.stats()['pending'] == 0
+    
+    def test_queue_limit(self):
+        """Testa a rejeição quando a fila está cheia"""
+        from jobs import JobManager, InMemoryJobStore, JobQueueFull
+        
+        release = threading.Event()
+        optimizer = Mock()
+        optimizer.batch_optimize_images.side_effect = lambda *args, **kwargs: release.wait()
+        manager = JobManager(optimizer, InMemoryJobStore(), workers=1, max_pending=1)
+        
+        manager.submit(['https://example.com/a.jpg'])
+        with pytest.raises(JobQueueFull):
+            manager.submit(['https://example.com/b.jpg'])
+        release.set()
+        manager.shutdown()
+    
+    def test_endpoints(self, client, sample_image_data):
+        """Testa POST /jobs (202) e GET /jobs/<id>"""
+        with patch.object(ImageOptimizer, '_fetch_image', return_value=fetched_image(sample_image_data)):
+            response = client.post('/jobs', json={'image_urls': ['https://example.com/endpoint.jpg']})
+            assert response.status_code == 202
+            job_id = json.loads(response.data)['job_id']
+            
+            import time
+            for _ in range(500):
+                job = json.loads(client.get(f'/jobs/{job_id}').data)
+                if job['status'] == 'completed':
+                    break
+                time.sleep(0.02)
+        
+        assert job['status'] == 'completed'
+        assert job['result']['results'][0]['optimized_url'].startswith('/optimized/')
+        assert client.get('/jobs/desconhecido').status_code == 404
+        assert client.post('/jobs', json={'image_urls': 'x'}).status_code == 400
+    
+    @pytest.mark.parametrize('endpoint', ['/jobs', '/batch-optimize'])
+    @pytest.mark.parametrize('options', [{'format': 'GIF'}, {'format': 123}, {'quality': 0}, {'quality': '85'}])
+    def test_invalid_format_or_quality(self, client, endpoint, options):
+        """Testa a validação de format e quality antes de enfileirar o lote"""
+        response = client.post(endpoint, json={'image_urls': ['https://example.com/a.jpg'], **options})
+        assert response.status_code == 400
+        assert not json.loads(response.data)['success']
+
+
+class TestCacheWarming:
+    """Testes do aquecimento do cache"""
+    
+    SPECS = [{'format': 'WEBP', 'max_width': 400}, {'format': 'JPEG', 'is_thumbnail': True}]
+    
+    def test_warm_downloads_once_per_url_and_skips_fresh(self, sample_image_data):
+        """Testa um download por URL e o pulo das variantes frescas"""
+        optimizer = ImageOptimizer(redis_client=DictRedis(), config={'batch_process_workers': 0})
+        urls = ['https://example.com/warm1.jpg', 'https://example.com/warm2.jpg']
+        progress = []
+        
+        with patch.object(ImageOptimizer, '_fetch_image',
+                          return_value=fetched_image(sample_image_data)) as mock_fetch:
+            first = optimizer.warm_cache(urls + urls[:1], self.SPECS,
+                                         progress_callback=lambda *args: progress.append(args))
+            assert mock_fetch.call_count == 2
+            second = optimizer.warm_cache(urls, self.SPECS + [{'widths': [200, 400], 'formats': ['WEBP']}])
+            assert mock_fetch.call_count == 4
+        
+        assert first['successful'] == 2
+        assert first['variants'] == {'warmed': 4, 'skipped': 0, 'failed': 0}
+        assert sorted(progress) == [(1, 0, 2), (2, 0, 2)]
+        assert second['variants'] == {'warmed': 2, 'skipped': 4, 'failed': 0}
+        assert [result['variants'] for result in second['results']] == [['skipped', 'skipped', 'warmed']] * 2
+        
+        index = optimizer._get_from_cache(optimizer._get_url_index_key(urls[0]))
+        assert len(index['cached_keys']) >= 3
+        result = optimizer.optimize_image_from_url(urls[0], {**self.SPECS[0], 'effort': 'max'})
+        assert result['from_cache']
+    
+    def test_failed_url_is_reported(self):
+        """Testa a falha de uma URL sem interromper as demais"""
+        from image_optimizer import ImageFetchError
+        
+        optimizer = ImageOptimizer(redis_client=DictRedis(), config={'batch_process_workers': 0})
+        with patch.object(ImageOptimizer, '_fetch_image', side_effect=ImageFetchError('HTML', 'not_image')):
+            summary = optimizer.warm_cache(['https://example.com/page.html'], self.SPECS)
+        
+        assert summary['failed'] == 1
+        assert summary['results'][0]['error_class'] == 'not_image'
+        assert summary['variants']['failed'] == 2
+    
+    def test_host_rate_limiter(self):
+        """Testa o token bucket por host"""
+        from http_pool import HostRateLimiter
+        
+        limiter = HostRateLimiter(rate=20, burst=1)
+        waits = [limiter.acquire('https://cdn.example.com/a.jpg') for _ in range(3)]
+        other = limiter.acquire('https://other.example.com/a.jpg')
+        
+        assert waits[0] == 0 and other == 0
+        assert 0.03 < waits[1] <= 0.05 and 0.03 < waits[2] <= 0.05
+        assert HostRateLimiter(rate=0).acquire('https://cdn.example.com/a.jpg') == 0
+    
+    def test_endpoint(self, client, sample_image_data):
+        """Testa POST /warm (202) e o progresso em /jobs/<id>"""
+        assert client.post('/warm', json={'image_urls': []}).status_code == 400
+        assert client.post('/warm', json={'image_urls': ['https://example.com/a.jpg'],
+                                          'variants': [{'format': 'GIF'}]}).status_code == 400
+        assert client.post('/warm', json={'image_urls': ['https://example.com/a.jpg'],
+                                          'host_rate': 0}).status_code == 400
+        
+        with patch.object(ImageOptimizer, '_fetch_image', return_value=fetched_image(sample_image_data)):
+            response = client.post('/warm', json={
+                'image_urls': ['https://example.com/warm-endpoint.jpg'],
+                'variants': [{'format': 'webp', 'max_width': 320}, {'widths': [160, 320]}]
+            })
+            assert response.status_code == 202
+            job_id = json.loads(response.data)['job_id']
+            
+            import time
+            for _ in range(500):
+                job = json.loads(client.get(f'/jobs/{job_id}').data)
+                if job['status'] in ('completed', 'failed'):
+                    break
+                time.sleep(0.02)
+        
+        assert job['status'] == 'completed' and job['kind'] == 'warm'
+        assert job['progress']['percent'] == 100.0
+        assert job['result']['variants'] == {'warmed': 2, 'skipped': 0, 'failed': 0}
+
+
+class TestOptimizedImageServing:
+    """Testes do endpoint /optimized/<hash>.<ext>"""
+    
+    @pytest.fixture
+    def optimized_url(self, client, sample_image_data):
+        with patch.object(ImageOptimizer, '_fetch_image', return_value=fetched_image(sample_image_data)):
+            response = client.post('/optimize-image', json={
+                'image_url': 'https://example.com/serve.jpg',
+                'return_base64': False
+            })
+        return json.loads(response.data)['optimized_url']
+
+    def test_serves_bytes_with_immutable_caching(self, client, optimized_url):
+        """Testa MIME type, ETag forte e Cache-Control imutável"""
+        response = client.get(optimized_url)
+        
+        assert response.status_code == 200
+        assert response.mimetype == 'image/webp'
+        assert response.data[:4] == b'RIFF'
+        content_hash = optimized_url.rsplit('/', 1)[1].split('.')[0]
+        assert response.headers['ETag'] == f'"{content_hash}"'
+        assert 'immutable' in response.headers['Cache-Control']
+
+    def test_if_none_match_returns_304(self, client, optimized_url):
+        """Testa GET condicional com If-None-Match"""
+        etag = client.get(optimized_url).headers['ETag']
+        response = client.get(optimized_url, headers={'If-None-Match': etag})
+        
+        assert response.status_code == 304
+        assert response.data == b''
+
+    def test_range_request(self, client, optimized_url):
+        """Testa requisição parcial com Range"""
+        full = client.get(optimized_url).data
+        response = client.get(optimized_url, headers={'Range': 'bytes=0-9'})
+        
+        assert response.status_code == 206
+        assert response.data == full[:10]
+        assert response.headers['Content-Range'] == f'bytes 0-9/{len(full)}'
+
+    def test_unknown_hash_returns_404(self, client):
+        """Testa hash inexistente e extensão inválida"""
+        assert client.get('/optimized/0123456789abcdef.webp').status_code == 404
+        assert client.get('/optimized/0123456789abcdef.exe').status_code == 404
+    
+    def test_extension_must_match_stored_format(self, client, optimized_url):
+        """Testa que o hash de um WebP não é servido com outra extensão"""
+        content_hash = optimized_url.rsplit('/', 1)[1].split('.')[0]
+        
+        assert client.get(f'/optimized/{content_hash}.jpeg').status_code == 404
+        assert client.get(f'/optimized/{content_hash}.png').status_code == 404
+        assert client.get(f'/optimized/{content_hash}.WEBP').status_code == 200
+    
+    def test_serves_avif(self, client, sample_image_data):
+        """Testa que variantes AVIF são reconhecidas pelos bytes armazenados"""
+        with patch.object(ImageOptimizer, '_fetch_image', return_value=fetched_image(sample_image_data)):
+            response = client.post('/optimize-image', json={
+                'image_url': 'https://example.com/serve-avif.jpg',
+                'format': 'AVIF',
+                'return_base64': False
+            })
+        optimized_url = json.loads(response.data)['optimized_url']
+        
+        assert optimized_url.endswith('.avif')
+        assert client.get(optimized_url).mimetype == 'image/avif'
 
 
 class TestConfiguration:
@@ -248,13 +1798,13 @@ class TestConfiguration:
 class TestIntegration:
     """Testes de integração completos"""
     
-    @patch('image_optimizer.ImageOptimizer._download_image')
+    @patch('image_optimizer.ImageOptimizer._fetch_image')
     @patch('image_optimizer.ImageOptimizer._is_generic_telegram_image')
     def test_full_optimization_flow(self, mock_generic, mock_download, client, sample_image_data):
         """Testa fluxo completo de otimização"""
         # Setup mocks
         mock_generic.return_value = False
-        mock_download.return_value = (sample_image_data, 'image/jpeg')
+        mock_download.return_value = fetched_image(sample_image_data)
         
         # Fazer requisição
         response = client.post('/optimize-image',
@@ -184,7 +184,24 @@ def create_progressive_jpeg(image: Image.Image, quality: int = 90) -> bytes:
     
     return output_buffer.getvalue()
 
-def create_optimized_webp(image: Image.Image, quality: int = 85, lossless: bool = False) -> bytes:
+# Perfis de esforço do codificador, do mais rápido ao de melhor compressão
+# (WebP method 0-6, AVIF speed 0-10 onde menor é mais lento, JPEG optimize)
+ENCODER_EFFORTS = {
+    'fast': {'webp_method': 2, 'avif_speed': 9, 'jpeg_optimize': False},
+    'balanced': {'webp_method': 4, 'avif_speed': 7, 'jpeg_optimize': True},
+    'max': {'webp_method': 6, 'avif_speed': 4, 'jpeg_optimize': True}
+}
+
+EFFORT_LEVELS = tuple(ENCODER_EFFORTS)
+
+def get_encoder_effort(effort: str) -> Dict[str, Any]:
+    """Parâmetros do codificador para um perfil de esforço"""
+    if effort not in ENCODER_EFFORTS:
+        raise ValueError(f"Esforço de codificação inválido: {effort}. Use: {', '.join(EFFORT_LEVELS)}")
+    return ENCODER_EFFORTS[effort]
+
+def create_optimized_webp(image: Image.Image, quality: int = 85, lossless: bool = False,
+                          effort: str = 'max') -> bytes:
     """
     Cria WebP otimizado
     
@@ -192,6 +209,7 @@ def create_optimized_webp(image: Image.Image, quality: int = 85, lossless: bool
         image: Imagem PIL
         quality: Qualidade (1-100, ignorado se lossless=True)
         lossless: Se deve usar compressão sem perdas
+        effort: Perfil de esforço do codificador (fast, balanced, max)
         
     Returns:
         bytes: Dados da imagem WebP
@@ -201,7 +219,7 @@ def create_optimized_webp(image: Image.Image, quality: int = 85, lossless: bool
     save_kwargs = {
         'format': 'WEBP',
         'optimize': True,
-        'method': 6  # Melhor compressão (mais lento)
+        'method': get_encoder_effort(effort)['webp_method']
     }
     
     if lossless:
@@ -212,13 +230,45 @@ def create_optimized_webp(image: Image.Image, quality: int = 85, lossless: bool
     image.save(output_buffer, **save_kwargs)
     return output_buffer.getvalue()
 
-def smart_crop_image(image: Image.Image, target_size: Tuple[int, int]) -> Image.Image:
+# Modos de redimensionamento: (filtro final, reducing_gap)
+# Com reducing_gap, a imagem é primeiro reduzida por um fator inteiro (box,
+# rápido) até ficar a esse fator do alvo; só então o filtro final é aplicado
+RESIZE_MODES = {
+    'quality': (Image.Resampling.LANCZOS, None),
+    'balanced': (Image.Resampling.LANCZOS, 3.0),
+    'fast': (Image.Resampling.BICUBIC, 2.0)
+}
+
+DEFAULT_RESIZE_MODE = 'balanced'
+
+def resize_image(image: Image.Image, target_size: Tuple[int, int],
+                 mode: str = DEFAULT_RESIZE_MODE) -> Image.Image:
+    """
+    Redimensiona em etapas: redução inteira até perto do alvo e reamostragem final
+    
+    Args:
+        image: Imagem PIL
+        target_size: Tamanho alvo (largura, altura)
+        mode: 'quality' (LANCZOS direto), 'balanced' ou 'fast'
+        
+    Returns:
+        Image.Image: Imagem redimensionada
+    """
+    if mode not in RESIZE_MODES:
+        raise ValueError(f"Modo de redimensionamento inválido: {mode}")
+    
+    resample, reducing_gap = RESIZE_MODES[mode]
+    return image.resize(target_size, resample, reducing_gap=reducing_gap)
+
+def smart_crop_image(image: Image.Image, target_size: Tuple[int, int],
+                     resize_mode: str = DEFAULT_RESIZE_MODE) -> Image.Image:
     """
     Faz crop inteligente da imagem focando no centro
     
     Args:
         image: Imagem PIL
         target_size: Tamanho alvo (largura, altura)
+        resize_mode: Modo de redimensionamento (ver RESIZE_MODES)
         
     Returns:
         Image.Image: Imagem com crop aplicado
@@ -232,7 +282,7 @@ def smart_crop_image(image: Image.Image, target_size: Tuple[int, int]) -> Image.
     
     if abs(target_ratio - original_ratio) < 0.01:
         # Proporções similares, apenas redimensionar
-        return image.resize(target_size, Image.Resampling.LANCZOS)
+        return resize_image(image, target_size, resize_mode)
     
     # Determinar como fazer o crop
     if original_ratio > target_ratio:
@@ -248,7 +298,7 @@ def smart_crop_image(image: Image.Image, target_size: Tuple[int, int]) -> Image.
     
     # Aplicar crop e redimensionar
     cropped = image.crop(crop_box)
-    return cropped.resize(target_size, Image.Resampling.LANCZOS)
+    return resize_image(cropped, target_size, resize_mode)
 
 def generate_responsive_sizes(
     original_width: int,
@@ -283,6 +333,52 @@ def generate_responsive_sizes(
     
     return sizes
 
+# Assinaturas de arquivo para diferentes formatos
+IMAGE_SIGNATURES = {
+    b'\xFF\xD8\xFF': 'image/jpeg',
+    b'\x89PNG\r\n\x1a\n': 'image/png',
+    b'GIF87a': 'image/gif',
+    b'GIF89a': 'image/gif',
+    b'RIFF': 'image/webp',  # WebP começa com RIFF (confirmado por 'WEBP' no offset 8)
+    b'BM': 'image/bmp',
+    b'II*\x00': 'image/tiff',
+    b'MM\x00*': 'image/tiff'
+}
+
+# AVIF (ISOBMFF): caixa ftyp no offset 4 com a marca avif (imagem) ou avis (sequência)
+AVIF_BRANDS = (b'ftypavif', b'ftypavis')
+
+# Bytes necessários para reconhecer qualquer assinatura acima
+SIGNATURE_SNIFF_BYTES = 12
+
+# TTL (segundos) do cache negativo por classe de erro; erros transitórios não são cacheados
+NEGATIVE_CACHE_TTLS = {
+    'not_found': 3600,    # 404/410: URL morta
+    'timeout': 120,       # Origem lenta ou fora do ar
+    'not_image': 3600,    # Content-type ou assinatura que não é imagem
+    'too_large': 86400,   # Acima de max_file_size
+    'generic': 86400      # Imagem genérica do Telegram (só informado, sem escrita no cache)
+}
+
+def sniff_image_content_type(header: bytes) -> Optional[str]:
+    """
+    Identifica o formato pelos primeiros bytes (magic bytes), sem decodificar
+    
+    Args:
+        header: Primeiros bytes do arquivo (idealmente SIGNATURE_SNIFF_BYTES)
+        
+    Returns:
+        Optional[str]: MIME type reconhecido ou None
+    """
+    for signature, mime_type in IMAGE_SIGNATURES.items():
+        if header.startswith(signature):
+            if signature == b'RIFF' and header[8:12] != b'WEBP':
+                continue  # RIFF também é usado por WAV/AVI
+            return mime_type
+    if header[4:12] in AVIF_BRANDS:
+        return 'image/avif'
+    return None
+
 def detect_image_content_type(image_data: bytes) -> str:
     """
     Detecta o tipo de conteúdo da imagem
@@ -293,21 +389,9 @@ def detect_image_content_type(image_data: bytes) -> str:
     Returns:
         str: MIME type da imagem
     """
-    # Assinaturas de arquivo para diferentes formatos
-    signatures = {
-        b'\xFF\xD8\xFF': 'image/jpeg',
-        b'\x89PNG\r\n\x1a\n': 'image/png',
-        b'GIF87a': 'image/gif',
-        b'GIF89a': 'image/gif',
-        b'RIFF': 'image/webp',  # WebP começa com RIFF
-        b'BM': 'image/bmp',
-        b'II*\x00': 'image/tiff',
-        b'MM\x00*': 'image/tiff'
-    }
-    
-    for signature, mime_type in signatures.items():
-        if image_data.startswith(signature):
-            return mime_type
+    mime_type = sniff_image_content_type(image_data[:SIGNATURE_SNIFF_BYTES])
+    if mime_type:
+        return mime_type
     
     # Fallback usando PIL
     try:
@@ -412,7 +496,8 @@ def is_image_worth_optimizing(
 def create_image_thumbnail(
     image_data: bytes,
     size: Tuple[int, int] = (300, 300),
-    crop_to_fit: bool = True
+    crop_to_fit: bool = True,
+    resize_mode: str = DEFAULT_RESIZE_MODE
 ) -> bytes:
     """
     Cria thumbnail da imagem
@@ -421,6 +506,7 @@ def create_image_thumbnail(
         image_data: Dados da imagem original
         size: Tamanho do thumbnail
         crop_to_fit: Se deve fazer crop para ajustar exatamente
+        resize_mode: Modo de redimensionamento (ver RESIZE_MODES)
         
     Returns:
         bytes: Dados do thumbnail
@@ -429,10 +515,11 @@ def create_image_thumbnail(
         with Image.open(io.BytesIO(image_data)) as img:
             if crop_to_fit:
                 # Usar smart crop
-                thumbnail = smart_crop_image(img, size)
+                thumbnail = smart_crop_image(img, size, resize_mode)
             else:
                 # Redimensionar mantendo proporção
-                img.thumbnail(size, Image.Resampling.LANCZOS)
+                resample, reducing_gap = RESIZE_MODES[resize_mode]
+                img.thumbnail(size, resample, reducing_gap=reducing_gap)
                 thumbnail = img
             
             # Salvar como WebP otimizado
@@ -464,7 +551,8 @@ def get_format_mime_type(format_name: str) -> str:
     }
     return mime_types.get(format_name.upper(), 'image/unknown')
 
-def optimize_for_web(image: Image.Image, target_format: str = 'WEBP', quality: int = 85) -> bytes:
+def optimize_for_web(image: Image.Image, target_format: str = 'WEBP', quality: int = 85,
+                     effort: str = 'max') -> bytes:
     """
     Otimiza imagem especificamente para web
     
@@ -472,11 +560,13 @@ def optimize_for_web(image: Image.Image, target_format: str = 'WEBP', quality: i
         image: Imagem PIL
         target_format: Formato alvo
         quality: Qualidade de compressão
+        effort: Perfil de esforço do codificador (fast, balanced, max)
         
     Returns:
         bytes: Dados da imagem otimizada
     """
     output_buffer = io.BytesIO()
+    encoder = get_encoder_effort(effort)
     
     # Aplicar otimizações específicas por formato
     if target_format == 'WEBP':
@@ -485,7 +575,7 @@ def optimize_for_web(image: Image.Image, target_format: str = 'WEBP', quality: i
             output_buffer,
             format='WEBP',
             quality=quality,
-            method=6,  # Melhor compressão
+            method=encoder['webp_method'],
             optimize=True,
             lossless=False
         )
@@ -506,7 +596,7 @@ def optimize_for_web(image: Image.Image, target_format: str = 'WEBP', quality: i
             output_buffer,
             format='JPEG',
             quality=quality,
-            optimize=True,
+            optimize=encoder['jpeg_optimize'],
             progressive=True,
             subsampling=0
         )